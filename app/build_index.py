@@ -0,0 +1,31 @@
+"""Build the read-only index artifact ahead of time: python -m app.build_index --out index"""
+import argparse
+import time
+
+from app.chatbot import artifact_is_current, build_index_artifact
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Build the prebuilt index artifact.")
+    parser.add_argument("--pdf-folder", default="pdfs")
+    parser.add_argument("--out", default="index")
+    parser.add_argument("--force", action="store_true", help="Rebuild even if the artifact matches the PDFs")
+    args = parser.parse_args()
+
+    if not args.force and artifact_is_current(args.out, args.pdf_folder):
+        print(f"Index artifact in {args.out} is already current.")
+        return
+
+    start = time.perf_counter()
+    manifest = build_index_artifact(args.pdf_folder, args.out)
+    print(f"Indexed {manifest['count']} chunks from {args.pdf_folder} into {args.out} "
+          f"(version {manifest['version']}, {time.perf_counter() - start:.1f}s).")
+    report = manifest.get("ingestion")
+    if report:
+        print(f"Embedding: {report['chunks_per_s']} chunks/s over {report['batches']} batches "
+              f"({report['resumed_batches']} resumed from checkpoint, {report['retries']} retries, "
+              f"concurrency {report['final_concurrency']}/{report['concurrency']}).")
+
+
+if __name__ == "__main__":
+    main()
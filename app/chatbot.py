@@ -1,16 +1,39 @@
+import hashlib
 import os
-import pdfplumber
+import re
+import threading
 from langchain_core.documents import Document
-from langchain_openai import OpenAIEmbeddings, ChatOpenAI
-from langchain.indexes import VectorstoreIndexCreator
-from langchain.chains import RetrievalQA
-from langchain.text_splitter import RecursiveCharacterTextSplitter
 from dotenv import load_dotenv
+from app.cache import make_cache
+from app.embeddings import CachedEmbeddings, MeteredEmbeddings, HashEmbeddings
+from app.index_store import INDEX_ARTIFACT_DIR, ArtifactIndex, ArtifactRetriever, read_manifest, write_index_artifact
+from app.ingest import IngestionEmbedder
+from app.rerank import RERANK_CANDIDATES, RerankingRetriever, rerank
+from app.usage import usage_callback, stage
 load_dotenv()
 os.environ["TOKENIZERS_PARALLELISM"] = "false"
 
 OPENAI_API_KEY = os.environ.get("OPENAI_API_KEY")
-llm = ChatOpenAI(model="gpt-4.1-mini", temperature=0, openai_api_key=OPENAI_API_KEY)
+# "openai" (default) or "hash" for deterministic offline embeddings used by the benchmarks
+EMBEDDINGS_BACKEND = os.environ.get("EMBEDDINGS_BACKEND", "openai")
+# "recursive" (fixed-size chunks) or "sections" (heading-aware, see app.sections)
+CHUNKING_MODE = os.environ.get("CHUNKING_MODE", "recursive")
+# Where sections mode keeps its index when INDEX_ARTIFACT_DIR is not set
+SECTION_INDEX_DIR = os.environ.get("SECTION_INDEX_DIR", ".cache/section_index")
+CHAT_MODEL = "gpt-4.1-mini"
+
+_llm = None
+_llm_lock = threading.Lock()
+
+def get_llm():
+    """The shared chat model, created on first use so start-up does not import langchain_openai for it."""
+    global _llm
+    if _llm is None:
+        with _llm_lock:
+            if _llm is None:
+                from langchain_openai import ChatOpenAI
+                _llm = ChatOpenAI(model=CHAT_MODEL, temperature=0, openai_api_key=OPENAI_API_KEY, callbacks=[usage_callback])
+    return _llm
 
 HOTEL_KEYWORDS = [
     # Existing keywords...
@@ -32,6 +55,11 @@ DEFAULT_OUT_OF_DOMAIN_RESPONSE = (
 
 SIMILARITY_THRESHOLD = 0.6  # Adjust as needed
 
+def normalize_query(query: str) -> str:
+    """Canonical form of a query used as a cache key."""
+    text = re.sub(r"\s+", " ", (query or "").strip().lower())
+    return text.rstrip("?!. ")
+
 def is_hotel_query(query: str) -> bool:
     query_lower = query.lower()
     
@@ -66,13 +94,62 @@ def filter_response(query: str, result: dict) -> str:
     # Otherwise, return the answer
     response = result.get('result', '')
     return response
-def load_chain(pdf_folder="pdfs"):
-    pdf_files = [os.path.join(pdf_folder, f) for f in os.listdir(pdf_folder) if f.lower().endswith(".pdf")]
+
+def clean_response(response: str) -> str:
+    """Strip boilerplate lead-ins and capitalize the first letter."""
+    for prefix in ["According to the provided context, ", "According to the context, "]:
+        if response.startswith(prefix):
+            response = response[len(prefix):]
+    if response and response[0].islower():
+        response = response[0].upper() + response[1:]
+    return response
+
+_embeddings_cache = None
+
+def make_embeddings():
+    """Embeddings client for the configured backend: cache -> usage metering -> provider."""
+    global _embeddings_cache
+    if EMBEDDINGS_BACKEND == "hash":
+        inner = HashEmbeddings()
+    else:
+        from langchain_openai import OpenAIEmbeddings
+        inner = OpenAIEmbeddings(openai_api_key=OPENAI_API_KEY)
+    if _embeddings_cache is None:
+        _embeddings_cache = make_cache("embeddings")
+    return CachedEmbeddings(MeteredEmbeddings(inner, inner.model), inner.model, _embeddings_cache)
+
+def run_chain(chain, query: str, docs=None) -> dict:
+    """Same result as `chain.invoke({"query": query})`, but with retrieval and
+    generation timed as separate stages. Pass `docs` to skip retrieval.
+    """
+    if docs is None:
+        with stage("retrieval"):
+            docs = chain.retriever.invoke(query)
+    with stage("generation"):
+        output = chain.combine_documents_chain.invoke({"input_documents": docs, "question": query})
+    return {"query": query, "result": output.get("output_text", ""), "source_documents": docs}
+
+def list_pdf_files(pdf_folder="pdfs") -> list:
+    pdf_files = sorted(os.path.join(pdf_folder, f) for f in os.listdir(pdf_folder) if f.lower().endswith(".pdf"))
     if not pdf_files:
         raise FileNotFoundError(f"No PDF files found in {pdf_folder}.")
+    return pdf_files
+
+def corpus_version(pdf_folder="pdfs") -> str:
+    """Short content hash of the PDF set; changes whenever any PDF is added, removed or edited."""
+    digest = hashlib.sha256()
+    for pdf_file in list_pdf_files(pdf_folder):
+        digest.update(os.path.basename(pdf_file).encode("utf-8"))
+        with open(pdf_file, "rb") as f:
+            digest.update(f.read())
+    return digest.hexdigest()[:16]
+
+def load_documents(pdf_folder="pdfs") -> list:
+    # Ingestion-only dependency: imported here so serving from an index artifact never loads it
+    import pdfplumber
 
     documents = []
-    for pdf_file in pdf_files:
+    for pdf_file in list_pdf_files(pdf_folder):
         with pdfplumber.open(pdf_file) as pdf:
             text = "\n".join(page.extract_text() or "" for page in pdf.pages)
         if text.strip():
@@ -80,16 +157,148 @@ def load_chain(pdf_folder="pdfs"):
 
     if not documents:
         raise ValueError("No text extracted from PDFs.")
+    return documents
+
+def make_text_splitter():
+    from langchain.text_splitter import RecursiveCharacterTextSplitter
+    return RecursiveCharacterTextSplitter(chunk_size=1000, chunk_overlap=200)
 
-    text_splitter = RecursiveCharacterTextSplitter(chunk_size=1000, chunk_overlap=200)
+def build_vectorstore(documents, embeddings=None):
+    from langchain.indexes import VectorstoreIndexCreator
+    text_splitter = make_text_splitter()
     docs = text_splitter.split_documents(documents)
-    embeddings = OpenAIEmbeddings(openai_api_key=OPENAI_API_KEY)
-    index = VectorstoreIndexCreator(embedding=embeddings, text_splitter=text_splitter).from_documents(docs)
-
-    chain = RetrievalQA.from_chain_type(
-        llm=llm,
-        chain_type="stuff",
-        retriever=index.vectorstore.as_retriever(search_kwargs={"k": 3}),
-        return_source_documents=True
-    )
-    return chain
\ No newline at end of file
+    embeddings = embeddings or make_embeddings()
+    index = VectorstoreIndexCreator(embedding=IngestionEmbedder(embeddings), text_splitter=text_splitter).from_documents(docs)
+    # Queries go straight to the client, not through the ingestion batching
+    index.vectorstore.embedding = embeddings
+    return index.vectorstore
+
+def split_corpus(pdf_folder="pdfs") -> tuple:
+    """(chunks to embed, parent sections or None) for the configured CHUNKING_MODE."""
+    if CHUNKING_MODE == "sections":
+        from app.sections import extract_lines, split_sections
+        return split_sections(extract_lines(list_pdf_files(pdf_folder)))
+    return make_text_splitter().split_documents(load_documents(pdf_folder)), None
+
+def build_version(pdf_folder="pdfs") -> str:
+    """Index version for the PDFs under the current chunking mode."""
+    version = corpus_version(pdf_folder)
+    return version if CHUNKING_MODE == "recursive" else f"{version}-{CHUNKING_MODE}"
+
+def build_index_artifact(pdf_folder="pdfs", path=INDEX_ARTIFACT_DIR, embeddings=None) -> dict:
+    """Embed the PDF corpus once and write it as a read-only artifact for `load_chain`."""
+    embeddings = embeddings or make_embeddings()
+    chunks, parents = split_corpus(pdf_folder)
+    embedder = IngestionEmbedder(embeddings)
+    with stage("ingestion"):
+        vectors = embedder.embed_documents([c.page_content for c in chunks])
+    model = getattr(embeddings, "model", EMBEDDINGS_BACKEND)
+    return write_index_artifact(path, chunks, vectors, build_version(pdf_folder), model,
+                                parents=parents, chunking=CHUNKING_MODE, ingestion=embedder.last_report)
+
+def artifact_is_current(path=INDEX_ARTIFACT_DIR, pdf_folder="pdfs") -> bool:
+    manifest = read_manifest(path) if path else None
+    return bool(manifest) and manifest.get("version") == build_version(pdf_folder)
+
+def serving_artifact_dir() -> str:
+    """Artifact `load_chain` serves from: INDEX_ARTIFACT_DIR, else the sections-mode index, else none."""
+    if INDEX_ARTIFACT_DIR:
+        return INDEX_ARTIFACT_DIR
+    return SECTION_INDEX_DIR if CHUNKING_MODE == "sections" else ""
+
+def index_version(pdf_folder="pdfs") -> str:
+    """Version of the index `load_chain` serves: the artifact manifest's, else the live corpus hash."""
+    path = serving_artifact_dir()
+    manifest = read_manifest(path) if path else None
+    if manifest and manifest.get("version"):
+        return manifest["version"]
+    return corpus_version(pdf_folder)
+
+def with_reranking(retriever):
+    """Wrap `retriever` so it re-ranks RERANK_CANDIDATES candidates down to its own k (if enabled)."""
+    if RERANK_CANDIDATES <= 0:
+        return retriever
+    k = getattr(retriever, "k", None) or retriever.search_kwargs.get("k", 4)
+    return RerankingRetriever(inner=retriever, k=k, candidates=max(RERANK_CANDIDATES, k))
+
+def unwrap_retriever(retriever):
+    """The underlying index/vector store retriever, without the re-ranking wrapper."""
+    return getattr(retriever, "inner", retriever)
+
+class QAChain:
+    """Retrieval QA ("stuff" prompt) over a swappable `retriever`. The combine-documents chain
+    and the LLM are built on first generation, so start-up does not import langchain.chains.
+    """
+
+    def __init__(self, retriever):
+        self.retriever = retriever
+        self._combine = None
+        self._lock = threading.Lock()
+
+    @property
+    def combine_documents_chain(self):
+        if self._combine is None:
+            with self._lock:
+                if self._combine is None:
+                    from langchain.chains.question_answering import load_qa_chain
+                    self._combine = load_qa_chain(get_llm(), chain_type="stuff")
+        return self._combine
+
+    def invoke(self, inputs: dict, config=None) -> dict:
+        return run_chain(self, inputs["query"])
+
+def build_chain(retriever):
+    return QAChain(retriever)
+
+def retrieve_batch(chain, queries: list) -> list:
+    """Retrieve documents for many queries with a single batched embedding call.
+    `chain` may also be a bare retriever.
+    """
+    retriever = getattr(chain, "retriever", chain)
+    reranker = retriever if isinstance(retriever, RerankingRetriever) else None
+    retriever = unwrap_retriever(retriever)
+    if hasattr(retriever, "index"):
+        store, embeddings, k = retriever.index, retriever.embeddings, retriever.k
+    else:
+        store = retriever.vectorstore
+        embeddings = store.embeddings
+        k = retriever.search_kwargs.get("k", 4)
+    with stage("retrieval"):
+        vectors = embeddings.embed_documents(list(queries))
+        if reranker is None:
+            return [store.similarity_search_by_vector(vector, k=k) for vector in vectors]
+        return [
+            rerank(query, store.similarity_search_by_vector(vector, k=reranker.candidates), reranker.k)
+            for query, vector in zip(queries, vectors)
+        ]
+
+def reciprocal_rank_fusion(result_lists: list, limit: int = 4, k: int = 60) -> list:
+    """Merge ranked document lists: each document scores sum(1 / (k + rank)) over the lists it appears in."""
+    scores, docs = {}, {}
+    for results in result_lists:
+        for rank, doc in enumerate(results, start=1):
+            key = (doc.metadata.get("source"), doc.page_content)
+            scores[key] = scores.get(key, 0.0) + 1.0 / (k + rank)
+            docs.setdefault(key, doc)
+    ranked = sorted(scores, key=scores.get, reverse=True)
+    return [docs[key] for key in ranked[:limit]]
+
+def retrieve_fused(chain, queries: list, limit: int = 4) -> list:
+    """Retrieve for several focused sub-queries (one batched embedding call) and fuse the rankings."""
+    queries = [q for q in dict.fromkeys(q.strip() for q in queries) if q]
+    if not queries:
+        return []
+    return reciprocal_rank_fusion(retrieve_batch(chain, queries), limit=limit)
+
+def load_chain(pdf_folder="pdfs", embeddings=None):
+    """Build the QA chain, serving from the prebuilt index artifact when INDEX_ARTIFACT_DIR has one."""
+    embeddings = embeddings or make_embeddings()
+    path = serving_artifact_dir()
+    if CHUNKING_MODE == "sections" and not INDEX_ARTIFACT_DIR and not artifact_is_current(path, pdf_folder):
+        # Parent sections only exist in the artifact format, so sections mode always serves one
+        build_index_artifact(pdf_folder, path, embeddings)
+    if path and read_manifest(path):
+        index = ArtifactIndex(path)
+        return build_chain(with_reranking(ArtifactRetriever(index=index, embeddings=embeddings, k=3)))
+    vectorstore = build_vectorstore(load_documents(pdf_folder), embeddings)
+    return build_chain(with_reranking(vectorstore.as_retriever(search_kwargs={"k": 3})))
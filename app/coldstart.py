@@ -0,0 +1,87 @@
+"""Cold-start profile of `import app.main`: INDEX_ARTIFACT_DIR=index python -m app.coldstart"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+from collections import defaultdict
+
+# Modules that should only load during ingestion, never when serving from an artifact
+INGESTION_ONLY_MODULES = ["pdfplumber", "pdfminer", "langchain_text_splitters", "langchain_community"]
+
+_PROBE = """
+import json, sys, time
+start = time.perf_counter()
+import app.main
+total_ms = (time.perf_counter() - start) * 1000
+from app.timing import startup_timings
+print("COLDSTART " + json.dumps({
+    "total_ms": total_ms,
+    "startup_timings": startup_timings,
+    "loaded_ingestion_modules": [m for m in %r if m in sys.modules],
+}))
+"""
+
+
+def parse_importtime(stderr: str) -> dict:
+    """Self import time (microseconds) per top-level package; nested imports count toward their own package."""
+    per_package = defaultdict(int)
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        try:
+            self_us, _, name = line[len("import time:"):].split("|", 2)
+        except ValueError:
+            continue
+        per_package[name.strip().split(".")[0]] += int(self_us.strip())
+    return dict(per_package)
+
+
+def profile(top: int = 15) -> dict:
+    env = dict(os.environ)
+    env.setdefault("OPENAI_API_KEY", "coldstart-profile")
+    proc = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", _PROBE % INGESTION_ONLY_MODULES],
+        capture_output=True, text=True, env=env,
+    )
+    summary_line = next((l for l in proc.stdout.splitlines() if l.startswith("COLDSTART ")), None)
+    if summary_line is None:
+        raise RuntimeError(f"Import of app.main failed:\n{proc.stderr[-2000:]}")
+    summary = json.loads(summary_line[len("COLDSTART "):])
+
+    packages = parse_importtime(proc.stderr)
+    app_init_ms = sum(summary["startup_timings"].values())
+    summary["imports"] = [
+        {"package": name, "import_ms": us / 1000}
+        for name, us in sorted(packages.items(), key=lambda item: item[1], reverse=True)[:top]
+    ]
+    summary["import_ms"] = max(0.0, summary["total_ms"] - app_init_ms)
+    summary["init_ms"] = app_init_ms
+    return summary
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Report import-time and init-time breakdown of a cold start.")
+    parser.add_argument("--top", type=int, default=15)
+    parser.add_argument("--json", action="store_true", help="Print the raw JSON report")
+    args = parser.parse_args()
+
+    report = profile(args.top)
+    if args.json:
+        print(json.dumps(report, indent=2))
+        return
+
+    print(f"Cold start total: {report['total_ms']:.0f} ms "
+          f"(imports {report['import_ms']:.0f} ms, init {report['init_ms']:.0f} ms)")
+    print("\nInit phases:")
+    for name, ms in report["startup_timings"].items():
+        print(f"  {name:<24} {ms:8.1f} ms")
+    print("\nSlowest packages (import self time):")
+    for item in report["imports"]:
+        print(f"  {item['package']:<24} {item['import_ms']:8.1f} ms")
+    if report["loaded_ingestion_modules"]:
+        print(f"\nWarning: ingestion-only modules loaded at serve time: {', '.join(report['loaded_ingestion_modules'])}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,101 @@
+import hashlib
+import math
+import re
+from typing import List
+
+from langchain_core.embeddings import Embeddings
+
+from app.usage import tracker, current_stage
+
+_encoding = None
+
+
+def count_tokens(text: str) -> int:
+    """Token count using tiktoken when its encoding is available, else a ~4 chars/token estimate."""
+    global _encoding
+    if _encoding is None:
+        try:
+            import tiktoken
+            _encoding = tiktoken.get_encoding("cl100k_base")
+        except Exception:
+            _encoding = False
+    if _encoding:
+        return len(_encoding.encode(text))
+    return max(1, len(text) // 4)
+
+
+def hash_embedding(text: str, dim: int = 256) -> List[float]:
+    """Deterministic bag-of-words feature-hashing vector, L2-normalized.
+    Texts sharing words land close together, which is enough for offline benchmarks.
+    """
+    vec = [0.0] * dim
+    for token in re.findall(r"[a-z0-9]+", (text or "").lower()):
+        digest = hashlib.md5(token.encode("utf-8")).digest()
+        bucket = int.from_bytes(digest[:4], "little") % dim
+        vec[bucket] += 1.0 if digest[4] & 1 else -1.0
+    norm = math.sqrt(sum(v * v for v in vec)) or 1.0
+    return [v / norm for v in vec]
+
+
+class HashEmbeddings(Embeddings):
+    """Offline stand-in for OpenAIEmbeddings (EMBEDDINGS_BACKEND=hash)."""
+
+    model = "hash-embedding"
+
+    def __init__(self, dim: int = 256):
+        self.dim = dim
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        return [hash_embedding(t, self.dim) for t in texts]
+
+    def embed_query(self, text: str) -> List[float]:
+        return hash_embedding(text, self.dim)
+
+
+class MeteredEmbeddings(Embeddings):
+    """Wraps an embeddings client and reports the tokens it sends to the usage tracker."""
+
+    def __init__(self, inner: Embeddings, model: str):
+        self.inner = inner
+        self.model = model
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        vectors = self.inner.embed_documents(texts)
+        tracker.record(self.model, sum(count_tokens(t) for t in texts), stage_name=current_stage("ingestion"))
+        return vectors
+
+    def embed_query(self, text: str) -> List[float]:
+        vector = self.inner.embed_query(text)
+        tracker.record(self.model, count_tokens(text), stage_name=current_stage("retrieval"))
+        return vector
+
+
+class CachedEmbeddings(Embeddings):
+    """Serves repeated texts from a cache (see app.cache.make_cache) keyed by model and text hash."""
+
+    def __init__(self, inner: Embeddings, model: str, cache):
+        self.inner = inner
+        self.model = model
+        self.cache = cache
+
+    def _key(self, text: str) -> str:
+        return f"{self.model}:{hashlib.sha256(text.encode('utf-8')).hexdigest()}"
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        keys = [self._key(t) for t in texts]
+        vectors = [self.cache.get(k) for k in keys]
+        missing = [i for i, v in enumerate(vectors) if v is None]
+        if missing:
+            fresh = self.inner.embed_documents([texts[i] for i in missing])
+            for i, vector in zip(missing, fresh):
+                vectors[i] = vector
+                self.cache.set(keys[i], list(vector))
+        return vectors
+
+    def embed_query(self, text: str) -> List[float]:
+        key = self._key(text)
+        vector = self.cache.get(key)
+        if vector is None:
+            vector = self.inner.embed_query(text)
+            self.cache.set(key, list(vector))
+        return vector
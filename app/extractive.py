@@ -0,0 +1,107 @@
+import math
+import re
+from collections import Counter
+from typing import List, Tuple
+
+STOPWORDS = {
+    "a", "an", "and", "are", "as", "at", "be", "by", "can", "do", "does", "for", "from", "how", "i", "in",
+    "is", "it", "me", "my", "of", "on", "or", "should", "that", "the", "this", "to", "we", "what", "when",
+    "where", "which", "who", "why", "will", "with", "you", "your",
+}
+
+# Questions asking for a procedure prefer a numbered step list over loose sentences
+HOW_TO_HINTS = ("how", "steps", "process", "procedure", "create", "add", "set up", "setup", "configure", "make")
+
+_STEP_LINE = re.compile(r"^\s*(?:step\s*)?(\d{1,2})\s*[.):-]\s+(.*)", re.IGNORECASE)
+_SENTENCE_SPLIT = re.compile(r"(?<=[.!?])\s+(?=[A-Z0-9])")
+
+NO_EXTRACT_RESPONSE = "I couldn't find a direct answer in the HotelMate guides for that question."
+
+
+def tokenize(text: str) -> List[str]:
+    """Lowercased content words, truncated to 5 characters as a crude stemmer (create/creating)."""
+    return [t[:5] for t in re.findall(r"[a-z0-9][a-z0-9\-]*", (text or "").lower()) if t not in STOPWORDS]
+
+
+def split_units(text: str) -> List[Tuple[str, str]]:
+    """Split a chunk into ("steps", block) and ("sentence", text) units, in document order."""
+    units = []
+    steps, prose = [], []
+
+    def flush_prose():
+        if prose:
+            for sentence in _SENTENCE_SPLIT.split(" ".join(prose)):
+                if len(sentence.strip()) > 20:
+                    units.append(("sentence", sentence.strip()))
+            prose.clear()
+
+    def flush_steps():
+        if len(steps) >= 2:
+            units.append(("steps", "\n".join(steps)))
+        elif steps:
+            prose.extend(steps)
+        steps.clear()
+
+    for line in (text or "").splitlines():
+        line = line.strip()
+        if not line:
+            continue
+        match = _STEP_LINE.match(line)
+        if match:
+            flush_prose()
+            steps.append(f"{match.group(1)}. {match.group(2).strip()}")
+        elif steps and not line[:1].isupper():
+            # Wrapped continuation of the previous step
+            steps[-1] += " " + line
+        else:
+            flush_steps()
+            prose.append(line)
+    flush_steps()
+    flush_prose()
+    return units
+
+
+def extractive_answer(query: str, docs, max_sentences: int = 3) -> str:
+    """Answer from the retrieved chunks with local IDF-weighted scoring only (no model calls)."""
+    query_terms = set(tokenize(query))
+    if not query_terms:
+        return NO_EXTRACT_RESPONSE
+
+    candidates = []
+    for rank, doc in enumerate(docs):
+        previous = ""
+        for position, (kind, text) in enumerate(split_units(getattr(doc, "page_content", "") or "")):
+            # A step list is usually introduced by a heading or sentence, so score it with that lead-in
+            scored_text = f"{previous} {text}" if kind == "steps" else text
+            candidates.append((rank, position, kind, text, Counter(tokenize(scored_text))))
+            previous = text
+    if not candidates:
+        return NO_EXTRACT_RESPONSE
+
+    doc_freq = Counter()
+    for *_, terms in candidates:
+        doc_freq.update(set(terms))
+    n = len(candidates)
+    idf = {term: math.log(1 + n / (1 + doc_freq[term])) for term in query_terms}
+
+    how_to = any(hint in query.lower() for hint in HOW_TO_HINTS)
+    scored = []
+    for rank, position, kind, text, terms in candidates:
+        overlap = sum(idf[t] for t in query_terms if t in terms)
+        if overlap == 0:
+            continue
+        score = overlap / (1 + 0.15 * rank)
+        if kind == "steps" and how_to:
+            score *= 1.5
+        scored.append((score, rank, position, kind, text))
+    if not scored:
+        return NO_EXTRACT_RESPONSE
+
+    scored.sort(key=lambda item: item[0], reverse=True)
+    best = scored[0]
+    if best[3] == "steps":
+        return best[4]
+
+    sentences = [item for item in scored if item[3] == "sentence"][:max_sentences]
+    sentences.sort(key=lambda item: (item[1], item[2]))
+    return " ".join(item[4] for item in sentences)
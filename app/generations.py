@@ -0,0 +1,308 @@
+"""Versioned index generations: build, validate, hot-swap and roll back the chain's retriever.
+The live generation id is published in `CURRENT` so every worker follows a swap.
+"""
+import json
+import os
+import shutil
+import threading
+import time
+from typing import Callable, Dict, List, Optional
+
+from app.chatbot import build_index_artifact, corpus_version, retrieve_batch, unwrap_retriever, with_reranking
+from app.index_store import ArtifactIndex, ArtifactRetriever, read_manifest
+from app.metrics import metrics
+
+INDEX_GENERATIONS_DIR = os.environ.get("INDEX_GENERATIONS_DIR", ".cache/generations")
+INDEX_MEMORY_BUDGET_MB = float(os.environ.get("INDEX_MEMORY_BUDGET_MB", "512"))
+# Generations kept on disk (loaded or not); older directories are deleted
+INDEX_GENERATIONS_KEEP = int(os.environ.get("INDEX_GENERATIONS_KEEP", "3"))
+# A candidate must reach this mean keyword match rate and not regress more than this versus live
+INDEX_MIN_KEYWORD_RATE = float(os.environ.get("INDEX_MIN_KEYWORD_RATE", "0.3"))
+INDEX_MAX_REGRESSION = float(os.environ.get("INDEX_MAX_REGRESSION", "0.05"))
+# Seconds between checks of the CURRENT pointer (0 disables cross-worker sync)
+INDEX_GENERATION_POLL_S = float(os.environ.get("INDEX_GENERATION_POLL_S", "5"))
+
+CURRENT_FILE = "CURRENT"
+VALIDATION_DATA = ("test_data/rag_retrieval_test_data.json", "retrieval_test_cases")
+
+metrics.describe("index_generation_swaps_total", "Index generation activations by action (activate, rollback, sync).")
+
+
+def estimate_index_bytes(index) -> int:
+    """Approximate resident size of an ArtifactIndex: vectors plus chunk and parent text."""
+    documents = [*index.chunks, *getattr(index, "parents", {}).values()]
+    return int(index.vectors.nbytes) + sum(len(doc.page_content) for doc in documents)
+
+
+def index_memory(retriever) -> dict:
+    """Index memory by part in MB: vectors (memory-mapped ones live in the shared page cache),
+    chunk text and parent-section text.
+    """
+    retriever = unwrap_retriever(retriever)
+    index = getattr(retriever, "index", None)
+    if index is None or not hasattr(index, "vectors"):
+        return {"kind": type(retriever).__name__, "total_mb": round(estimate_retriever_bytes(retriever) / 1e6, 2)}
+    parents = getattr(index, "parents", {}) or {}
+    return {
+        "kind": "artifact",
+        "chunks": len(index.chunks),
+        "vectors_mb": round(index.vectors.nbytes / 1e6, 2),
+        "vectors_mapped": getattr(index.vectors, "base", None) is not None,
+        "chunk_text_mb": round(sum(len(doc.page_content) for doc in index.chunks) / 1e6, 2),
+        "parent_text_mb": round(sum(len(doc.page_content) for doc in parents.values()) / 1e6, 2),
+    }
+
+
+def estimate_retriever_bytes(retriever) -> int:
+    """Approximate resident size of a retriever's index: vectors plus chunk text."""
+    retriever = unwrap_retriever(retriever)
+    index = getattr(retriever, "index", None)
+    if index is not None:
+        return estimate_index_bytes(index)
+    store = getattr(getattr(retriever, "vectorstore", None), "store", None) or {}
+    return sum(len(item.get("vector", ())) * 8 + len(item.get("text", "")) for item in store.values())
+
+
+def retriever_embeddings(retriever):
+    """The embeddings object a chain's retriever queries with."""
+    retriever = unwrap_retriever(retriever)
+    embeddings = getattr(retriever, "embeddings", None)
+    if embeddings is None:
+        embeddings = retriever.vectorstore.embeddings
+    return embeddings
+
+
+def validate_retriever(retriever, cases: Optional[List[dict]] = None) -> dict:
+    """Mean keyword match rate of the retrieval test set against `retriever`."""
+    if cases is None:
+        path, key = VALIDATION_DATA
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                cases = json.load(f).get(key, [])
+        except (OSError, ValueError):
+            cases = []
+    if not cases:
+        return {"cases": 0, "keyword_rate": 0.0}
+    results = retrieve_batch(retriever, [case["question"] for case in cases])
+    rates = []
+    for case, docs in zip(cases, results):
+        text = " ".join(doc.page_content for doc in docs).lower()
+        keywords = case.get("expected_keywords", [])
+        rates.append(sum(kw.lower() in text for kw in keywords) / len(keywords) if keywords else 0.0)
+    return {"cases": len(cases), "keyword_rate": round(sum(rates) / len(rates), 4)}
+
+
+class Generation:
+    def __init__(self, gen_id: str, retriever, version: str, path: Optional[str] = None):
+        self.id = gen_id
+        self.retriever = retriever
+        self.version = version
+        self.path = path
+        self.bytes = estimate_retriever_bytes(retriever)
+        self.loaded_at = time.time()
+        self.validation: Optional[dict] = None
+
+    def describe(self) -> dict:
+        return {
+            "id": self.id,
+            "version": self.version,
+            "path": self.path,
+            "memory_mb": round(self.bytes / 1e6, 2),
+            "loaded_at": self.loaded_at,
+            "validation": self.validation,
+        }
+
+
+class GenerationManager:
+    """Builds, validates, activates and rolls back index generations for one chain.
+    `on_activate(generation)` runs after every swap (e.g. to update cache keys).
+    """
+
+    def __init__(self, chain, embeddings=None, on_activate: Optional[Callable[[Generation], None]] = None,
+                 root: str = INDEX_GENERATIONS_DIR, memory_budget_mb: float = INDEX_MEMORY_BUDGET_MB):
+        self.chain = chain
+        self.embeddings = embeddings or retriever_embeddings(chain.retriever)
+        self.on_activate = on_activate
+        self.root = root
+        self.memory_budget = memory_budget_mb * 1e6
+        self.loaded: Dict[str, Generation] = {}
+        self.live: Optional[str] = None
+        self.previous: Optional[str] = None
+        self._lock = threading.RLock()
+        self._build_lock = threading.Lock()
+        self._poller = None
+        # State of the latest background rebuild (see start_rebuild)
+        self.rebuild_state: Optional[dict] = None
+
+    def adopt_current(self, version: str):
+        """Register the retriever the chain was started with as the initial generation."""
+        with self._lock:
+            generation = Generation("initial", self.chain.retriever, version)
+            self.loaded[generation.id] = generation
+            self.live = generation.id
+
+    def load(self, gen_id: str) -> Generation:
+        with self._lock:
+            if gen_id in self.loaded:
+                return self.loaded[gen_id]
+        path = os.path.join(self.root, gen_id)
+        index = ArtifactIndex(path)
+        live = unwrap_retriever(self.chain.retriever)
+        k = getattr(live, "k", None) or getattr(live, "search_kwargs", {}).get("k", 3)
+        retriever = with_reranking(ArtifactRetriever(index=index, embeddings=self.embeddings, k=k))
+        generation = Generation(gen_id, retriever, index.version, path)
+        with self._lock:
+            return self.loaded.setdefault(gen_id, generation)
+
+    def build(self, pdf_folder: str = "pdfs") -> Generation:
+        """Embed the PDFs into a new generation directory and load it (not yet live)."""
+        with self._build_lock:
+            gen_id = f"{time.strftime('%Y%m%d-%H%M%S', time.gmtime())}-{corpus_version(pdf_folder)[:8]}"
+            build_index_artifact(pdf_folder, os.path.join(self.root, gen_id), self.embeddings)
+            self._prune_disk(keep={gen_id})
+            return self.load(gen_id)
+
+    def validate(self, generation: Generation) -> dict:
+        result = validate_retriever(generation.retriever)
+        generation.validation = result
+        live = self.loaded.get(self.live)
+        if live is not None and live.validation is None and live is not generation:
+            live.validation = validate_retriever(live.retriever)
+        baseline = live.validation["keyword_rate"] if live is not None and live is not generation else 0.0
+        reasons = []
+        if result["keyword_rate"] < INDEX_MIN_KEYWORD_RATE:
+            reasons.append(f"keyword rate {result['keyword_rate']} below minimum {INDEX_MIN_KEYWORD_RATE}")
+        if result["keyword_rate"] < baseline - INDEX_MAX_REGRESSION:
+            reasons.append(f"keyword rate {result['keyword_rate']} regresses from live {baseline}")
+        return {**result, "baseline": baseline, "passed": not reasons, "reasons": reasons}
+
+    def activate(self, gen_id: str, action: str = "activate", publish: bool = True) -> Generation:
+        generation = self.load(gen_id)
+        with self._lock:
+            if gen_id != self.live:
+                # A single attribute assignment: in-flight requests already hold the old retriever
+                self.chain.retriever = generation.retriever
+                self.previous, self.live = self.live, gen_id
+                metrics.inc("index_generation_swaps_total", action=action)
+            self._reclaim()
+        if publish:
+            self._write_current(gen_id)
+        if self.on_activate is not None:
+            self.on_activate(generation)
+        return generation
+
+    def rollback(self) -> Generation:
+        with self._lock:
+            if self.previous is None:
+                raise ValueError("No previous generation to roll back to.")
+            previous = self.previous
+        return self.activate(previous, action="rollback")
+
+    def rebuild(self, pdf_folder: str = "pdfs", force: bool = False) -> dict:
+        """Build, validate and (if validation passes or `force`) activate a new generation."""
+        generation = self.build(pdf_folder)
+        report = self.validate(generation)
+        if report["passed"] or force:
+            self.activate(generation.id)
+        else:
+            with self._lock:
+                self.loaded.pop(generation.id, None)
+            shutil.rmtree(generation.path, ignore_errors=True)
+        return {"generation": generation.describe(), "validation": report, "activated": self.live == generation.id}
+
+    def start_rebuild(self, pdf_folder: str = "pdfs", force: bool = False) -> Optional[dict]:
+        """Run `rebuild` on a background thread; returns its state, or None if one is already running."""
+        with self._lock:
+            if self.rebuild_state is not None and self.rebuild_state["status"] == "running":
+                return None
+            state = {"status": "running", "force": force, "started_at": time.time()}
+            self.rebuild_state = state
+
+        def run():
+            try:
+                state["result"] = self.rebuild(pdf_folder, force)
+                state["status"] = "done"
+            except Exception as e:
+                state["error"] = str(e)
+                state["status"] = "failed"
+            state["finished_at"] = time.time()
+
+        threading.Thread(target=run, name="index-rebuild", daemon=True).start()
+        return dict(state)
+
+    def _reclaim(self):
+        """Drop loaded generations other than live/previous, oldest first, until under budget."""
+        pinned = {self.live, self.previous}
+        for gen_id in sorted(self.loaded, key=lambda g: self.loaded[g].loaded_at):
+            if self.memory_used() <= self.memory_budget:
+                break
+            if gen_id not in pinned:
+                del self.loaded[gen_id]
+
+    def memory_used(self) -> int:
+        return sum(g.bytes for g in self.loaded.values())
+
+    def _write_current(self, gen_id: str):
+        os.makedirs(self.root, exist_ok=True)
+        tmp_path = os.path.join(self.root, f"{CURRENT_FILE}.tmp-{os.getpid()}")
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            f.write(gen_id)
+        os.replace(tmp_path, os.path.join(self.root, CURRENT_FILE))
+
+    def _prune_disk(self, keep: set):
+        if not os.path.isdir(self.root):
+            return
+        generations = sorted(
+            name for name in os.listdir(self.root)
+            if os.path.isdir(os.path.join(self.root, name)) and read_manifest(os.path.join(self.root, name))
+        )
+        protected = set(keep) | {self.live, self.previous}
+        removable = [name for name in generations if name not in protected]
+        excess = len(generations) - INDEX_GENERATIONS_KEEP
+        for name in removable[:max(0, excess)]:
+            shutil.rmtree(os.path.join(self.root, name), ignore_errors=True)
+
+    def published(self) -> Optional[str]:
+        try:
+            with open(os.path.join(self.root, CURRENT_FILE), "r", encoding="utf-8") as f:
+                return f.read().strip() or None
+        except OSError:
+            return None
+
+    def sync(self) -> bool:
+        """Activate the generation named in CURRENT if it differs from the live one."""
+        gen_id = self.published()
+        if gen_id is None or gen_id == self.live:
+            return False
+        if gen_id not in self.loaded and not read_manifest(os.path.join(self.root, gen_id)):
+            # e.g. "initial" published by another worker after this one reclaimed its own
+            return False
+        self.activate(gen_id, action="sync", publish=False)
+        return True
+
+    def start_polling(self, interval: float = INDEX_GENERATION_POLL_S):
+        if interval <= 0 or self._poller is not None:
+            return
+
+        def poll():
+            while True:
+                time.sleep(interval)
+                try:
+                    self.sync()
+                except Exception:
+                    pass
+
+        self._poller = threading.Thread(target=poll, name="index-generation-sync", daemon=True)
+        self._poller.start()
+
+    def status(self) -> dict:
+        with self._lock:
+            return {
+                "live": self.live,
+                "previous": self.previous,
+                "published": self.published(),
+                "memory_mb": round(self.memory_used() / 1e6, 2),
+                "memory_budget_mb": round(self.memory_budget / 1e6, 2),
+                "generations": [g.describe() for g in self.loaded.values()],
+                "rebuild": dict(self.rebuild_state) if self.rebuild_state else None,
+            }
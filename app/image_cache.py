@@ -0,0 +1,126 @@
+"""Perceptual-hash (dHash) cache for image probes and answers, matched within a Hamming tolerance."""
+import io
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Optional
+
+from app.metrics import metrics
+
+# Hash grid side; the hash has IMAGE_HASH_SIZE**2 bits
+IMAGE_HASH_SIZE = int(os.environ.get("IMAGE_HASH_SIZE", "16"))
+# Maximum differing bits for two images to count as the same screen
+IMAGE_HASH_TOLERANCE = int(os.environ.get("IMAGE_HASH_TOLERANCE", "10"))
+IMAGE_CACHE_SIZE = int(os.environ.get("IMAGE_CACHE_SIZE", "1024"))
+IMAGE_CACHE_TTL_S = float(os.environ.get("IMAGE_CACHE_TTL_S", "86400"))
+
+metrics.describe("image_cache_lookups_total", "Perceptual image cache lookups by kind (probe, answer) and result.")
+
+
+def dhash(raw: bytes, size: int = IMAGE_HASH_SIZE) -> Optional[int]:
+    """Difference hash of an encoded image: one bit per horizontally adjacent pixel pair of a
+    (size+1) x size grayscale thumbnail. Returns None if the image cannot be decoded.
+    """
+    try:
+        from PIL import Image
+    except ImportError:
+        return None
+    try:
+        with Image.open(io.BytesIO(raw)) as image:
+            # Let JPEG decode at reduced scale; the thumbnail is tiny anyway
+            image.draft("L", ((size + 1) * 8, size * 8))
+            pixels = image.convert("L").resize((size + 1, size), Image.LANCZOS).tobytes()
+    except Exception:
+        return None
+    value = 0
+    for row in range(size):
+        offset = row * (size + 1)
+        for col in range(size):
+            value = (value << 1) | (pixels[offset + col] > pixels[offset + col + 1])
+    return value
+
+
+def hamming(a: int, b: int) -> int:
+    return (a ^ b).bit_count()
+
+
+class PerceptualCache:
+    """Thread-safe LRU cache whose keys are (kind, text, image hash); `get` returns the value of
+    the closest stored hash within `tolerance` bits for the same kind and text.
+    """
+
+    def __init__(self, max_entries: int = IMAGE_CACHE_SIZE, ttl: float = IMAGE_CACHE_TTL_S,
+                 tolerance: int = IMAGE_HASH_TOLERANCE):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.tolerance = tolerance
+        self._data = OrderedDict()  # (kind, text, hash) -> (expires_at, value)
+        self._buckets = {}  # (kind, text) -> set of hashes, so lookups only scan candidates
+        self._lock = threading.Lock()
+        self.hits = {}
+        self.misses = {}
+
+    def _remove(self, key):
+        self._data.pop(key, None)
+        bucket = self._buckets.get(key[:2])
+        if bucket is not None:
+            bucket.discard(key[2])
+            if not bucket:
+                del self._buckets[key[:2]]
+
+    def get(self, kind: str, image_hash: Optional[int], text: str = "") -> Optional[Any]:
+        if image_hash is None:
+            return None
+        now = time.time()
+        with self._lock:
+            best, best_distance = None, self.tolerance + 1
+            for candidate in list(self._buckets.get((kind, text), ())):
+                key = (kind, text, candidate)
+                if self._data[key][0] < now:
+                    self._remove(key)
+                    continue
+                distance = hamming(candidate, image_hash)
+                if distance < best_distance:
+                    best, best_distance = key, distance
+            counts = self.hits if best is not None else self.misses
+            counts[kind] = counts.get(kind, 0) + 1
+            if best is None:
+                value = None
+            else:
+                self._data.move_to_end(best)
+                value = self._data[best][1]
+        metrics.inc("image_cache_lookups_total", kind=kind, result="hit" if value is not None else "miss")
+        return value
+
+    def set(self, kind: str, image_hash: Optional[int], value: Any, text: str = ""):
+        if image_hash is None:
+            return
+        key = (kind, text, image_hash)
+        with self._lock:
+            self._data[key] = (time.time() + self.ttl, value)
+            self._data.move_to_end(key)
+            self._buckets.setdefault(key[:2], set()).add(image_hash)
+            while len(self._data) > self.max_entries:
+                self._remove(next(iter(self._data)))
+
+    def stats(self) -> dict:
+        """Entries and hit rate per kind."""
+        with self._lock:
+            report = {"entries": len(self._data), "tolerance_bits": self.tolerance, "kinds": {}}
+            for kind in sorted(set(self.hits) | set(self.misses)):
+                hits, misses = self.hits.get(kind, 0), self.misses.get(kind, 0)
+                report["kinds"][kind] = {
+                    "hits": hits,
+                    "misses": misses,
+                    "hit_rate": round(hits / (hits + misses), 4) if hits + misses else 0.0,
+                }
+        return report
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+            self._buckets.clear()
+
+    def __len__(self):
+        return len(self._data)
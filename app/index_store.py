@@ -0,0 +1,141 @@
+import json
+import os
+import shutil
+import time
+from typing import Any, List, Optional, Tuple
+
+import numpy as np
+from langchain_core.callbacks import CallbackManagerForRetrieverRun
+from langchain_core.documents import Document
+from langchain_core.retrievers import BaseRetriever
+
+# Prebuilt index artifact shared read-only by workers (on Vercel, built into `index/`)
+INDEX_ARTIFACT_DIR = os.environ.get("INDEX_ARTIFACT_DIR", "index" if os.environ.get("VERCEL") else "")
+
+VECTORS_FILE = "vectors.npy"
+CHUNKS_FILE = "chunks.jsonl"
+# Optional parent sections for small-to-big retrieval; chunks then carry a `parent_id`
+PARENTS_FILE = "parents.jsonl"
+# Children fetched per requested parent, since several children often share one parent
+PARENT_OVERFETCH = 4
+MANIFEST_FILE = "manifest.json"
+
+
+def read_manifest(path: str) -> Optional[dict]:
+    try:
+        with open(os.path.join(path, MANIFEST_FILE), "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def _write_documents(path: str, documents: List[Document]):
+    with open(path, "w", encoding="utf-8") as f:
+        for doc in documents:
+            f.write(json.dumps({"page_content": doc.page_content, "metadata": doc.metadata}, ensure_ascii=False) + "\n")
+
+
+def _read_documents(path: str) -> List[Document]:
+    documents = []
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            record = json.loads(line)
+            documents.append(Document(page_content=record["page_content"], metadata=record["metadata"]))
+    return documents
+
+
+def write_index_artifact(path: str, chunks: List[Document], vectors, version: str, model: str,
+                         parents: Optional[List[Document]] = None, chunking: str = "recursive",
+                         ingestion: Optional[dict] = None) -> dict:
+    """Write an index artifact atomically: build in a sibling temp dir, then rename into place."""
+    matrix = np.asarray(vectors, dtype=np.float32)
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    matrix = matrix / np.where(norms == 0, 1, norms)
+
+    tmp_path = f"{path.rstrip(os.sep)}.tmp-{os.getpid()}"
+    shutil.rmtree(tmp_path, ignore_errors=True)
+    os.makedirs(tmp_path)
+    np.save(os.path.join(tmp_path, VECTORS_FILE), matrix)
+    _write_documents(os.path.join(tmp_path, CHUNKS_FILE), chunks)
+    if parents:
+        _write_documents(os.path.join(tmp_path, PARENTS_FILE), parents)
+    manifest = {
+        "version": version,
+        "embedding_model": model,
+        "chunking": chunking,
+        "count": int(matrix.shape[0]),
+        "parents": len(parents or []),
+        "dim": int(matrix.shape[1]) if matrix.ndim == 2 else 0,
+        "created_at": time.time(),
+    }
+    if ingestion:
+        manifest["ingestion"] = ingestion
+    with open(os.path.join(tmp_path, MANIFEST_FILE), "w", encoding="utf-8") as f:
+        json.dump(manifest, f, indent=2)
+
+    old_path = None
+    if os.path.exists(path):
+        old_path = f"{path.rstrip(os.sep)}.old-{os.getpid()}"
+        os.rename(path, old_path)
+    os.rename(tmp_path, path)
+    if old_path:
+        shutil.rmtree(old_path, ignore_errors=True)
+    return manifest
+
+
+class ArtifactIndex:
+    """Read-only vector index over a memory-mapped matrix. Every worker process that maps the
+    same file shares its pages through the OS page cache instead of holding a private copy.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self.manifest = read_manifest(path) or {}
+        self.vectors = np.load(os.path.join(path, VECTORS_FILE), mmap_mode="r")
+        self.chunks = _read_documents(os.path.join(path, CHUNKS_FILE))
+        self.parents = {}
+        if os.path.exists(os.path.join(path, PARENTS_FILE)):
+            self.parents = {doc.metadata["parent_id"]: doc for doc in _read_documents(os.path.join(path, PARENTS_FILE))}
+
+    @property
+    def version(self) -> str:
+        return self.manifest.get("version", "")
+
+    def search(self, query_vector, k: int = 3) -> List[Tuple[Document, float]]:
+        if not self.chunks:
+            return []
+        query = np.asarray(query_vector, dtype=np.float32)
+        norm = np.linalg.norm(query)
+        if norm:
+            query = query / norm
+        scores = self.vectors @ query
+        k = min(k, len(scores))
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top])]
+        return [(self.chunks[i], float(scores[i])) for i in top]
+
+    def similarity_search_by_vector(self, embedding, k: int = 3, **kwargs) -> List[Document]:
+        if not self.parents:
+            return [doc for doc, _ in self.search(embedding, k)]
+        # Small-to-big: match small chunks, return each matched chunk's parent section once
+        results, seen = [], set()
+        for doc, _ in self.search(embedding, k * PARENT_OVERFETCH):
+            parent_id = doc.metadata.get("parent_id")
+            if parent_id in seen:
+                continue
+            seen.add(parent_id)
+            results.append(self.parents.get(parent_id, doc))
+            if len(results) == k:
+                break
+        return results
+
+
+class ArtifactRetriever(BaseRetriever):
+    """LangChain retriever over an ArtifactIndex."""
+
+    index: Any
+    embeddings: Any
+    k: int = 3
+
+    def _get_relevant_documents(self, query: str, *, run_manager: CallbackManagerForRetrieverRun) -> List[Document]:
+        return self.index.similarity_search_by_vector(self.embeddings.embed_query(query), k=self.k)
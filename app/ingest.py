@@ -0,0 +1,236 @@
+"""Batched, rate-limit-aware, checkpointed embedding for ingestion."""
+import contextvars
+import hashlib
+import os
+import random
+import re
+import threading
+import time
+from concurrent.futures import FIRST_EXCEPTION, ThreadPoolExecutor, wait
+from typing import List, Optional
+
+import numpy as np
+from langchain_core.embeddings import Embeddings
+
+from app.embeddings import count_tokens
+from app.metrics import metrics
+
+# Per-request limits: OpenAI accepts up to 2048 inputs and ~300k tokens per embeddings call
+EMBED_BATCH_TOKENS = int(os.environ.get("EMBED_BATCH_TOKENS", "20000"))
+EMBED_BATCH_SIZE = int(os.environ.get("EMBED_BATCH_SIZE", "256"))
+EMBED_CONCURRENCY = int(os.environ.get("EMBED_CONCURRENCY", "4"))
+EMBED_MAX_RETRIES = int(os.environ.get("EMBED_MAX_RETRIES", "6"))
+EMBED_MAX_BACKOFF_S = float(os.environ.get("EMBED_MAX_BACKOFF_S", "60"))
+# Completed batches are kept here until the run finishes ("" disables checkpointing)
+EMBED_CHECKPOINT_DIR = os.environ.get("EMBED_CHECKPOINT_DIR", ".cache/embed_checkpoints")
+
+RETRYABLE_ERRORS = {"RateLimitError", "APIConnectionError", "APITimeoutError", "InternalServerError", "Timeout"}
+_DURATION = re.compile(r"(\d+(?:\.\d+)?)(ms|s|m|h)")
+_DURATION_UNITS = {"ms": 0.001, "s": 1.0, "m": 60.0, "h": 3600.0}
+
+metrics.describe("ingestion_embed_batches_total", "Ingestion embedding batches by outcome (embedded, resumed, retried).")
+
+
+def make_batches(texts: List[str], max_tokens: int = EMBED_BATCH_TOKENS, max_items: int = EMBED_BATCH_SIZE) -> List[range]:
+    """Consecutive index ranges of `texts`, each within `max_tokens` and `max_items`."""
+    batches, start, tokens = [], 0, 0
+    for i, text in enumerate(texts):
+        size = count_tokens(text)
+        if i > start and (tokens + size > max_tokens or i - start >= max_items):
+            batches.append(range(start, i))
+            start, tokens = i, 0
+        tokens += size
+    if start < len(texts):
+        batches.append(range(start, len(texts)))
+    return batches
+
+
+def parse_duration(value: str) -> Optional[float]:
+    """Seconds in a rate-limit header value: "2", "1.5s", "20ms" or "6m0s"."""
+    value = (value or "").strip()
+    try:
+        return float(value)
+    except ValueError:
+        pass
+    parts = _DURATION.findall(value)
+    return sum(float(n) * _DURATION_UNITS[unit] for n, unit in parts) if parts else None
+
+
+def retry_delay(exc: Exception) -> Optional[float]:
+    """Seconds the provider asked us to wait, 0.0 for a retryable error without a hint, None if not retryable."""
+    response = getattr(exc, "response", None)
+    status = getattr(exc, "status_code", None) or getattr(response, "status_code", None)
+    if type(exc).__name__ not in RETRYABLE_ERRORS and status != 429 and not (status and status >= 500):
+        return None
+    headers = getattr(response, "headers", None) or {}
+    if headers.get("retry-after-ms"):
+        delay = parse_duration(headers["retry-after-ms"])
+        if delay is not None:
+            return delay / 1000
+    hints = [parse_duration(headers.get(name, "")) for name in
+             ("retry-after", "x-ratelimit-reset-requests", "x-ratelimit-reset-tokens")]
+    hints = [h for h in hints if h is not None]
+    return max(hints) if hints else 0.0
+
+
+class AdaptiveLimiter:
+    """Concurrency limit that halves on a rate limit (pausing everyone until the reset) and
+    grows by one after `limit` consecutive successes, up to `maximum`.
+    """
+
+    def __init__(self, maximum: int):
+        self.maximum = max(1, maximum)
+        self.limit = self.maximum
+        self.active = 0
+        self.paused_until = 0.0
+        self._successes = 0
+        self._cond = threading.Condition()
+
+    def acquire(self):
+        with self._cond:
+            while True:
+                pause = self.paused_until - time.monotonic()
+                if pause > 0:
+                    self._cond.wait(pause)
+                elif self.active < self.limit:
+                    self.active += 1
+                    return
+                else:
+                    self._cond.wait()
+
+    def release(self, ok: bool, backoff: float = 0.0):
+        with self._cond:
+            self.active -= 1
+            if ok:
+                self._successes += 1
+                if self._successes >= self.limit and self.limit < self.maximum:
+                    self.limit += 1
+                    self._successes = 0
+            else:
+                self.limit = max(1, self.limit // 2)
+                self._successes = 0
+                self.paused_until = max(self.paused_until, time.monotonic() + backoff)
+            self._cond.notify_all()
+
+
+class IngestionEmbedder(Embeddings):
+    """Bulk ingestion wrapper: `embed_documents` batches, parallelizes, retries and checkpoints.
+    The last run's throughput report is kept in `last_report`.
+    """
+
+    def __init__(self, inner: Embeddings, checkpoint_dir: Optional[str] = EMBED_CHECKPOINT_DIR,
+                 concurrency: int = EMBED_CONCURRENCY, batch_tokens: int = EMBED_BATCH_TOKENS,
+                 batch_size: int = EMBED_BATCH_SIZE, max_retries: int = EMBED_MAX_RETRIES):
+        self.inner = inner
+        self.model = getattr(inner, "model", "default")
+        self.checkpoint_dir = checkpoint_dir
+        self.concurrency = concurrency
+        self.batch_tokens = batch_tokens
+        self.batch_size = batch_size
+        self.max_retries = max_retries
+        self.last_report: Optional[dict] = None
+        self._stats_lock = threading.Lock()
+
+    def _count(self, stats: dict, key: str):
+        with self._stats_lock:
+            stats[key] += 1
+
+    def _checkpoint_path(self, texts: List[str]) -> Optional[str]:
+        if not self.checkpoint_dir:
+            return None
+        digest = hashlib.sha256(self.model.encode("utf-8"))
+        for text in texts:
+            digest.update(b"\0" + text.encode("utf-8"))
+        return os.path.join(self.checkpoint_dir, f"{digest.hexdigest()[:32]}.npy")
+
+    def _embed_batch(self, texts: List[str], limiter: AdaptiveLimiter, stats: dict) -> List[List[float]]:
+        for attempt in range(self.max_retries + 1):
+            limiter.acquire()
+            try:
+                vectors = self.inner.embed_documents(texts)
+            except Exception as exc:
+                hint = retry_delay(exc)
+                if hint is None or attempt == self.max_retries:
+                    limiter.release(False)
+                    raise
+                backoff = min(EMBED_MAX_BACKOFF_S, hint or (2 ** attempt) * random.uniform(0.5, 1.0))
+                limiter.release(False, backoff)
+                self._count(stats, "retries")
+                metrics.inc("ingestion_embed_batches_total", outcome="retried")
+                continue
+            limiter.release(True)
+            return vectors
+
+    def _run_batch(self, texts: List[str], limiter: AdaptiveLimiter, stats: dict) -> List[List[float]]:
+        path = self._checkpoint_path(texts)
+        if path and os.path.exists(path):
+            try:
+                vectors = np.load(path).tolist()
+                metrics.inc("ingestion_embed_batches_total", outcome="resumed")
+                self._count(stats, "resumed_batches")
+                return vectors
+            except (OSError, ValueError):
+                pass
+        vectors = self._embed_batch(texts, limiter, stats)
+        if path:
+            os.makedirs(self.checkpoint_dir, exist_ok=True)
+            tmp_path = f"{path[:-4]}.tmp-{threading.get_ident()}.npy"
+            np.save(tmp_path, np.asarray(vectors, dtype=np.float32))
+            os.replace(tmp_path, path)
+        metrics.inc("ingestion_embed_batches_total", outcome="embedded")
+        return vectors
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        texts = list(texts)
+        batches = [[texts[i] for i in batch] for batch in make_batches(texts, self.batch_tokens, self.batch_size)]
+        limiter = AdaptiveLimiter(self.concurrency)
+        stats = {"retries": 0, "resumed_batches": 0}
+        results: List[Optional[List[List[float]]]] = [None] * len(batches)
+        start = time.perf_counter()
+
+        with ThreadPoolExecutor(max_workers=limiter.maximum, thread_name_prefix="ingest-embed") as pool:
+            # One context copy per task so usage attribution (the "ingestion" stage) reaches every thread
+            futures = {
+                pool.submit(contextvars.copy_context().run, self._run_batch, batch, limiter, stats): n
+                for n, batch in enumerate(batches)
+            }
+            done, pending = wait(futures, return_when=FIRST_EXCEPTION)
+            for future in pending:
+                future.cancel()
+            for future in done:
+                if future.exception() is not None:
+                    # Finished batches stay checkpointed; the next run resumes from them
+                    raise future.exception()
+                results[futures[future]] = future.result()
+
+        vectors = [vector for batch in results for vector in batch]
+        seconds = time.perf_counter() - start
+        self.last_report = {
+            "chunks": len(texts),
+            "tokens": sum(count_tokens(t) for t in texts),
+            "batches": len(batches),
+            "resumed_batches": stats["resumed_batches"],
+            "retries": stats["retries"],
+            "concurrency": limiter.maximum,
+            "final_concurrency": limiter.limit,
+            "seconds": round(seconds, 3),
+            "chunks_per_s": round(len(texts) / seconds, 1) if seconds > 0 else 0.0,
+        }
+        self.clear_checkpoints(batches)
+        return vectors
+
+    def clear_checkpoints(self, batches: List[List[str]]):
+        """Drop a finished run's batch checkpoints."""
+        if not self.checkpoint_dir:
+            return
+        for batch in batches:
+            path = self._checkpoint_path(batch)
+            if os.path.exists(path):
+                os.remove(path)
+        try:
+            os.rmdir(self.checkpoint_dir)
+        except OSError:
+            pass
+
+    def embed_query(self, text: str) -> List[float]:
+        return self.inner.embed_query(text)
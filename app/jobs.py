@@ -0,0 +1,205 @@
+import asyncio
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from typing import Awaitable, Callable, Optional
+
+from app.metrics import metrics
+
+# On Vercel (VERCEL=1) only /tmp is writable
+JOB_STORE_PATH = os.environ.get("JOB_STORE_PATH", "/tmp/jobs.sqlite3" if os.environ.get("VERCEL") else ".cache/jobs.sqlite3")
+IMAGE_JOB_WORKERS = int(os.environ.get("IMAGE_JOB_WORKERS", "4"))
+# Finished jobs are kept (and reused for identical uploads) this long
+JOB_TTL_S = float(os.environ.get("JOB_TTL_S", "3600"))
+# A running job not updated for this long is assumed orphaned by a dead worker and re-queued
+JOB_LEASE_S = float(os.environ.get("JOB_LEASE_S", "300"))
+
+metrics.describe("image_jobs_total", "Async image jobs by outcome (submitted, deduplicated, done, failed).")
+
+
+class JobStore:
+    """SQLite job table that doubles as the work queue shared by every worker process.
+    Methods block; call them from coroutines with `asyncio.to_thread`.
+    """
+
+    def __init__(self, path: str = JOB_STORE_PATH):
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, timeout=10, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS jobs (id TEXT PRIMARY KEY, dedup_key TEXT, status TEXT, query TEXT, "
+            "content_type TEXT, image BLOB, result TEXT, error TEXT, created_at REAL, updated_at REAL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS jobs_dedup ON jobs (dedup_key, created_at)")
+        self._conn.execute("CREATE INDEX IF NOT EXISTS jobs_status ON jobs (status, created_at)")
+
+    @staticmethod
+    def dedup_key(image: bytes, query: str) -> str:
+        return hashlib.sha256(image).hexdigest() + ":" + hashlib.sha256((query or "").encode("utf-8")).hexdigest()[:16]
+
+    def submit(self, image: bytes, content_type: str, query: str, normalized_query: str) -> tuple[str, bool]:
+        """Queue a job, or return the id of a live/finished job for the same image and query.
+        Returns (job_id, deduplicated).
+        """
+        key = self.dedup_key(image, normalized_query)
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT id FROM jobs WHERE dedup_key = ? AND status != 'failed' AND created_at > ? "
+                "ORDER BY created_at DESC LIMIT 1",
+                (key, now - JOB_TTL_S),
+            ).fetchone()
+            if row:
+                return row[0], True
+            job_id = uuid.uuid4().hex
+            self._conn.execute(
+                "INSERT INTO jobs (id, dedup_key, status, query, content_type, image, created_at, updated_at) "
+                "VALUES (?, ?, 'queued', ?, ?, ?, ?, ?)",
+                (job_id, key, query, content_type, image, now, now),
+            )
+        return job_id, False
+
+    def claim_next(self) -> Optional[dict]:
+        """Atomically move the oldest queued job to running and return it."""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT id, query, content_type, image FROM jobs WHERE status = 'queued' ORDER BY created_at LIMIT 1"
+            ).fetchone()
+            if row is None:
+                return None
+            claimed = self._conn.execute(
+                "UPDATE jobs SET status = 'running', updated_at = ? WHERE id = ? AND status = 'queued'",
+                (time.time(), row[0]),
+            ).rowcount
+        if not claimed:
+            return None
+        return {"id": row[0], "query": row[1], "content_type": row[2], "image": row[3]}
+
+    def finish(self, job_id: str, result: Optional[dict] = None, error: Optional[str] = None):
+        status = "failed" if error else "done"
+        with self._lock:
+            self._conn.execute(
+                "UPDATE jobs SET status = ?, result = ?, error = ?, image = NULL, updated_at = ? WHERE id = ?",
+                (status, json.dumps(result) if result is not None else None, error, time.time(), job_id),
+            )
+
+    def get(self, job_id: str) -> Optional[dict]:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT id, status, result, error, created_at, updated_at FROM jobs WHERE id = ?", (job_id,)
+            ).fetchone()
+        if row is None:
+            return None
+        job = {"job_id": row[0], "status": row[1], "created_at": row[4], "updated_at": row[5]}
+        if row[2]:
+            job.update(json.loads(row[2]))
+        if row[3]:
+            job["error"] = row[3]
+        return job
+
+    def requeue_orphans(self) -> int:
+        with self._lock:
+            return self._conn.execute(
+                "UPDATE jobs SET status = 'queued', updated_at = ? WHERE status = 'running' AND updated_at < ?",
+                (time.time(), time.time() - JOB_LEASE_S),
+            ).rowcount
+
+    def purge_expired(self) -> int:
+        with self._lock:
+            return self._conn.execute(
+                "DELETE FROM jobs WHERE status IN ('done', 'failed') AND updated_at < ?", (time.time() - JOB_TTL_S,)
+            ).rowcount
+
+    def count(self, status: str) -> int:
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM jobs WHERE status = ?", (status,)).fetchone()[0]
+
+
+class JobWorkerPool:
+    """`workers` coroutines per process that claim queued jobs from the store and run `handler`.
+    The store is opened on first use, so importing the app does not touch the filesystem.
+    """
+
+    def __init__(self, handler: Callable[[dict], Awaitable[dict]], path: str = JOB_STORE_PATH,
+                 workers: int = IMAGE_JOB_WORKERS):
+        self.handler = handler
+        self.path = path
+        self.workers = workers
+        self.store: Optional[JobStore] = None
+        self._open_lock: Optional[asyncio.Lock] = None
+        self._wakeup: Optional[asyncio.Event] = None
+        self._tasks = []
+
+    async def start(self):
+        """Resume jobs left in an existing store; a new store is only created by `get_store`."""
+        if os.path.exists(self.path):
+            await self.get_store()
+
+    async def get_store(self, create: bool = True) -> Optional[JobStore]:
+        """The job store, opened (and the workers started) on first call. None if it does not
+        exist yet and `create` is off.
+        """
+        if self.store is not None:
+            return self.store
+        if not create and not os.path.exists(self.path):
+            return None
+        if self._open_lock is None:
+            self._open_lock = asyncio.Lock()
+        async with self._open_lock:
+            if self.store is None:
+                store = await asyncio.to_thread(JobStore, self.path)
+                await asyncio.to_thread(store.requeue_orphans)
+                await asyncio.to_thread(store.purge_expired)
+                self._wakeup = asyncio.Event()
+                self.store = store
+                self._tasks = [asyncio.create_task(self._run()) for _ in range(self.workers)]
+        return self.store
+
+    def queued(self) -> int:
+        return self.store.count("queued") if self.store is not None else 0
+
+    async def stop(self):
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    def notify(self):
+        if self._wakeup is not None:
+            self._wakeup.set()
+
+    async def _run(self):
+        while True:
+            job = await asyncio.to_thread(self.store.claim_next)
+            if job is None:
+                # Woken by a local submit, or poll so jobs queued by other processes are picked up
+                self._wakeup.clear()
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), timeout=1.0)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+            try:
+                result = await self.handler(job)
+                await asyncio.to_thread(self.store.finish, job["id"], result=result)
+                metrics.inc("image_jobs_total", outcome="done")
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                await asyncio.to_thread(self.store.finish, job["id"], error=getattr(e, "detail", None) or str(e))
+                metrics.inc("image_jobs_total", outcome="failed")
+
+
+async def wait_for_job(store: JobStore, job_id: str, wait_s: float) -> Optional[dict]:
+    """Long-poll: return the job once it is done/failed or after `wait_s` seconds."""
+    deadline = time.monotonic() + max(0.0, wait_s)
+    while True:
+        job = await asyncio.to_thread(store.get, job_id)
+        if job is None or job["status"] in ("done", "failed") or time.monotonic() >= deadline:
+            return job
+        await asyncio.sleep(0.25)
@@ -1,28 +1,156 @@
-from fastapi import FastAPI, HTTPException, Request, UploadFile, File, Form
-from fastapi.staticfiles import StaticFiles
-from fastapi.responses import HTMLResponse
-from fastapi.templating import Jinja2Templates
-from pydantic import BaseModel
-from app.chatbot import load_chain, filter_response, is_hotel_query, DEFAULT_OUT_OF_DOMAIN_RESPONSE
+import asyncio
 import base64
+import contextvars
+import json
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FuturesTimeout
+from typing import List, Optional
+
+from fastapi import FastAPI, HTTPException, Request, UploadFile, File, Form, Header, Depends
+from fastapi.responses import HTMLResponse, PlainTextResponse, Response, StreamingResponse
+from fastapi.templating import Jinja2Templates
 from langchain_core.messages import HumanMessage
-from langchain_openai import ChatOpenAI
+from pydantic import BaseModel
+
+from app import profiling, request_log, usage, timing
+from app.cache import make_cache
+from app.chatbot import (
+    DEFAULT_OUT_OF_DOMAIN_RESPONSE,
+    clean_response,
+    filter_response,
+    get_llm,
+    index_version as get_index_version,
+    is_hotel_query,
+    load_chain,
+    normalize_query,
+    retrieve_batch,
+    retrieve_fused,
+    run_chain,
+)
+from app.extractive import extractive_answer
+from app.generations import GenerationManager, index_memory, retriever_embeddings
+from app.image_cache import PerceptualCache, dhash
+from app.jobs import JobWorkerPool, wait_for_job
+from app.metrics import metrics
+from app.namespaces import (
+    NAMESPACE_PREBUILD, NamespaceManager, NamespaceNotReady, UnknownNamespace, active_namespace, use_namespace,
+)
+from app.precompute import PRECOMPUTE_REFRESH_ON_START, AnswerStore, refresh_stale
+from app.prefetch import PREFETCH_ENABLED, PREFETCH_MIN_CHARS, Prefetcher
+from app.rerank import reset_source_times
+from app.sessions import SessionStore, needs_rewrite
+from app.singleflight import SingleFlight
+from app.static_assets import StaticAssets
+from app.usage import tracker
 
 app = FastAPI()
-app.mount("/static", StaticFiles(directory="app/static"), name="static")
-qa_chain = load_chain()
+with timing.startup_phase("static_assets"):
+    static_assets = StaticAssets("app/static")
+with timing.startup_phase("load_chain"):
+    qa_chain = load_chain()
+with timing.startup_phase("index_version"):
+    # Part of every answer cache key, so cached answers never outlive the corpus
+    index_version = get_index_version()
 templates = Jinja2Templates(directory="app/templates")
+templates.env.globals["static_url"] = static_assets.url
 
 # Allowed image MIME types for attachments
 ALLOWED_IMAGE_TYPES = {"image/jpeg", "image/png", "image/webp"}
 
-# A lightweight vision LLM instance for handling image questions directly
-vision_llm = ChatOpenAI(model="gpt-4.1-mini", temperature=0)
+# Answers keyed by normalized query; also the only answer source in "cache_only" degraded mode
+answer_cache = make_cache("answers")
+metrics.register_gauge("answer_cache_entries", lambda: len(answer_cache))
+
+# Probe results and answers for visually identical screenshots, matched by perceptual hash
+image_cache = PerceptualCache()
+metrics.register_gauge("image_cache_entries", lambda: len(image_cache))
+
+# Zero-latency tier of answers precomputed offline (python -m app.precompute)
+with timing.startup_phase("answer_store"):
+    answer_store = AnswerStore().load()
+metrics.register_gauge("precomputed_answers", lambda: len(answer_store))
+metrics.describe("answer_tier_hits_total", "Requests answered without generation, by tier.")
+if PRECOMPUTE_REFRESH_ON_START and answer_store.stale_queries(index_version):
+    threading.Thread(target=refresh_stale, args=(answer_store, qa_chain, index_version), daemon=True).start()
+
+
+def on_generation_activated(generation):
+    """Point cache keys at the new index and regenerate precomputed answers built against the old one."""
+    global index_version
+    index_version = generation.version
+    reset_source_times()
+    if PRECOMPUTE_REFRESH_ON_START and answer_store.stale_queries(index_version):
+        threading.Thread(target=refresh_stale, args=(answer_store, qa_chain, index_version), daemon=True).start()
+
+
+# Index generations: rebuild/validate/swap the live retriever without a restart
+with timing.startup_phase("index_generations"):
+    generations = GenerationManager(qa_chain, on_activate=on_generation_activated)
+    generations.adopt_current(index_version)
+    generations.sync()
+    generations.start_polling()
+
+# Per-property indexes (namespaces/<name>/), searched together with the base index
+namespaces = NamespaceManager(qa_chain)
+if NAMESPACE_PREBUILD:
+    namespaces.prebuild()
+metrics.register_gauge("namespaces_loaded", lambda: len(namespaces.loaded))
+
+# Conversation sessions; follow-ups are rewritten into standalone questions
+sessions = SessionStore(get_llm)
+metrics.register_gauge("sessions_active", lambda: len(sessions))
+
+# Retrieval warmed from the partially typed query (POST /prefetch)
+prefetcher = Prefetcher()
+metrics.register_gauge("prefetch_entries", lambda: len(prefetcher))
+
+# Admin endpoints are disabled unless ADMIN_TOKEN is set
+ADMIN_TOKEN = os.environ.get("ADMIN_TOKEN", "")
+
+# Generation that misses this deadline is answered extractively instead (0 disables)
+GENERATION_DEADLINE_S = float(os.environ.get("GENERATION_DEADLINE_S", "8"))
+generation_pool = ThreadPoolExecutor(max_workers=int(os.environ.get("GENERATION_WORKERS", "16")),
+                                     thread_name_prefix="generation")
+# Concurrent identical questions share one upstream call
+answer_flight = SingleFlight("answer")
+
+# Image retrieval: sub-queries fused with reciprocal rank fusion
+IMAGE_MAX_SUBQUERIES = int(os.environ.get("IMAGE_MAX_SUBQUERIES", "6"))
+IMAGE_KEYWORD_GROUP_SIZE = int(os.environ.get("IMAGE_KEYWORD_GROUP_SIZE", "4"))
+IMAGE_SUMMARY_QUERY_CHARS = 500
+IMAGE_FUSED_DOCS = int(os.environ.get("IMAGE_FUSED_DOCS", "4"))
+
+# /chat/batch limits
+MAX_BATCH_SIZE = int(os.environ.get("MAX_BATCH_SIZE", "500"))
+BATCH_CONCURRENCY = int(os.environ.get("BATCH_CONCURRENCY", "8"))
+metrics.describe("generation_fallbacks_total", "Answers served extractively because generation missed its deadline or failed.")
+
+
+@app.middleware("http")
+async def server_timing(request: Request, call_next):
+    """Expose per-stage latencies via the Server-Timing header and log /chat and /chat-image requests."""
+    timings = timing.start_request()
+    event = None
+    if request_log.REQUEST_LOG_ENABLED and request.url.path in request_log.LOGGED_PATHS:
+        event = request_log.begin(request.url.path)
+    with timing.timed("total"):
+        response = await call_next(request)
+    if timings:
+        response.headers["Server-Timing"] = timing.server_timing_header(timings)
+    if event is not None:
+        request_log.finish(event, response.status_code, timings)
+    return response
+
+
+BUDGET_EXHAUSTED_RESPONSE = (
+    "The assistant is running in limited mode right now. Please try again later or rephrase a common question."
+)
 
 # ---- Helpers ---------------------------------------------------------------
-async def detect_hotel_from_image(b64_data: str, mime_type: str) -> tuple[bool, str]:
+async def detect_hotel_from_image(b64_data: str, mime_type: str) -> tuple[bool, str, list]:
     """Use the vision model to quickly OCR/summarize the image and decide hotel-relevance.
-    Returns (is_hotel_related, extracted_text_or_summary).
+    Returns (is_hotel_related, extracted_text_or_summary, keywords).
     """
     probe = [
         HumanMessage(content=[
@@ -35,20 +163,22 @@ async def detect_hotel_from_image(b64_data: str, mime_type: str) -> tuple[bool,
         ])
     ]
     try:
-        msg = vision_llm.invoke(probe)
+        with usage.stage("image_probe"):
+            msg = await get_llm().ainvoke(probe)
         text = getattr(msg, "content", "") or ""
     except Exception:
-        return False, ""
+        return False, "", []
 
     # Very light-weight JSON-ish extraction without importing json in case of minor format drift
     summary = ""
     keywords_blob = ""
+    kws = []
     if '"summary"' in text:
         try:
             import json as _json
             obj = _json.loads(text)
             summary = obj.get("summary", "") or ""
-            kws = obj.get("keywords", []) or []
+            kws = [str(k) for k in obj.get("keywords", []) or []]
             keywords_blob = ", ".join(kws)
         except Exception:
             summary = text
@@ -56,23 +186,76 @@ async def detect_hotel_from_image(b64_data: str, mime_type: str) -> tuple[bool,
         summary = text
 
     combined_text = f"{summary}\n{keywords_blob}".strip()
-    return is_hotel_query(combined_text), combined_text
+    return is_hotel_query(combined_text), combined_text, kws
 
 
-def retrieve_context(query_text: str, limit_chars: int = 2000) -> str:
-    """Pull relevant snippets from the PDF index to ground answers.
-    Falls back gracefully if retriever is unavailable.
+def image_subqueries(query: str, summary: str, keywords: list) -> list:
+    """Focused retrieval queries for an image turn: the user text, the OCR summary and small
+    keyword groups, instead of one long string that dilutes the embedding.
     """
+    subqueries = [(query or "").strip(), (summary or "").strip()[:IMAGE_SUMMARY_QUERY_CHARS]]
+    for start in range(0, len(keywords), IMAGE_KEYWORD_GROUP_SIZE):
+        subqueries.append(" ".join(keywords[start:start + IMAGE_KEYWORD_GROUP_SIZE]))
+    subqueries = [q for q in dict.fromkeys(subqueries) if q][:IMAGE_MAX_SUBQUERIES]
+    return subqueries or ["hotel reservation guidance"]
+
+
+def retrieve_image_documents(subqueries: list) -> list:
+    """Rank-fused documents for the image sub-queries, or a single combined lookup if that fails."""
     try:
-        retriever = getattr(qa_chain, "retriever", None)
-        if retriever is None:
-            # Try invoking the chain to get source docs
-            result = qa_chain.invoke({"query": query_text})
-            source_docs = result.get("source_documents", [])
-        else:
-            source_docs = retriever.get_relevant_documents(query_text)
+        docs = retrieve_fused(current_chain(), subqueries, limit=IMAGE_FUSED_DOCS)
     except Exception:
-        source_docs = []
+        return retrieve_documents(" ".join(subqueries))
+    request_log.note_documents(docs)
+    return docs
+
+
+def current_chain():
+    """The chain for the request's namespace (see use_namespace), else the base chain."""
+    namespace = active_namespace()
+    return namespace.chain if namespace is not None else qa_chain
+
+
+def answer_key(normalized: str) -> str:
+    """Answer cache key: index version, namespace (if not base) and normalized query."""
+    namespace = active_namespace()
+    prefix = namespace.cache_prefix(index_version) if namespace is not None else index_version
+    return f"{prefix}:{normalized}"
+
+
+def resolve_namespace(name: Optional[str]):
+    try:
+        return namespaces.get((name or "").strip().lower())
+    except UnknownNamespace as e:
+        raise HTTPException(status_code=404, detail=str(e))
+    except NamespaceNotReady as e:
+        raise HTTPException(status_code=503, detail=str(e), headers={"Retry-After": "10"})
+
+
+def retrieve_documents(query_text: str) -> list:
+    """Fetch source documents for a query, or [] if retrieval fails."""
+    try:
+        with usage.stage("retrieval"):
+            chain = current_chain()
+            retriever = getattr(chain, "retriever", None)
+            if retriever is None:
+                # Try invoking the chain to get source docs
+                result = chain.invoke({"query": query_text})
+                docs = result.get("source_documents", [])
+            else:
+                docs = retriever.get_relevant_documents(query_text)
+    except Exception:
+        return []
+    request_log.note_documents(docs)
+    return docs
+
+
+def retrieve_context(query_text: str, limit_chars: int = 2000, source_docs: Optional[list] = None) -> str:
+    """Pull relevant snippets from the PDF index to ground answers.
+    Falls back gracefully if retriever is unavailable.
+    """
+    if source_docs is None:
+        source_docs = retrieve_documents(query_text)
 
     # Concatenate text with a soft limit
     buf = []
@@ -89,58 +272,496 @@ def retrieve_context(query_text: str, limit_chars: int = 2000) -> str:
             break
     return "\n\n".join(buf).strip()
 
+def extractive_response(query_text: str, docs: Optional[list] = None) -> str:
+    """Answer from the retrieved chunks with local scoring only (no chat model call)."""
+    if not is_hotel_query(query_text):
+        return DEFAULT_OUT_OF_DOMAIN_RESPONSE
+    if docs is None:
+        docs = retrieve_documents(query_text)
+    with usage.stage("extractive"):
+        return extractive_answer(query_text, docs)
+
+
+def answer_with_deadline(query_text: str, docs: list) -> tuple[str, bool]:
+    """Generate an answer from `docs`, falling back to an extractive one if the LLM errors or
+    misses GENERATION_DEADLINE_S. Returns (answer, generated_by_llm).
+    """
+    if not is_hotel_query(query_text):
+        return DEFAULT_OUT_OF_DOMAIN_RESPONSE, True
+    # The abandoned call keeps running in the pool, so its tokens are still accounted for
+    future = generation_pool.submit(contextvars.copy_context().run, run_chain, current_chain(), query_text, docs)
+    try:
+        result = future.result(timeout=GENERATION_DEADLINE_S or None)
+        return clean_response(filter_response(query_text, result)), True
+    except FuturesTimeout:
+        reason = "deadline"
+    except Exception:
+        reason = "error"
+    metrics.inc("generation_fallbacks_total", reason=reason)
+    return extractive_response(query_text, docs), False
+
+
+def answer_documents(query_text: str) -> list:
+    """Documents to answer from: a prefetch of this query if one exists, else a fresh retrieval."""
+    if PREFETCH_ENABLED:
+        docs = prefetcher.take(answer_key(normalize_query(query_text)))
+        if docs is not None:
+            request_log.note_documents(docs)
+            request_log.annotate(prefetched=True)
+            return docs
+    return retrieve_documents(query_text)
+
+
+def compute_answer(query_text: str) -> tuple[str, bool]:
+    """Retrieve and generate (with deadline fallback) for a single query."""
+    docs = answer_documents(query_text) if is_hotel_query(query_text) else []
+    return answer_with_deadline(query_text, docs)
+
+
+def lookup_answer_tiers(normalized: str) -> tuple[Optional[str], Optional[str]]:
+    """Answer from the precomputed store or the answer cache, as (answer, tier) or (None, None)."""
+    namespace = active_namespace()
+    # Precomputed answers are built from the base index only
+    precomputed = answer_store.get(normalized, index_version) if namespace in (None, namespaces.base) else None
+    if precomputed is not None:
+        metrics.inc("answer_tier_hits_total", tier="precomputed")
+        request_log.annotate(tier="precomputed")
+        return precomputed, "precomputed"
+    cached = answer_cache.get(answer_key(normalized))
+    if cached is not None:
+        usage.mark_cache_hit()
+        metrics.inc("answer_tier_hits_total", tier="cache")
+        request_log.annotate(tier="cache")
+        return cached, "cache"
+    return None, None
+
+
+def degraded_answer(query_text: str, mode: str) -> str:
+    """Answer without calling the chat model once the daily budget is exhausted."""
+    if not is_hotel_query(query_text):
+        return DEFAULT_OUT_OF_DOMAIN_RESPONSE
+    if mode != "extractive":
+        return BUDGET_EXHAUSTED_RESPONSE
+    return extractive_response(query_text)
+
+
+def require_admin(x_admin_token: Optional[str] = Header(None)):
+    if not ADMIN_TOKEN or x_admin_token != ADMIN_TOKEN:
+        raise HTTPException(status_code=403, detail="Admin access required.")
+
+
 class QueryRequest(BaseModel):
     query: str
+    mode: Optional[str] = None  # "fast" answers extractively without calling the LLM
+    namespace: Optional[str] = None  # property/tenant index; also accepted as the X-Namespace header
+    session_id: Optional[str] = None  # returned by the first /chat call; follow-ups are resolved against it
+    start_session: bool = False  # without a session_id, start a new session and return its id
+
+
+class PrefetchRequest(BaseModel):
+    query: str  # the input so far
+    namespace: Optional[str] = None
+    session_id: Optional[str] = None
+
+
+class BatchQueryRequest(BaseModel):
+    queries: List[str]
+    mode: Optional[str] = None
+    namespace: Optional[str] = None
 
 @app.get("/", response_class=HTMLResponse)
 def read_root(request: Request):
     return templates.TemplateResponse("index.html", {"request": request})
 
-@app.post("/chat")
-def chat(request: QueryRequest):
+@app.api_route("/static/{path:path}", methods=["GET", "HEAD"], name="static")
+def static(path: str, request: Request):
+    """Fingerprinted, precompressed static assets (see app/static_assets.py)."""
+    result = static_assets.respond(
+        path,
+        accept_encoding=request.headers.get("accept-encoding", ""),
+        accept=request.headers.get("accept", ""),
+        if_none_match=request.headers.get("if-none-match", ""),
+    )
+    if result is None:
+        raise HTTPException(status_code=404, detail="Not found")
+    status, body, headers = result
+    return Response(content=body, status_code=status, headers=headers)
+
+@app.get("/metrics", response_class=PlainTextResponse)
+def metrics_endpoint():
+    return metrics.render()
+
+
+@app.get("/admin/usage", dependencies=[Depends(require_admin)])
+def admin_usage(day: Optional[str] = None, top: int = 10):
+    """Token and cost report for a UTC day (default today)."""
+    return tracker.report(day=day, top=top)
+
+
+@app.get("/admin/index", dependencies=[Depends(require_admin)])
+def admin_index_status():
+    """Live/previous index generations, their validation scores and memory use."""
+    return generations.status()
+
+
+@app.post("/admin/index/rebuild", status_code=202, dependencies=[Depends(require_admin)])
+def admin_index_rebuild(force: bool = False):
+    """Start building a new generation from the PDFs in the background; it is validated and swapped
+    in if it passes (or `force`). Progress and the result are under `rebuild` in GET /admin/index.
+    """
+    state = generations.start_rebuild(force=force)
+    if state is None:
+        raise HTTPException(status_code=409, detail="An index rebuild is already running.")
+    return state
+
+
+@app.post("/admin/index/rollback", dependencies=[Depends(require_admin)])
+def admin_index_rollback():
+    """Swap the previous generation back in."""
     try:
-        result = qa_chain.invoke({"query": request.query})
-        response = filter_response(request.query, result)
+        generations.rollback()
+    except ValueError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    return generations.status()
+
+
+@app.get("/admin/namespaces", dependencies=[Depends(require_admin)])
+def admin_namespaces():
+    """Available and loaded namespaces with their memory use."""
+    return namespaces.status()
+
+
+@app.get("/admin/profile", dependencies=[Depends(require_admin)])
+async def admin_profile(seconds: float = 10, mode: str = "sample", memory: bool = True, format: str = "json",
+                        top: int = 25):
+    """Profile this worker's live traffic for `seconds`. `mode` is sample (all threads) or cprofile
+    (event-loop thread). `format=collapsed` returns only the flamegraph input as text.
+    """
+    try:
+        result = await profiling.capture(seconds, mode, memory, top)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except profiling.CaptureInProgress as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    if format == "collapsed":
+        return PlainTextResponse(result["collapsed"])
+    return result
+
+
+@app.get("/admin/memory", dependencies=[Depends(require_admin)])
+async def admin_memory(deep: bool = False):
+    """This worker's memory: process totals, the live index, and (with `deep`) what caches and clients hold."""
+    # gc and deep_sizeof walk the heap, so keep them off the event loop
+    return await asyncio.to_thread(memory_report, deep)
 
-        for prefix in ["According to the provided context, ", "According to the context, "]:
-            if response.startswith(prefix):
-                response = response[len(prefix):]
-        if response and response[0].islower():
-            response = response[0].upper() + response[1:]
 
+def memory_report(deep: bool) -> dict:
+    embeddings = retriever_embeddings(qa_chain.retriever)
+    caches = {
+        "answers": answer_cache,
+        "embeddings": getattr(embeddings, "cache", None),
+        "images": image_cache,
+        "prefetch": prefetcher.results,
+        "sessions": sessions.cache,
+        "precomputed": answer_store,
+    }
+    report = {
+        "process": profiling.process_memory(),
+        "index": index_memory(qa_chain.retriever),
+        "generations_mb": generations.status()["memory_mb"],
+        "namespaces_mb": namespaces.status()["memory_mb"],
+        "cache_entries": {name: len(cache) for name, cache in caches.items() if cache is not None},
+    }
+    if deep:
+        report["caches_mb"] = profiling.memory_breakdown({n: c for n, c in caches.items() if c is not None})
+        report["clients_mb"] = profiling.memory_breakdown({
+            "llm": get_llm(), "embeddings": getattr(embeddings, "inner", embeddings),
+        })
+    return report
+
+
+@app.get("/admin/image-cache", dependencies=[Depends(require_admin)])
+def admin_image_cache():
+    """Perceptual image cache size and hit rate per kind (probe, answer)."""
+    return image_cache.stats()
+
+
+@app.post("/chat")
+def chat(request: QueryRequest, x_namespace: Optional[str] = Header(None)):
+    namespace = resolve_namespace(request.namespace or x_namespace)
+    session_id = request.session_id or (sessions.new_id() if request.start_session else None)
+    with usage.request_scope("/chat", normalize_query(request.query)), use_namespace(namespace):
+        degraded = tracker.degraded_mode()
+        query = request.query
+        if request.session_id:
+            # Follow-ups ("and how do I cancel it?") are answered as a standalone question
+            query = sessions.standalone_query(sessions.load(session_id), query, allow_llm=not degraded)
+        request_log.note_query(request.query, normalize_query(query))
+        request_log.annotate(namespace=namespace.name, mode=request.mode, follow_up=query != request.query)
+        response = answer_chat(query, request.mode, degraded)
+        if session_id:
+            sessions.record(session_id, request.query, response, allow_llm=not degraded)
+    if not session_id:
         return {"response": response}
+    return {"response": response, "session_id": session_id}
+
+
+def answer_chat(query: str, mode: Optional[str], degraded: Optional[str]) -> str:
+    normalized = normalize_query(query)
+    cache_key = answer_key(normalized)
+    in_domain = is_hotel_query(query)
+    request_log.annotate(in_domain=in_domain)
+    cached, _ = lookup_answer_tiers(normalized)
+    if cached is not None:
+        tracker.record_request("/chat", cache_hit=True)
+        return cached
+
+    try:
+        if degraded:
+            response = degraded_answer(query, degraded)
+            request_log.annotate(tier="degraded")
+        elif mode == "fast":
+            response = extractive_response(query, answer_documents(query) if in_domain else None)
+            request_log.annotate(tier="extractive")
+        else:
+            response, generated = answer_flight.do(cache_key, compute_answer, query)
+            request_log.annotate(tier="filter" if not in_domain else "generated" if generated else "extractive")
+            if generated:
+                answer_cache.set(cache_key, response)
+        tracker.record_request("/chat", cache_hit=False, degraded=bool(degraded))
+        return response
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 
+@app.post("/prefetch", status_code=202)
+def prefetch(request: PrefetchRequest, http_request: Request, x_namespace: Optional[str] = Header(None)):
+    """Warm the query embedding and retrieval for a partially typed query; returns immediately.
+    `status` is scheduled, cached, in_flight, busy, answered (an answer tier already has it) or skipped.
+    """
+    query = (request.query or "").strip()
+    if not PREFETCH_ENABLED or len(query) < PREFETCH_MIN_CHARS or not is_hotel_query(query):
+        return {"status": "skipped"}
+    if request.session_id and needs_rewrite(sessions.load(request.session_id), query):
+        # Follow-ups are answered as a rewritten question, so this text would never be looked up
+        return {"status": "skipped"}
+    namespace = resolve_namespace(request.namespace or x_namespace)
+    # Rate limited per host; the client-chosen session id only scopes which prefetch supersedes which
+    host = http_request.client.host if http_request.client else "unknown"
+    client = f"{host}:{request.session_id or ''}"
+    normalized = normalize_query(query)
+    with usage.request_scope("/prefetch", normalized), use_namespace(namespace):
+        if namespace is namespaces.base and answer_store.get(normalized, index_version) is not None:
+            return {"status": "answered"}
+        key = answer_key(normalized)
+        if answer_cache.get(key) is not None:
+            return {"status": "answered"}
+        status = prefetcher.schedule(client, key, lambda: retrieve_documents(query), rate_key=host)
+    if status == "rate_limited":
+        raise HTTPException(status_code=429, detail="Prefetch rate limit exceeded.")
+    return {"status": status}
+
+
+@app.post("/chat/batch")
+async def chat_batch(request: BatchQueryRequest, x_namespace: Optional[str] = Header(None)):
+    """Answer many queries in one call, streamed back as NDJSON lines
+    {"index", "query", "response", "source"} in completion order.
+    """
+    if len(request.queries) > MAX_BATCH_SIZE:
+        raise HTTPException(status_code=413, detail=f"At most {MAX_BATCH_SIZE} queries per batch.")
+    namespace = await asyncio.to_thread(resolve_namespace, request.namespace or x_namespace)
+
+    groups = {}
+    for i, query in enumerate(request.queries):
+        groups.setdefault(normalize_query(query), []).append(i)
+
+    def lines(normalized, response, source):
+        return "".join(
+            json.dumps({"index": i, "query": request.queries[i], "response": response, "source": source}) + "\n"
+            for i in groups[normalized]
+        )
+
+    def lookup_all() -> dict:
+        # Precomputed/cache lookups can hit SQLite, so they run in one worker thread
+        found = {}
+        for normalized in groups:
+            with usage.request_scope("/chat/batch", normalized), use_namespace(namespace):
+                found[normalized] = lookup_answer_tiers(normalized)
+        return found
+
+    async def stream():
+        degraded = await asyncio.to_thread(tracker.degraded_mode)
+        found = await asyncio.to_thread(lookup_all)
+        pending = []
+        for normalized, indices in groups.items():
+            query = request.queries[indices[0]]
+            cached, tier = found[normalized]
+            if cached is not None:
+                tracker.record_request("/chat/batch", cache_hit=True)
+                yield lines(normalized, cached, tier)
+            elif not is_hotel_query(query):
+                yield lines(normalized, DEFAULT_OUT_OF_DOMAIN_RESPONSE, "filter")
+            elif degraded:
+                answer = await asyncio.to_thread(degraded_answer, query, degraded)
+                yield lines(normalized, answer, "degraded")
+            else:
+                pending.append(normalized)
+        if not pending:
+            return
+
+        queries = [request.queries[groups[n][0]] for n in pending]
+        with usage.request_scope("/chat/batch"):
+            try:
+                all_docs = await asyncio.to_thread(retrieve_batch, namespace.chain, queries)
+            except Exception:
+                all_docs = [[] for _ in queries]
+
+        semaphore = asyncio.Semaphore(BATCH_CONCURRENCY)
+
+        async def answer(normalized, query, docs):
+            async with semaphore:
+                with usage.request_scope("/chat/batch", normalized):
+                    if request.mode == "fast":
+                        response = await asyncio.to_thread(extractive_response, query, docs)
+                        generated = False
+                    else:
+                        response, generated = await answer_flight.do_async(
+                            answer_key(normalized), answer_with_deadline, query, docs)
+                    tracker.record_request("/chat/batch", cache_hit=False)
+            if generated:
+                answer_cache.set(answer_key(normalized), response)
+            return normalized, response, "generated" if generated else "extractive"
+
+        # Tasks copy the current context, so each one answers from the request's namespace
+        with use_namespace(namespace):
+            tasks = [asyncio.create_task(answer(n, q, d)) for n, q, d in zip(pending, queries, all_docs)]
+        for next_done in asyncio.as_completed(tasks):
+            yield lines(*(await next_done))
+
+    return StreamingResponse(stream(), media_type="application/x-ndjson")
+
+
 # New endpoint: /chat-image
 @app.post("/chat-image")
-async def chat_image(query: str = Form(""), image: UploadFile = File(...)):
+async def chat_image(query: str = Form(""), image: UploadFile = File(...), namespace: str = Form(""),
+                     session_id: str = Form(""), start_session: bool = Form(False),
+                     x_namespace: Optional[str] = Header(None)):
     """Handle a chat turn that includes ONE image attachment.
     Accepts: multipart/form-data with fields `image` (file) and optional `query` (text).
     Uses GPT-4.1-mini in vision mode to answer about the image.
     """
+    raw = await image.read()
+    resolved = await asyncio.to_thread(resolve_namespace, namespace or x_namespace)
+    request_log.note_query(query, normalize_query(query))
+    request_log.annotate(namespace=resolved.name, image_bytes=len(raw))
+    with usage.request_scope("/chat-image", normalize_query(query)), use_namespace(resolved):
+        result = await answer_image_query(query, raw, image.content_type)
+    # Record the turn so text follow-ups can refer back to the image
+    session_id = session_id or (sessions.new_id() if start_session else "")
+    if not session_id:
+        return result
+    degraded = await asyncio.to_thread(tracker.degraded_mode)
+    await asyncio.to_thread(sessions.record, session_id, query or "(image)", result.get("response", ""), not degraded)
+    return {**result, "session_id": session_id}
+
+
+# ---- Async image jobs -------------------------------------------------------
+async def run_image_job(job: dict) -> dict:
+    with usage.request_scope("/chat-image/jobs", normalize_query(job["query"])):
+        return await answer_image_query(job["query"], job["image"], job["content_type"])
+
+
+job_pool = JobWorkerPool(run_image_job)
+metrics.register_gauge("image_jobs_queued", job_pool.queued)
+
+
+@app.on_event("startup")
+async def start_job_workers():
+    await job_pool.start()
+
+
+@app.on_event("shutdown")
+async def stop_job_workers():
+    await job_pool.stop()
+    request_log.writer.stop()
+
+
+@app.post("/chat-image/jobs", status_code=202)
+async def submit_image_job(query: str = Form(""), image: UploadFile = File(...)):
+    """Accept a /chat-image request and return a job id immediately.
+    Identical uploads (same image bytes and normalized query) share one job.
+    """
+    if image.content_type not in ALLOWED_IMAGE_TYPES:
+        raise HTTPException(status_code=415, detail="Only JPEG, PNG, or WEBP images are supported.")
+    raw = await image.read()
+    job_store = await job_pool.get_store()
+    job_id, deduplicated = await asyncio.to_thread(job_store.submit, raw, image.content_type, query, normalize_query(query))
+    metrics.inc("image_jobs_total", outcome="deduplicated" if deduplicated else "submitted")
+    job_pool.notify()
+    status = (await asyncio.to_thread(job_store.get, job_id) or {}).get("status", "queued")
+    return {"job_id": job_id, "status": status, "deduplicated": deduplicated}
+
+
+@app.get("/chat-image/jobs/{job_id}")
+async def get_image_job(job_id: str, wait: float = 0):
+    """Job status and, once done, its response. `wait` (seconds, max 30) long-polls for completion."""
+    job_store = await job_pool.get_store(create=False)
+    job = await wait_for_job(job_store, job_id, min(wait, 30.0)) if job_store is not None else None
+    if job is None:
+        raise HTTPException(status_code=404, detail="Unknown job.")
+    return job
+
+
+async def answer_image_query(query: str, raw: bytes, content_type: str) -> dict:
+    """Full image pipeline shared by /chat-image and the async job workers."""
     # Determine if the request should be allowed (text OR image-derived hotel relevance)
     allow = is_hotel_query((query or ""))
+    # A SQLite read with CACHE_BACKEND=sqlite, so off the event loop
+    degraded = await asyncio.to_thread(tracker.degraded_mode)
+    if degraded:
+        request_log.annotate(tier="degraded")
+        # Vision calls are the most expensive path; answer from the text alone
+        tracker.record_request("/chat-image", cache_hit=False, degraded=True)
+        if not (query or "").strip():
+            return {"response": BUDGET_EXHAUSTED_RESPONSE}
+        return {"response": degraded_answer(query, degraded)}
 
-    # Read and base64-encode the image so we can inspect it and pass it inline
-    raw = await image.read()
+    image_hash = await asyncio.to_thread(dhash, raw)
+    image_answer_key = answer_key(normalize_query(query))
+    cached = image_cache.get("answer", image_hash, image_answer_key)
+    if cached is not None:
+        tracker.record_request("/chat-image", cache_hit=True)
+        request_log.annotate(tier="image_cache", in_domain=True)
+        return {"response": cached}
+
+    # Base64-encode the image so we can inspect it and pass it inline
     b64 = base64.b64encode(raw).decode("utf-8")
 
-    extracted_from_image = ""
+    extracted_from_image, image_keywords = "", []
     if not allow:
-        # Probe the image for hotel signals (OCR + keywords)
-        allow, extracted_from_image = await detect_hotel_from_image(b64, image.content_type)
+        # Probe the image for hotel signals (OCR + keywords); the result depends on the image only
+        probe = image_cache.get("probe", image_hash)
+        if probe is None:
+            probe = await detect_hotel_from_image(b64, content_type)
+            if probe[1]:
+                image_cache.set("probe", image_hash, probe)
+        allow, extracted_from_image, image_keywords = probe
 
+    request_log.annotate(in_domain=allow)
     if not allow:
+        request_log.annotate(tier="filter")
         return {"response": DEFAULT_OUT_OF_DOMAIN_RESPONSE}
 
-    if image.content_type not in ALLOWED_IMAGE_TYPES:
+    if content_type not in ALLOWED_IMAGE_TYPES:
         raise HTTPException(status_code=415, detail="Only JPEG, PNG, or WEBP images are supported.")
 
-    # Build a retrieval query combining user text and any extracted hints
-    retrieval_query = " ".join([s for s in [(query or "").strip(), extracted_from_image] if s]).strip() or "hotel reservation guidance"
-    context_snippets = retrieve_context(retrieval_query)
+    # Focused sub-queries from the user text and image hints, embedded in one batch and rank-fused
+    image_summary = extracted_from_image
+    if image_keywords and "\n" in extracted_from_image:
+        image_summary = extracted_from_image.rsplit("\n", 1)[0]
+    subqueries = image_subqueries(query, image_summary, image_keywords)
+    source_docs = await asyncio.to_thread(retrieve_image_documents, subqueries)
+    context_snippets = retrieve_context("", source_docs=source_docs)
 
     # Build multimodal message content (vision + RAG context)
     content_blocks = []
@@ -168,21 +789,20 @@ async def chat_image(query: str = Form(""), image: UploadFile = File(...)):
     content_blocks.append({
         "type": "image",
         "source_type": "base64",
-        "mime_type": image.content_type,
+        "mime_type": content_type,
         "data": b64,
     })
 
     try:
-        ai_msg = vision_llm.invoke([HumanMessage(content=content_blocks)])
+        with usage.stage("image_answer"):
+            ai_msg = await get_llm().ainvoke([HumanMessage(content=content_blocks)])
         reply = getattr(ai_msg, "content", str(ai_msg)) or "I couldn't read that image. Try a clearer photo."
 
         # Normalize prefixes similar to /chat
-        for prefix in ["According to the provided context, ", "According to the context, "]:
-            if reply.startswith(prefix):
-                reply = reply[len(prefix):]
-        if reply and reply[0].islower():
-            reply = reply[0].upper() + reply[1:]
-
+        reply = clean_response(reply)
+        image_cache.set("answer", image_hash, reply, image_answer_key)
+        tracker.record_request("/chat-image", cache_hit=False)
+        request_log.annotate(tier="generated")
         return {"response": reply}
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
\ No newline at end of file
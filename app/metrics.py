@@ -0,0 +1,77 @@
+import threading
+from collections import defaultdict
+
+
+def _label_key(labels: dict) -> tuple:
+    return tuple(sorted((k, str(v)) for k, v in labels.items()))
+
+
+def _format_labels(key: tuple) -> str:
+    if not key:
+        return ""
+    inner = ",".join(f'{k}="{v}"' for k, v in key)
+    return "{" + inner + "}"
+
+
+class Metrics:
+    """In-process counters and gauges rendered in Prometheus text format."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._counters = defaultdict(float)
+        self._gauges = {}
+        self._gauge_callbacks = {}
+        self._help = {}
+
+    def describe(self, name: str, help_text: str):
+        self._help[name] = help_text
+
+    def inc(self, name: str, value: float = 1.0, **labels):
+        with self._lock:
+            self._counters[(name, _label_key(labels))] += value
+
+    def set(self, name: str, value: float, **labels):
+        with self._lock:
+            self._gauges[(name, _label_key(labels))] = value
+
+    def register_gauge(self, name: str, fn):
+        """Register `fn() -> float | dict[tuple_of_label_pairs, float]` evaluated on render."""
+        self._gauge_callbacks[name] = fn
+
+    def get(self, name: str, **labels) -> float:
+        key = (name, _label_key(labels))
+        with self._lock:
+            if key in self._counters:
+                return self._counters[key]
+            return self._gauges.get(key, 0.0)
+
+    def render(self) -> str:
+        with self._lock:
+            counters = dict(self._counters)
+            gauges = dict(self._gauges)
+        for name, fn in self._gauge_callbacks.items():
+            try:
+                value = fn()
+            except Exception:
+                continue
+            if isinstance(value, dict):
+                for labels, v in value.items():
+                    gauges[(name, _label_key(dict(labels)))] = v
+            else:
+                gauges[(name, ())] = value
+
+        lines = []
+        for kind, series in (("counter", counters), ("gauge", gauges)):
+            by_name = defaultdict(list)
+            for (name, key), value in series.items():
+                by_name[name].append((key, value))
+            for name in sorted(by_name):
+                if name in self._help:
+                    lines.append(f"# HELP {name} {self._help[name]}")
+                lines.append(f"# TYPE {name} {kind}")
+                for key, value in sorted(by_name[name]):
+                    lines.append(f"{name}{_format_labels(key)} {value:g}")
+        return "\n".join(lines) + "\n"
+
+
+metrics = Metrics()
@@ -0,0 +1,220 @@
+"""Per-property index namespaces (one PDF folder and index artifact each), built in the background
+and loaded on first use within NAMESPACE_MEMORY_BUDGET_MB.
+"""
+import os
+import re
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Callable, Dict, List, Optional
+
+from app.chatbot import (artifact_is_current, build_chain, build_index_artifact, corpus_version,
+                         reciprocal_rank_fusion, unwrap_retriever, with_reranking)
+from app.generations import estimate_index_bytes, retriever_embeddings
+from app.index_store import ArtifactIndex, ArtifactRetriever
+from app.metrics import metrics
+from app.rerank import reset_source_times
+from app.singleflight import SingleFlight
+
+NAMESPACES_DIR = os.environ.get("NAMESPACES_DIR", "namespaces")
+NAMESPACE_INDEX_DIR = os.environ.get("NAMESPACE_INDEX_DIR", ".cache/namespaces")
+NAMESPACE_MEMORY_BUDGET_MB = float(os.environ.get("NAMESPACE_MEMORY_BUDGET_MB", "256"))
+# Build stale namespace indexes in the background at start-up rather than when first requested
+NAMESPACE_PREBUILD = os.environ.get("NAMESPACE_PREBUILD", "1") == "1"
+NAMESPACE_BUILD_WORKERS = int(os.environ.get("NAMESPACE_BUILD_WORKERS", "1"))
+# After a failed build, requests get the error for this long before a build is retried
+NAMESPACE_BUILD_RETRY_S = float(os.environ.get("NAMESPACE_BUILD_RETRY_S", "60"))
+BASE_NAMESPACE = "base"
+
+_VALID_NAME = re.compile(r"^[a-z0-9][a-z0-9_-]{0,63}$")
+_active: ContextVar[Optional["Namespace"]] = ContextVar("active_namespace", default=None)
+_search_pool = ThreadPoolExecutor(max_workers=8, thread_name_prefix="namespace-search")
+
+metrics.describe("namespace_loads_total", "Tenant namespace index loads and evictions.")
+
+
+def folder_fingerprint(pdf_folder: str) -> tuple:
+    """(name, size, mtime) of each PDF in a folder: a cheap change check for the request path."""
+    entries = []
+    for name in sorted(os.listdir(pdf_folder)):
+        if name.lower().endswith(".pdf"):
+            stat = os.stat(os.path.join(pdf_folder, name))
+            entries.append((name, stat.st_size, stat.st_mtime_ns))
+    return tuple(entries)
+
+
+class UnknownNamespace(ValueError):
+    pass
+
+
+class NamespaceNotReady(RuntimeError):
+    """The namespace exists but its index is still being built, or could not be built or loaded."""
+
+
+class MergedIndex:
+    """Searches the base index and a tenant index in parallel and fuses the rankings.
+    The base store is resolved per search so base generation swaps are picked up.
+    """
+
+    def __init__(self, base: Callable[[], object], tenant: ArtifactIndex):
+        self.base = base
+        self.tenant = tenant
+
+    def similarity_search_by_vector(self, embedding, k: int = 3, **kwargs) -> list:
+        stores = [self.tenant, self.base()]
+        futures = [_search_pool.submit(store.similarity_search_by_vector, embedding, k=k) for store in stores]
+        return reciprocal_rank_fusion([future.result() for future in futures], limit=k)
+
+
+def base_store(chain):
+    """The vector store behind the base chain's (possibly swapped) retriever."""
+    retriever = unwrap_retriever(chain.retriever)
+    return getattr(retriever, "index", None) or retriever.vectorstore
+
+
+class Namespace:
+    def __init__(self, name: str, chain, version: str, index: Optional[ArtifactIndex] = None):
+        self.name = name
+        self.chain = chain
+        self.version = version
+        self.bytes = estimate_index_bytes(index) if index else 0
+
+    def cache_prefix(self, base_version: str) -> str:
+        """Cache-key prefix; the base namespace keeps the plain index version so existing entries stay valid."""
+        if self.name == BASE_NAMESPACE:
+            return base_version
+        return f"{base_version}:{self.name}@{self.version[:12]}"
+
+
+class NamespaceManager:
+    """Lazily loaded, LRU-evicted tenant indexes on top of the base chain."""
+
+    def __init__(self, base_chain, root: str = NAMESPACES_DIR, index_root: str = NAMESPACE_INDEX_DIR,
+                 memory_budget_mb: float = NAMESPACE_MEMORY_BUDGET_MB):
+        self.base = Namespace(BASE_NAMESPACE, base_chain, "")
+        self.root = root
+        self.index_root = index_root
+        self.memory_budget = memory_budget_mb * 1e6
+        self.loaded: "OrderedDict[str, Namespace]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._flight = SingleFlight("namespace_load")
+        # name -> {"status": "building" | "failed", ...} for builds in progress or recently failed
+        self.builds: Dict[str, dict] = {}
+        # name -> folder_fingerprint of the PDFs its artifact was last verified against (by content hash)
+        self.verified: Dict[str, tuple] = {}
+        self._build_pool = ThreadPoolExecutor(max_workers=NAMESPACE_BUILD_WORKERS, thread_name_prefix="namespace-build")
+
+    def available(self) -> List[str]:
+        if not os.path.isdir(self.root):
+            return []
+        return sorted(n for n in os.listdir(self.root) if _VALID_NAME.match(n) and os.path.isdir(os.path.join(self.root, n)))
+
+    def get(self, name: Optional[str]) -> Namespace:
+        if not name or name == BASE_NAMESPACE:
+            return self.base
+        if not _VALID_NAME.match(name) or not os.path.isdir(os.path.join(self.root, name)):
+            raise UnknownNamespace(f"Unknown namespace: {name}")
+        with self._lock:
+            namespace = self.loaded.get(name)
+            if namespace is not None:
+                self.loaded.move_to_end(name)
+                return namespace
+            build = self.builds.get(name)
+        if build is not None and build["status"] == "building":
+            raise NamespaceNotReady(f"Namespace {name} is being indexed; retry shortly.")
+        if build is not None and time.time() - build["finished_at"] < NAMESPACE_BUILD_RETRY_S:
+            raise NamespaceNotReady(f"Indexing namespace {name} failed: {build['error']}")
+        pdf_folder, _ = self._paths(name)
+        if self.verified.get(name) != folder_fingerprint(pdf_folder):
+            # Hashing the PDFs (and rebuilding if they changed) happens on the build pool
+            self.schedule_build(name)
+            raise NamespaceNotReady(f"Namespace {name} is being indexed; retry shortly.")
+        try:
+            # Concurrent first requests for one namespace share a single load
+            return self._flight.do(name, self._load, name)
+        except (OSError, ValueError) as e:
+            raise NamespaceNotReady(f"Namespace {name} could not be loaded: {e}")
+
+    def _paths(self, name: str) -> tuple:
+        """(PDF folder, artifact directory) of a namespace."""
+        return os.path.join(self.root, name), os.path.join(self.index_root, name)
+
+    def schedule_build(self, name: str) -> bool:
+        """Build the namespace's artifact on the background pool unless a build is already running."""
+        with self._lock:
+            if self.builds.get(name, {}).get("status") == "building":
+                return False
+            self.builds[name] = {"status": "building", "started_at": time.time()}
+        self._build_pool.submit(self._build, name)
+        return True
+
+    def prebuild(self):
+        for name in self.available():
+            self.schedule_build(name)
+
+    def _build(self, name: str):
+        pdf_folder, path = self._paths(name)
+        try:
+            fingerprint = folder_fingerprint(pdf_folder)
+            if not artifact_is_current(path, pdf_folder):
+                build_index_artifact(pdf_folder, path, retriever_embeddings(self.base.chain.retriever))
+                reset_source_times()
+                metrics.inc("namespace_loads_total", event="build")
+        except Exception as e:
+            metrics.inc("namespace_loads_total", event="build_failed")
+            with self._lock:
+                self.builds[name] = {"status": "failed", "error": str(e), "finished_at": time.time()}
+            return
+        with self._lock:
+            self.verified[name] = fingerprint
+            self.builds.pop(name, None)
+
+    def _load(self, name: str) -> Namespace:
+        pdf_folder, path = self._paths(name)
+        embeddings = retriever_embeddings(self.base.chain.retriever)
+        index = ArtifactIndex(path)
+        base = unwrap_retriever(self.base.chain.retriever)
+        k = getattr(base, "k", None) or base.search_kwargs.get("k", 3)
+        merged = MergedIndex(lambda: base_store(self.base.chain), index)
+        chain = build_chain(with_reranking(ArtifactRetriever(index=merged, embeddings=embeddings, k=k)))
+        namespace = Namespace(name, chain, index.version or corpus_version(pdf_folder), index)
+        metrics.inc("namespace_loads_total", event="load")
+        with self._lock:
+            self.loaded[name] = namespace
+            self.loaded.move_to_end(name)
+            while len(self.loaded) > 1 and self.memory_used() > self.memory_budget:
+                self.loaded.popitem(last=False)
+                metrics.inc("namespace_loads_total", event="evict")
+        return namespace
+
+    def memory_used(self) -> int:
+        return sum(n.bytes for n in self.loaded.values())
+
+    def status(self) -> dict:
+        with self._lock:
+            loaded = [{"name": n.name, "version": n.version, "memory_mb": round(n.bytes / 1e6, 2)} for n in self.loaded.values()]
+            builds = {name: dict(build) for name, build in self.builds.items()}
+        return {
+            "available": self.available(),
+            "loaded": loaded,
+            "builds": builds,
+            "memory_mb": round(self.memory_used() / 1e6, 2),
+            "memory_budget_mb": round(self.memory_budget / 1e6, 2),
+        }
+
+
+@contextmanager
+def use_namespace(namespace: Namespace):
+    """Serve retrieval and generation inside this block from `namespace`."""
+    token = _active.set(namespace)
+    try:
+        yield namespace
+    finally:
+        _active.reset(token)
+
+
+def active_namespace() -> Optional[Namespace]:
+    return _active.get()
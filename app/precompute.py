@@ -0,0 +1,171 @@
+"""Precomputed answers for curated and frequent questions: python -m app.precompute --top-n 50"""
+import argparse
+import json
+import logging
+import os
+import threading
+import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from typing import Iterable, List, Optional
+
+from app.chatbot import clean_response, filter_response, normalize_query, run_chain
+from app.request_log import REQUEST_LOG_PATH, log_files
+from app.usage import request_scope
+
+PRECOMPUTED_ANSWERS_PATH = os.environ.get("PRECOMPUTED_ANSWERS_PATH", ".cache/precomputed_answers.json")
+# Regenerate stale entries in the background when the app starts (0 disables)
+PRECOMPUTE_REFRESH_ON_START = os.environ.get("PRECOMPUTE_REFRESH_ON_START", "1") == "1"
+
+logger = logging.getLogger(__name__)
+
+CURATED_SOURCES = [
+    ("test_data/answer_generation_test_data.json", "answer_generation_test_cases"),
+    ("test_data/rag_retrieval_test_data.json", "retrieval_test_cases"),
+]
+
+
+class AnswerStore:
+    """Normalized query -> {query, answer, sources, index_version, generated_at}, saved as JSON."""
+
+    def __init__(self, path: str = PRECOMPUTED_ANSWERS_PATH):
+        self.path = path
+        self.entries = {}
+        self._lock = threading.Lock()
+
+    def load(self) -> "AnswerStore":
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                self.entries = json.load(f).get("entries", {})
+        except (OSError, ValueError):
+            self.entries = {}
+        return self
+
+    def save(self):
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        tmp_path = f"{self.path}.tmp-{os.getpid()}"
+        with self._lock:
+            payload = {"entries": dict(self.entries)}
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(payload, f, indent=2, ensure_ascii=False)
+        os.replace(tmp_path, self.path)
+
+    def get(self, normalized: str, index_version: str) -> Optional[str]:
+        entry = self.entries.get(normalized)
+        if entry is None or entry.get("index_version") != index_version:
+            return None
+        return entry["answer"]
+
+    def put(self, query: str, answer: str, source_documents, index_version: str):
+        entry = {
+            "query": query,
+            "answer": answer,
+            "sources": [
+                {"source": doc.metadata.get("source"), "page_content": doc.page_content}
+                for doc in source_documents
+            ],
+            "index_version": index_version,
+            "generated_at": time.time(),
+        }
+        with self._lock:
+            self.entries[normalize_query(query)] = entry
+
+    def stale_queries(self, index_version: str) -> List[str]:
+        return [e["query"] for e in self.entries.values() if e.get("index_version") != index_version]
+
+    def __len__(self):
+        return len(self.entries)
+
+
+def curated_questions(extra_path: Optional[str] = None) -> List[str]:
+    questions = []
+    for path, key in CURATED_SOURCES:
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                cases = json.load(f).get(key, [])
+        except (OSError, ValueError):
+            continue
+        questions.extend(c["question"] for c in cases if c.get("expected_response_type") != "should_refuse")
+    if extra_path:
+        with open(extra_path, "r", encoding="utf-8") as f:
+            questions.extend(line.strip() for line in f if line.strip())
+    return questions
+
+
+def top_logged_queries(log_path: str = REQUEST_LOG_PATH, top_n: int = 50) -> List[str]:
+    """Most frequent normalized queries in a JSONL request log and its rotated backups
+    (lines with a `query` field).
+    """
+    counts = Counter()
+    if not top_n:
+        return []
+    for path in log_files(log_path):
+        with open(path, "r", encoding="utf-8") as f:
+            for line in f:
+                try:
+                    event = json.loads(line)
+                except ValueError:
+                    continue
+                query = event.get("normalized_query") or normalize_query(event.get("query", ""))
+                if query:
+                    counts[query] += 1
+    return [query for query, _ in counts.most_common(top_n)]
+
+
+def precompute(store: AnswerStore, chain, index_version: str, questions: Iterable[str], workers: int = 4) -> int:
+    """Answer `questions` (deduplicated by normalized form) and save them into `store`.
+    Questions that fail are logged and skipped; returns the number answered.
+    """
+    unique = {}
+    for question in questions:
+        unique.setdefault(normalize_query(question), question)
+
+    def answer(question) -> bool:
+        try:
+            with request_scope("precompute", normalize_query(question)):
+                result = run_chain(chain, question)
+            store.put(question, clean_response(filter_response(question, result)), result["source_documents"],
+                      index_version)
+            return True
+        except Exception:
+            logger.warning("Precomputing %r failed; skipped", question, exc_info=True)
+            return False
+
+    try:
+        with ThreadPoolExecutor(max_workers=max(1, workers)) as pool:
+            answered = sum(pool.map(answer, unique.values()))
+    finally:
+        store.save()
+    return answered
+
+
+def refresh_stale(store: AnswerStore, chain, index_version: str, workers: int = 2) -> int:
+    """Regenerate every entry produced against a different index version."""
+    stale = store.stale_queries(index_version)
+    if not stale:
+        return 0
+    return precompute(store, chain, index_version, stale, workers)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Precompute answers for curated and frequent questions.")
+    parser.add_argument("--out", default=PRECOMPUTED_ANSWERS_PATH)
+    parser.add_argument("--curated", help="Extra file with one question per line")
+    parser.add_argument("--log", default=REQUEST_LOG_PATH, help="JSONL request log to mine for frequent queries")
+    parser.add_argument("--top-n", type=int, default=50)
+    parser.add_argument("--workers", type=int, default=4)
+    args = parser.parse_args()
+
+    from app.chatbot import index_version, load_chain
+
+    chain = load_chain()
+    version = index_version()
+    store = AnswerStore(args.out).load()
+    questions = curated_questions(args.curated) + top_logged_queries(args.log, args.top_n)
+    start = time.perf_counter()
+    count = precompute(store, chain, version, questions, args.workers)
+    print(f"Precomputed {count} answers for index {version} into {args.out} ({time.perf_counter() - start:.1f}s).")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,139 @@
+"""Speculative retrieval for /prefetch while the user types, rate limited per client."""
+import os
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from contextvars import copy_context
+from typing import Callable, Dict, Optional
+
+from app.cache import TTLCache
+from app.metrics import metrics
+
+PREFETCH_ENABLED = os.environ.get("PREFETCH_ENABLED", "1") == "1"
+# Per-client token bucket: sustained prefetches per minute and burst size
+PREFETCH_RATE_PER_MIN = float(os.environ.get("PREFETCH_RATE_PER_MIN", "12"))
+PREFETCH_BURST = int(os.environ.get("PREFETCH_BURST", "3"))
+# Shorter inputs are not worth an embedding call
+PREFETCH_MIN_CHARS = int(os.environ.get("PREFETCH_MIN_CHARS", "12"))
+PREFETCH_TTL_S = float(os.environ.get("PREFETCH_TTL_S", "120"))
+PREFETCH_MAX_ENTRIES = int(os.environ.get("PREFETCH_MAX_ENTRIES", "1024"))
+PREFETCH_WORKERS = int(os.environ.get("PREFETCH_WORKERS", "2"))
+PREFETCH_MAX_PENDING = int(os.environ.get("PREFETCH_MAX_PENDING", "16"))
+# A /chat for a query still being prefetched waits this long for it
+PREFETCH_WAIT_S = float(os.environ.get("PREFETCH_WAIT_S", "1.0"))
+# Buckets kept for at most this many clients; full (idle) buckets are dropped first
+RATE_LIMIT_MAX_CLIENTS = 10000
+
+metrics.describe("prefetch_requests_total", "Prefetch requests by outcome (scheduled, rate_limited, cancelled, done, ...).")
+metrics.describe("prefetch_lookups_total", "Retrievals served from a prefetch (hit) or done on the request path (miss).")
+
+
+class RateLimiter:
+    """Token bucket per client key."""
+
+    def __init__(self, rate_per_min: float = PREFETCH_RATE_PER_MIN, burst: int = PREFETCH_BURST):
+        self.rate = rate_per_min / 60.0
+        self.burst = burst
+        self._buckets: Dict[str, tuple] = {}
+        self._lock = threading.Lock()
+
+    def allow(self, key: str) -> bool:
+        now = time.monotonic()
+        with self._lock:
+            tokens, updated = self._buckets.get(key, (self.burst, now))
+            tokens = min(self.burst, tokens + (now - updated) * self.rate)
+            allowed = tokens >= 1
+            self._buckets[key] = (tokens - 1 if allowed else tokens, now)
+            if len(self._buckets) > RATE_LIMIT_MAX_CLIENTS:
+                self._prune(now)
+            return allowed
+
+    def _prune(self, now: float):
+        for key, (tokens, updated) in list(self._buckets.items()):
+            if tokens + (now - updated) * self.rate >= self.burst:
+                del self._buckets[key]
+
+
+class Prefetcher:
+    """Runs `fetch()` for a (client, key) in the background and keeps its result for `take(key)`."""
+
+    def __init__(self, workers: int = PREFETCH_WORKERS, ttl: float = PREFETCH_TTL_S,
+                 max_entries: int = PREFETCH_MAX_ENTRIES, max_pending: int = PREFETCH_MAX_PENDING):
+        self.results = TTLCache(max_entries, ttl)
+        self.limiter = RateLimiter()
+        self.max_pending = max_pending
+        self._pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="prefetch")
+        self._latest: Dict[str, str] = {}
+        self._in_flight: Dict[str, Optional[Future]] = {}
+        self._lock = threading.Lock()
+
+    def schedule(self, client: str, key: str, fetch: Callable[[], list], rate_key: Optional[str] = None) -> str:
+        """Outcome: scheduled, cached, in_flight, rate_limited or busy. `client` scopes which prefetch
+        supersedes which; the rate limit applies per `rate_key` (default: `client`).
+        """
+        if self.results.get(key) is not None:
+            outcome = "cached"
+        elif not self.limiter.allow(rate_key or client):
+            outcome = "rate_limited"
+        else:
+            with self._lock:
+                if key in self._in_flight:
+                    outcome = "in_flight"
+                elif len(self._in_flight) >= self.max_pending:
+                    outcome = "busy"
+                else:
+                    self._in_flight[key] = None
+                    outcome = "scheduled"
+                if outcome == "scheduled":
+                    self._latest[client] = key
+                else:
+                    # Not fetched for this client, but its older input is stale all the same
+                    self._latest.pop(client, None)
+            if outcome == "scheduled":
+                # The job runs in the caller's context (namespace, usage attribution)
+                future = self._pool.submit(copy_context().run, self._run, client, key, fetch)
+                with self._lock:
+                    if key in self._in_flight:
+                        self._in_flight[key] = future
+        metrics.inc("prefetch_requests_total", outcome=outcome)
+        return outcome
+
+    def _run(self, client: str, key: str, fetch: Callable[[], list]):
+        try:
+            with self._lock:
+                stale = self._latest.get(client) != key
+            if stale:
+                # The user kept typing; a newer prefetch for this client replaces this one
+                metrics.inc("prefetch_requests_total", outcome="cancelled")
+                return
+            docs = fetch()
+            if docs:
+                self.results.set(key, docs)
+            metrics.inc("prefetch_requests_total", outcome="done")
+        except Exception:
+            metrics.inc("prefetch_requests_total", outcome="error")
+        finally:
+            with self._lock:
+                self._in_flight.pop(key, None)
+                if self._latest.get(client) == key:
+                    del self._latest[client]
+
+    def take(self, key: str, wait: float = PREFETCH_WAIT_S) -> Optional[list]:
+        """Prefetched documents for `key`, if any (left in place for repeats of the same query).
+        A prefetch still running for `key` is awaited for up to `wait` seconds.
+        """
+        docs = self.results.get(key)
+        if docs is None and wait > 0:
+            with self._lock:
+                future = self._in_flight.get(key)
+            if future is not None:
+                try:
+                    future.result(timeout=wait)
+                except Exception:
+                    pass
+                docs = self.results.get(key)
+        metrics.inc("prefetch_lookups_total", outcome="hit" if docs is not None else "miss")
+        return docs
+
+    def __len__(self):
+        return len(self.results)
@@ -0,0 +1,263 @@
+"""CPU profiles (collapsed stacks) and memory introspection for the admin endpoints."""
+import asyncio
+import cProfile
+import gc
+import os
+import pstats
+import re
+import sys
+import threading
+import time
+import tracemalloc
+from collections import Counter
+from typing import Dict, List
+
+PROFILE_MAX_SECONDS = float(os.environ.get("PROFILE_MAX_SECONDS", "60"))
+PROFILE_SAMPLE_INTERVAL_MS = float(os.environ.get("PROFILE_SAMPLE_INTERVAL_MS", "5"))
+# Stack depth kept per tracemalloc allocation (more frames, more overhead)
+PROFILE_TRACEMALLOC_FRAMES = int(os.environ.get("PROFILE_TRACEMALLOC_FRAMES", "1"))
+# deep_sizeof stops after this many objects (the size is then a lower bound)
+DEEP_SIZEOF_MAX_OBJECTS = 1_000_000
+
+_capture_lock = threading.Lock()
+
+
+class CaptureInProgress(RuntimeError):
+    pass
+
+
+def _module_label(filename: str) -> str:
+    module = os.path.splitext(os.path.basename(filename))[0]
+    # Package-qualified for this repo's modules, e.g. app.chatbot
+    parent = os.path.basename(os.path.dirname(filename))
+    return f"{parent}.{module}" if parent in ("app", "tests") else module
+
+
+def frame_label(code) -> str:
+    return f"{_module_label(code.co_filename)}:{code.co_name}"
+
+
+def thread_label(name: str) -> str:
+    """Thread name without its pool index ("generation_3" -> "generation")."""
+    return re.sub(r"[-_ ]?\d+(?:_\d+)?$", "", name) or name
+
+
+def frame_stack(frame) -> List[str]:
+    """Labels of `frame` and its callers, root first."""
+    stack = []
+    while frame is not None:
+        stack.append(frame_label(frame.f_code))
+        frame = frame.f_back
+    stack.reverse()
+    return stack
+
+
+def render_collapsed(counts: Counter) -> str:
+    return "".join(f"{stack} {count}\n" for stack, count in counts.most_common() if count > 0)
+
+
+class SamplingProfiler:
+    """Samples the stacks of all threads (except its own) from a background thread."""
+
+    def __init__(self, interval_ms: float = PROFILE_SAMPLE_INTERVAL_MS):
+        self.interval = interval_ms / 1000
+        self.counts = Counter()
+        self.samples = 0
+        self._stop = threading.Event()
+        self._thread = None
+
+    def _run(self):
+        own = threading.get_ident()
+        names = {}
+        while not self._stop.wait(self.interval):
+            if len(names) != threading.active_count():
+                names = {t.ident: t.name for t in threading.enumerate()}
+            for ident, frame in sys._current_frames().items():
+                if ident == own:
+                    continue
+                stack = frame_stack(frame)
+                # Idle pool workers and pollers would otherwise dominate the profile
+                if stack and stack[-1] in ("threading:wait", "queue:get", "selectors:select", "thread:_worker"):
+                    continue
+                self.counts[";".join([thread_label(names.get(ident, "thread")), *stack])] += 1
+            self.samples += 1
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, name="profile-sampler", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+
+    def collapsed(self) -> str:
+        return render_collapsed(self.counts)
+
+    def top(self, n: int = 25) -> List[dict]:
+        """Leaf functions by sample count (self time)."""
+        leaves = Counter()
+        for stack, count in self.counts.items():
+            leaves[stack.rsplit(";", 1)[-1]] += count
+        total = sum(leaves.values()) or 1
+        return [{"function": f, "samples": c, "pct": round(100 * c / total, 1)} for f, c in leaves.most_common(n)]
+
+
+def pstats_label(func) -> str:
+    filename, _, name = func
+    if filename == "~":
+        return name  # built-ins, e.g. <method 'acquire' of '_thread.lock' objects>
+    return f"{_module_label(filename)}:{name}"
+
+
+def collapsed_from_pstats(stats: pstats.Stats, min_share: float = 0.001, max_depth: int = 48) -> Counter:
+    """Approximate collapsed stacks (in microseconds) from cProfile's caller graph: each function's
+    own time is split over its callers in proportion to the time they spent calling it, recursively.
+    """
+    entries = stats.stats
+    total = sum(entry[2] for entry in entries.values()) or 1.0
+    counts = Counter()
+
+    def walk(func, weight: float, path: list, depth: int):
+        callers = entries.get(func, (0, 0, 0, 0, {}))[4]
+        candidates = {c: v for c, v in callers.items() if c not in path and c in entries}
+        if not candidates or depth >= max_depth:
+            counts[";".join(pstats_label(f) for f in reversed(path))] += int(weight * 1e6)
+            return
+        share_total = sum(v[3] for v in candidates.values()) or 1.0
+        for caller, v in candidates.items():
+            share = weight * v[3] / share_total
+            if share >= total * min_share:
+                walk(caller, share, path + [caller], depth + 1)
+            else:
+                counts[";".join(pstats_label(f) for f in reversed(path))] += int(share * 1e6)
+
+    for func, entry in entries.items():
+        if entry[2] >= total * min_share:
+            walk(func, entry[2], [func], 0)
+    return counts
+
+
+def tracemalloc_diff(before, after, top: int = 25) -> List[dict]:
+    stats = after.compare_to(before, "lineno")
+    return [
+        {
+            "location": f"{stat.traceback[0].filename}:{stat.traceback[0].lineno}",
+            "size_diff_kb": round(stat.size_diff / 1024, 1),
+            "size_kb": round(stat.size / 1024, 1),
+            "count_diff": stat.count_diff,
+        }
+        for stat in stats[:top]
+    ]
+
+
+async def capture(seconds: float, mode: str = "sample", memory: bool = True, top: int = 25) -> dict:
+    """Profile the live process for `seconds` (capped at PROFILE_MAX_SECONDS) without blocking the event loop."""
+    if mode not in ("sample", "cprofile"):
+        raise ValueError("mode must be 'sample' or 'cprofile'.")
+    seconds = max(0.1, min(seconds, PROFILE_MAX_SECONDS))
+    if not _capture_lock.acquire(blocking=False):
+        raise CaptureInProgress("A profile capture is already running.")
+    started_tracing = False
+    try:
+        started_tracing = memory and not tracemalloc.is_tracing()
+        if started_tracing:
+            tracemalloc.start(PROFILE_TRACEMALLOC_FRAMES)
+        before = tracemalloc.take_snapshot() if memory else None
+
+        start = time.perf_counter()
+        if mode == "sample":
+            profiler = SamplingProfiler()
+            profiler.start()
+            try:
+                await asyncio.sleep(seconds)
+            finally:
+                profiler.stop()
+            result = {"samples": profiler.samples, "top": profiler.top(top), "collapsed": profiler.collapsed()}
+        else:
+            profiler = cProfile.Profile()
+            profiler.enable()
+            try:
+                await asyncio.sleep(seconds)
+            finally:
+                profiler.disable()
+            stats = pstats.Stats(profiler)
+            ranked = sorted(stats.stats.items(), key=lambda item: item[1][2], reverse=True)[:top]
+            result = {
+                "top": [
+                    {"function": pstats_label(func), "calls": entry[1], "tottime_ms": round(entry[2] * 1000, 2),
+                     "cumtime_ms": round(entry[3] * 1000, 2)}
+                    for func, entry in ranked
+                ],
+                "collapsed": render_collapsed(collapsed_from_pstats(stats)),
+            }
+        elapsed = time.perf_counter() - start
+
+        if memory:
+            after = tracemalloc.take_snapshot()
+            result["memory_diff"] = tracemalloc_diff(before, after, top)
+            result["traced_memory_mb"] = round(tracemalloc.get_traced_memory()[0] / 1e6, 2)
+        return {"mode": mode, "seconds": round(elapsed, 2), **result}
+    finally:
+        if started_tracing:
+            tracemalloc.stop()
+        _capture_lock.release()
+
+
+def deep_sizeof(obj, max_objects: int = DEEP_SIZEOF_MAX_OBJECTS) -> int:
+    """Approximate bytes reachable from `obj` (containers, instance attributes, numpy buffers).
+    Modules, classes and functions are not followed; memory-mapped arrays count as 0.
+    """
+    seen, stack, total = set(), [obj], 0
+    skip = (type, type(sys), type(deep_sizeof), type(len))
+    while stack and len(seen) < max_objects:
+        current = stack.pop()
+        if id(current) in seen or isinstance(current, skip):
+            continue
+        seen.add(id(current))
+        nbytes = getattr(current, "nbytes", None)
+        if isinstance(nbytes, int) and hasattr(current, "dtype"):
+            # numpy: a memory-mapped or view array does not own its buffer
+            total += sys.getsizeof(current) + (nbytes if getattr(current, "base", None) is None else 0)
+            continue
+        total += sys.getsizeof(current)
+        if isinstance(current, dict):
+            stack.extend(current.keys())
+            stack.extend(current.values())
+        elif isinstance(current, (list, tuple, set, frozenset)):
+            stack.extend(current)
+        elif not isinstance(current, (str, bytes, bytearray, int, float, bool)):
+            attrs = getattr(current, "__dict__", None)
+            if attrs is not None:
+                stack.append(attrs)
+            for slot in getattr(type(current), "__slots__", ()) or ():
+                value = getattr(current, slot, None)
+                if value is not None:
+                    stack.append(value)
+    return total
+
+
+def process_memory() -> dict:
+    """Resident/peak memory of this process (Linux /proc, else getrusage peak), GC and thread counts."""
+    info = {}
+    try:
+        with open("/proc/self/status", "r", encoding="utf-8") as f:
+            for line in f:
+                key, _, value = line.partition(":")
+                if key in ("VmRSS", "VmHWM", "RssAnon", "RssFile"):
+                    info[f"{key.lower()}_mb"] = round(int(value.split()[0]) / 1024, 1)
+    except OSError:
+        try:
+            import resource
+            info["peak_rss_mb"] = round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1)
+        except ImportError:
+            pass
+    info["gc_objects"] = len(gc.get_objects())
+    info["threads"] = threading.active_count()
+    if tracemalloc.is_tracing():
+        info["traced_memory_mb"] = round(tracemalloc.get_traced_memory()[0] / 1e6, 2)
+    return info
+
+
+def memory_breakdown(components: Dict[str, object]) -> Dict[str, float]:
+    """MB reachable from each named component (objects shared between components count in each)."""
+    return {name: round(deep_sizeof(obj) / 1e6, 2) for name, obj in components.items()}
@@ -0,0 +1,165 @@
+"""Structured JSONL request log, written in batches by a background thread with size-based rotation."""
+import hashlib
+import json
+import os
+import queue
+import threading
+import time
+from contextvars import ContextVar
+from typing import List, Optional
+
+from app.metrics import metrics
+
+REQUEST_LOG_PATH = os.environ.get("REQUEST_LOG_PATH", "logs/requests.jsonl")
+REQUEST_LOG_ENABLED = os.environ.get("REQUEST_LOG_ENABLED", "1") == "1"
+REQUEST_LOG_MAX_BYTES = int(os.environ.get("REQUEST_LOG_MAX_BYTES", str(50 * 1024 * 1024)))
+REQUEST_LOG_BACKUPS = int(os.environ.get("REQUEST_LOG_BACKUPS", "5"))
+REQUEST_LOG_QUEUE_SIZE = int(os.environ.get("REQUEST_LOG_QUEUE_SIZE", "10000"))
+REQUEST_LOG_FLUSH_S = float(os.environ.get("REQUEST_LOG_FLUSH_S", "1.0"))
+# Logged queries are truncated to this many characters
+REQUEST_LOG_QUERY_CHARS = 500
+LOGGED_PATHS = {"/chat", "/chat-image"}
+
+_event: ContextVar[Optional[dict]] = ContextVar("request_log_event", default=None)
+
+metrics.describe("request_log_events_total", "Request log events by outcome (written, dropped).")
+
+
+def chunk_id(doc) -> str:
+    """Stable id of a retrieved chunk: source file name plus a hash of its text."""
+    metadata = getattr(doc, "metadata", {}) or {}
+    source = os.path.basename(str(metadata.get("source", "")))
+    digest = hashlib.sha1((getattr(doc, "page_content", "") or "").encode("utf-8")).hexdigest()[:10]
+    return f"{source}#{digest}"
+
+
+def begin(endpoint: str) -> dict:
+    """Start the event for the current request; fields are added with `annotate`."""
+    event = {"ts": round(time.time(), 3), "endpoint": endpoint, "tokens": {"prompt": 0, "completion": 0}}
+    _event.set(event)
+    return event
+
+
+def annotate(**fields):
+    """Set fields on the current request's event (a no-op outside a logged request)."""
+    event = _event.get()
+    if event is not None:
+        event.update(fields)
+
+
+def note_query(query: str, normalized: str):
+    annotate(query=(query or "")[:REQUEST_LOG_QUERY_CHARS], normalized_query=normalized[:REQUEST_LOG_QUERY_CHARS])
+
+
+def note_documents(docs: list):
+    annotate(chunks=[chunk_id(doc) for doc in docs or []])
+
+
+def add_tokens(prompt_tokens: int, completion_tokens: int):
+    event = _event.get()
+    if event is not None:
+        event["tokens"]["prompt"] += prompt_tokens
+        event["tokens"]["completion"] += completion_tokens
+
+
+def log_files(path: str = REQUEST_LOG_PATH) -> List[str]:
+    """The log and its rotated backups that exist, oldest first."""
+    candidates = [f"{path}.{n}" for n in range(REQUEST_LOG_BACKUPS, 0, -1)] + [path]
+    return [p for p in candidates if os.path.exists(p)]
+
+
+class RequestLogWriter:
+    """Background JSONL writer with a bounded queue and size-based rotation (path, path.1, ...)."""
+
+    def __init__(self, path: str = REQUEST_LOG_PATH, max_bytes: int = REQUEST_LOG_MAX_BYTES,
+                 backups: int = REQUEST_LOG_BACKUPS, queue_size: int = REQUEST_LOG_QUEUE_SIZE):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.backups = backups
+        self.queue: "queue.Queue[Optional[dict]]" = queue.Queue(maxsize=queue_size)
+        self._thread = None
+        self._start_lock = threading.Lock()
+
+    def submit(self, event: dict) -> bool:
+        if self._thread is None:
+            self.start()
+        try:
+            self.queue.put_nowait(event)
+            return True
+        except queue.Full:
+            metrics.inc("request_log_events_total", outcome="dropped")
+            return False
+
+    def start(self):
+        with self._start_lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="request-log", daemon=True)
+                self._thread.start()
+
+    def stop(self, timeout: float = 5.0):
+        """Flush queued events and stop the writer thread."""
+        if self._thread is not None:
+            self.queue.put(None)
+            self._thread.join(timeout)
+            self._thread = None
+
+    def _run(self):
+        while True:
+            try:
+                event = self.queue.get(timeout=REQUEST_LOG_FLUSH_S)
+            except queue.Empty:
+                continue
+            batch, stopping = [], event is None
+            if event is not None:
+                batch.append(event)
+            while not stopping:
+                try:
+                    event = self.queue.get_nowait()
+                except queue.Empty:
+                    break
+                if event is None:
+                    stopping = True
+                else:
+                    batch.append(event)
+            if batch:
+                try:
+                    self._write(batch)
+                except Exception:
+                    metrics.inc("request_log_events_total", len(batch), outcome="dropped")
+            if stopping:
+                return
+
+    def _write(self, batch: List[dict]):
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        data = "".join(json.dumps(event, ensure_ascii=False, separators=(",", ":")) + "\n" for event in batch)
+        # One unbuffered append per batch, so workers sharing the file do not interleave partial lines
+        with open(self.path, "ab", buffering=0) as f:
+            f.write(data.encode("utf-8"))
+            size = f.tell()
+        metrics.inc("request_log_events_total", len(batch), outcome="written")
+        if self.max_bytes and size >= self.max_bytes:
+            try:
+                self._rotate()
+            except FileNotFoundError:
+                pass  # another worker rotated it first
+
+    def _rotate(self):
+        if self.backups <= 0:
+            os.remove(self.path)
+            return
+        for n in range(self.backups - 1, 0, -1):
+            if os.path.exists(f"{self.path}.{n}"):
+                os.replace(f"{self.path}.{n}", f"{self.path}.{n + 1}")
+        os.replace(self.path, f"{self.path}.1")
+
+
+writer = RequestLogWriter()
+
+
+def finish(event: dict, status: int, timings: dict):
+    """Complete `event` with the response status and stage timings and queue it for writing."""
+    event["status"] = status
+    event["timings_ms"] = {name: round(ms, 1) for name, ms in timings.items()}
+    writer.submit(event)
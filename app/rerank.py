@@ -0,0 +1,128 @@
+"""CPU-only re-ranking of a wider candidate pool (BM25, phrases, titles, vector rank, recency)."""
+import math
+import os
+import re
+from collections import Counter
+from functools import lru_cache
+from typing import Any, List, Optional
+
+from langchain_core.callbacks import CallbackManagerForRetrieverRun
+from langchain_core.documents import Document
+from langchain_core.retrievers import BaseRetriever
+
+from app.extractive import tokenize
+from app.timing import timed
+
+# Candidates fetched before re-ranking (0 disables re-ranking)
+RERANK_CANDIDATES = int(os.environ.get("RERANK_CANDIDATES", "20"))
+
+RERANK_WEIGHTS = {"bm25": 0.45, "phrase": 0.2, "title": 0.15, "vector": 0.15, "recency": 0.05}
+BM25_K1 = 1.2
+BM25_B = 0.75
+
+
+@lru_cache(maxsize=1024)
+def _source_mtime(source: str) -> Optional[float]:
+    try:
+        return os.path.getmtime(source)
+    except (OSError, TypeError):
+        return None
+
+
+def reset_source_times():
+    """Forget cached source modification times, e.g. after the PDFs were re-ingested."""
+    _source_mtime.cache_clear()
+
+
+def _bigrams(tokens: List[str]) -> set:
+    return set(zip(tokens, tokens[1:]))
+
+
+def _title_terms(doc) -> set:
+    metadata = getattr(doc, "metadata", {}) or {}
+    source = os.path.splitext(os.path.basename(str(metadata.get("source", ""))))[0]
+    return set(tokenize(f"{metadata.get('section', '')} {re.sub(r'[_-]+', ' ', source)}"))
+
+
+def score_candidates(query: str, docs: list) -> List[dict]:
+    """Per-candidate feature values (each in [0, 1]) and the weighted score, in input order."""
+    query_tokens = tokenize(query)
+    query_terms = set(query_tokens)
+    doc_tokens = [tokenize(getattr(doc, "page_content", "") or "") for doc in docs]
+    n = len(docs)
+    avg_len = sum(len(tokens) for tokens in doc_tokens) / n if n else 0.0
+
+    doc_freq = Counter()
+    for tokens in doc_tokens:
+        doc_freq.update(set(tokens))
+    idf = {t: math.log(1 + (n - doc_freq[t] + 0.5) / (doc_freq[t] + 0.5)) for t in query_terms}
+
+    bm25 = []
+    for tokens in doc_tokens:
+        counts = Counter(tokens)
+        norm = BM25_K1 * (1 - BM25_B + BM25_B * len(tokens) / avg_len) if avg_len else BM25_K1
+        bm25.append(sum(idf[t] * counts[t] * (BM25_K1 + 1) / (counts[t] + norm) for t in query_terms if counts[t]))
+    top_bm25 = max(bm25, default=0.0) or 1.0
+
+    query_pairs = _bigrams(query_tokens)
+    mtimes = [_source_mtime(str((getattr(doc, "metadata", {}) or {}).get("source", ""))) for doc in docs]
+    known = [m for m in mtimes if m is not None]
+    oldest, newest = (min(known), max(known)) if known else (0.0, 0.0)
+
+    scored = []
+    for rank, (doc, tokens) in enumerate(zip(docs, doc_tokens)):
+        if query_pairs:
+            phrase = len(query_pairs & _bigrams(tokens)) / len(query_pairs)
+        else:
+            phrase = len(query_terms & set(tokens)) / len(query_terms) if query_terms else 0.0
+        title = len(query_terms & _title_terms(doc)) / len(query_terms) if query_terms else 0.0
+        recency = (mtimes[rank] - oldest) / (newest - oldest) if mtimes[rank] is not None and newest > oldest else 0.0
+        features = {
+            "bm25": bm25[rank] / top_bm25,
+            "phrase": phrase,
+            "title": title,
+            "vector": 1.0 / (1 + rank),
+            "recency": recency,
+        }
+        score = sum(RERANK_WEIGHTS[name] * value for name, value in features.items())
+        scored.append({"score": score, "features": features})
+    return scored
+
+
+def rerank(query: str, docs: list, k: int) -> list:
+    """The `k` best of `docs` (a vector-ranked candidate pool), duplicates removed."""
+    unique, seen = [], set()
+    for doc in docs:
+        key = (doc.metadata.get("source"), doc.page_content)
+        if key not in seen:
+            seen.add(key)
+            unique.append(doc)
+    if len(unique) <= 1:
+        return unique[:k]
+    with timed("rerank"):
+        scored = score_candidates(query, unique)
+        order = sorted(range(len(unique)), key=lambda i: scored[i]["score"], reverse=True)
+    return [unique[i] for i in order[:k]]
+
+
+class RerankingRetriever(BaseRetriever):
+    """Fetches `candidates` chunks from `inner` (an ArtifactRetriever or vector store retriever)
+    and returns the `k` best after local re-ranking.
+    """
+
+    inner: Any
+    k: int = 3
+    candidates: int = RERANK_CANDIDATES
+
+    @property
+    def embeddings(self):
+        return getattr(self.inner, "embeddings", None) or self.inner.vectorstore.embeddings
+
+    def candidates_for(self, query: str) -> List[Document]:
+        index = getattr(self.inner, "index", None)
+        if index is not None:
+            return index.similarity_search_by_vector(self.inner.embeddings.embed_query(query), k=self.candidates)
+        return self.inner.vectorstore.similarity_search(query, k=self.candidates)
+
+    def _get_relevant_documents(self, query: str, *, run_manager: CallbackManagerForRetrieverRun) -> List[Document]:
+        return rerank(query, self.candidates_for(query), self.k)
@@ -0,0 +1,162 @@
+"""Heading-aware chunking (CHUNKING_MODE=sections): small child chunks that resolve to whole parent sections."""
+import re
+import statistics
+from typing import List, Optional, Tuple
+
+from langchain_core.documents import Document
+
+from app.extractive import split_units
+
+# Parents larger than this are split at block boundaries into parts
+SECTION_MAX_CHARS = 3000
+CHILD_MAX_CHARS = 600
+HEADING_SIZE_RATIO = 1.15
+
+_NUMBERED_HEADING = re.compile(r"^(\d+(?:\.\d+)+)\.?\s+[A-Z]")
+_STEP_LINE = re.compile(r"^\s*(?:step\s*)?\d{1,2}\s*[.):-]\s+", re.IGNORECASE)
+
+
+class Line:
+    def __init__(self, text: str, size: Optional[float], page: int):
+        self.text = text
+        self.size = size
+        self.page = page
+
+
+def extract_lines(pdf_files: List[str]) -> List[Tuple[str, List[Line]]]:
+    """(source, lines) per PDF, with each line's mean font size when pdfplumber provides it."""
+    # Ingestion-only dependency, as in app.chatbot.load_documents
+    import pdfplumber
+
+    documents = []
+    for pdf_file in pdf_files:
+        lines = []
+        with pdfplumber.open(pdf_file) as pdf:
+            for page_number, page in enumerate(pdf.pages, start=1):
+                if hasattr(page, "extract_text_lines"):
+                    for line in page.extract_text_lines(return_chars=True):
+                        sizes = [c["size"] for c in line.get("chars", []) if c.get("size")]
+                        size = sum(sizes) / len(sizes) if sizes else None
+                        lines.append(Line(line["text"].strip(), size, page_number))
+                else:
+                    for text in (page.extract_text() or "").splitlines():
+                        lines.append(Line(text.strip(), None, page_number))
+        documents.append((pdf_file, [line for line in lines if line.text]))
+    return documents
+
+
+def heading_level(line: Line, body_size: Optional[float]) -> Optional[int]:
+    """Heading depth (1 = top level) or None for body text."""
+    text = line.text
+    if len(text) > 90 or _STEP_LINE.match(text):
+        return None
+    numbered = _NUMBERED_HEADING.match(text)
+    if numbered:
+        return numbered.group(1).count(".") + 1
+    if text.endswith((".", ",", ";", ":")) or len(text.split()) > 12:
+        return None
+    if line.size and body_size:
+        if line.size >= body_size * HEADING_SIZE_RATIO * 1.3:
+            return 1
+        if line.size >= body_size * HEADING_SIZE_RATIO:
+            return 2
+        return None
+    # No font information: short all-caps or title-case lines
+    words = [w for w in re.findall(r"[A-Za-z][A-Za-z'&/-]*", text)]
+    if not words or len(text) > 60:
+        return None
+    if text.isupper() and len(text) > 3:
+        return 1
+    capitalized = sum(w[0].isupper() for w in words if len(w) > 3)
+    long_words = sum(1 for w in words if len(w) > 3)
+    return 2 if long_words and capitalized == long_words else None
+
+
+def parse_sections(lines: List[Line]) -> List[dict]:
+    """Group lines into sections: {"title", "path", "pages", "text"} in document order."""
+    sizes = [line.size for line in lines if line.size]
+    body_size = statistics.median(sizes) if sizes else None
+
+    sections, stack = [], []
+    current = {"title": "", "path": "", "pages": [], "lines": []}
+    for line in lines:
+        level = heading_level(line, body_size)
+        if level is not None:
+            if current["lines"] or current["title"]:
+                sections.append(current)
+            stack = [entry for entry in stack if entry[0] < level] + [(level, line.text)]
+            current = {"title": line.text, "path": " > ".join(t for _, t in stack), "pages": [line.page], "lines": []}
+            continue
+        current["lines"].append(line.text)
+        if line.page not in current["pages"]:
+            current["pages"].append(line.page)
+    sections.append(current)
+
+    return [
+        {"title": s["title"], "path": s["path"], "pages": s["pages"] or [1], "text": "\n".join(s["lines"])}
+        for s in sections
+        if s["lines"]
+    ]
+
+
+def section_blocks(text: str) -> List[str]:
+    """Child-sized blocks: each step list whole (if it fits), prose packed up to CHILD_MAX_CHARS."""
+    blocks, prose = [], ""
+    for kind, unit in split_units(text):
+        if kind == "steps":
+            if prose:
+                blocks.append(prose)
+                prose = ""
+            steps = unit.split("\n")
+            group = ""
+            for step in steps:
+                if group and len(group) + len(step) + 1 > CHILD_MAX_CHARS:
+                    blocks.append(group)
+                    group = ""
+                group = f"{group}\n{step}" if group else step
+            if group:
+                blocks.append(group)
+        elif prose and len(prose) + len(unit) + 1 > CHILD_MAX_CHARS:
+            blocks.append(prose)
+            prose = unit
+        else:
+            prose = f"{prose} {unit}" if prose else unit
+    if prose:
+        blocks.append(prose)
+    return blocks
+
+
+def split_sections(documents: List[Tuple[str, List[Line]]]) -> Tuple[List[Document], List[Document]]:
+    """(children, parents) for the corpus. Children carry `parent_id`; both carry page and section metadata."""
+    children, parents = [], []
+    for source, lines in documents:
+        for section in parse_sections(lines):
+            blocks = section_blocks(section["text"]) or [section["text"]]
+            # Oversized sections become several parents, cut only between blocks
+            parts, part = [], []
+            for block in blocks:
+                if part and sum(len(b) for b in part) + len(block) > SECTION_MAX_CHARS:
+                    parts.append(part)
+                    part = []
+                part.append(block)
+            if part:
+                parts.append(part)
+
+            for number, part in enumerate(parts, start=1):
+                parent_id = f"{len(parents)}"
+                title = section["title"] + (f" (part {number})" if len(parts) > 1 else "")
+                metadata = {
+                    "source": source,
+                    "page": section["pages"][0],
+                    "pages": section["pages"],
+                    "section": section["path"] or section["title"],
+                }
+                # A section that fits is kept verbatim; split ones are rebuilt from their blocks
+                body = section["text"] if len(parts) == 1 else "\n".join(part)
+                parents.append(Document(page_content=f"{title}\n{body}".strip(), metadata={**metadata, "parent_id": parent_id}))
+                for block in part:
+                    children.append(Document(
+                        page_content=f"{section['title']}\n{block}".strip(),
+                        metadata={**metadata, "parent_id": parent_id},
+                    ))
+    return children, parents
@@ -0,0 +1,45 @@
+"""Multi-worker launcher that builds the index artifact once before forking: python -m app.serve --workers 4"""
+import argparse
+import os
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run the chatbot with N workers sharing one prebuilt index.")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--host", default="0.0.0.0")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--pdf-folder", default="pdfs")
+    parser.add_argument("--index-dir", default=os.environ.get("INDEX_ARTIFACT_DIR") or ".cache/index")
+    parser.add_argument("--cache-path", default=os.environ.get("CACHE_PATH", ".cache/shared_cache.sqlite3"))
+    args = parser.parse_args()
+
+    # Workers are spawned as fresh interpreters and read these at import time
+    os.environ["INDEX_ARTIFACT_DIR"] = args.index_dir
+    os.environ.setdefault("CACHE_BACKEND", "sqlite")
+    os.environ["CACHE_PATH"] = args.cache_path
+
+    # Imported after the environment is set so app modules pick it up
+    from app.chatbot import artifact_is_current, build_index_artifact, index_version, load_chain
+    from app.precompute import AnswerStore, refresh_stale
+    import uvicorn
+
+    if artifact_is_current(args.index_dir, args.pdf_folder):
+        print(f"Index artifact in {args.index_dir} is current.")
+    else:
+        print(f"Building index artifact in {args.index_dir}...")
+        manifest = build_index_artifact(args.pdf_folder, args.index_dir)
+        print(f"Indexed {manifest['count']} chunks (corpus version {manifest['version']}).")
+
+    # Refresh stale precomputed answers once here instead of in every worker
+    store = AnswerStore().load()
+    version = index_version()
+    if store.stale_queries(version):
+        print(f"Regenerating {len(store.stale_queries(version))} stale precomputed answers...")
+        refresh_stale(store, load_chain(), version)
+    os.environ["PRECOMPUTE_REFRESH_ON_START"] = "0"
+
+    uvicorn.run("app.main:app", host=args.host, port=args.port, workers=args.workers)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,198 @@
+"""Server-side conversation sessions: recent turns plus a running summary, with follow-up rewriting."""
+import os
+import re
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from contextvars import copy_context
+from typing import Callable, List, Optional
+
+from app.cache import make_cache
+from app.embeddings import count_tokens
+from app.usage import stage
+
+SESSION_TTL_S = float(os.environ.get("SESSION_TTL_S", "1800"))
+SESSION_MAX_SESSIONS = int(os.environ.get("SESSION_MAX_SESSIONS", "10000"))
+# Recent turns kept verbatim: at most this many, and at most this many tokens in total
+SESSION_MAX_TURNS = int(os.environ.get("SESSION_MAX_TURNS", "6"))
+SESSION_HISTORY_TOKENS = int(os.environ.get("SESSION_HISTORY_TOKENS", "800"))
+SESSION_SUMMARY_TOKENS = int(os.environ.get("SESSION_SUMMARY_TOKENS", "200"))
+SESSION_SUMMARY_WORKERS = int(os.environ.get("SESSION_SUMMARY_WORKERS", "2"))
+# Each stored message is truncated to this many characters
+SESSION_MESSAGE_CHARS = 1200
+# Updates to one session are serialized on one of this many locks (per process)
+SESSION_LOCK_STRIPES = 64
+
+FOLLOW_UP_WORDS = {
+    "it", "its", "that", "this", "these", "those", "they", "them", "their", "there", "one", "ones",
+    "also", "too", "else", "same", "instead", "then", "again", "another",
+}
+FOLLOW_UP_PREFIXES = ("and ", "but ", "what about", "how about", "what if", "so ")
+
+REWRITE_PROMPT = (
+    "Rewrite the user's follow-up as a standalone question about HotelMate that can be understood "
+    "without the conversation. Keep the user's wording where possible. Return only the question.\n\n"
+    "{history}\n\nFollow-up: {query}\nStandalone question:"
+)
+SUMMARY_PROMPT = (
+    "Update the running summary of a support conversation about HotelMate with the new turns. "
+    "Keep the topics, entities and open questions the user may refer back to, in at most {words} words. "
+    "Return only the summary.\n\nCurrent summary: {summary}\n\nNew turns:\n{turns}\n\nUpdated summary:"
+)
+
+
+def truncate_tokens(text: str, max_tokens: int) -> str:
+    """Keep the end of `text` (the most recent content) within roughly `max_tokens`."""
+    if count_tokens(text) <= max_tokens:
+        return text
+    return text[-max_tokens * 4:]
+
+
+def format_turns(turns: List[dict]) -> str:
+    return "\n".join(f"User: {t['user']}\nAssistant: {t['assistant']}" for t in turns)
+
+
+def turn_tokens(turns: List[dict]) -> int:
+    return sum(count_tokens(t["user"]) + count_tokens(t["assistant"]) for t in turns)
+
+
+def fold_count(turns: List[dict]) -> int:
+    """Oldest turns to fold into the summary. Once over the caps, history is folded down to half
+    of them, so summarization runs every few turns rather than on every one.
+    """
+    if len(turns) <= SESSION_MAX_TURNS and turn_tokens(turns) <= SESSION_HISTORY_TOKENS:
+        return 0
+    n = 0
+    while n < len(turns) and (
+        len(turns) - n > max(1, SESSION_MAX_TURNS // 2) or turn_tokens(turns[n:]) > SESSION_HISTORY_TOKENS // 2
+    ):
+        n += 1
+    return n
+
+
+def needs_rewrite(session: dict, query: str) -> bool:
+    """Only follow-ups that lean on earlier turns (pronouns, "and ...", very short) are rewritten."""
+    if not session["turns"] and not session["summary"]:
+        return False
+    lowered = (query or "").strip().lower()
+    words = re.findall(r"[a-z']+", lowered)
+    return len(words) <= 4 or lowered.startswith(FOLLOW_UP_PREFIXES) or bool(FOLLOW_UP_WORDS & set(words))
+
+
+class SessionStore:
+    """Sessions keyed by id: {"turns": [{"user", "assistant"}], "summary": str, "updated_at": float}."""
+
+    def __init__(self, get_llm: Optional[Callable] = None, workers: int = SESSION_SUMMARY_WORKERS):
+        self._get_llm = get_llm
+        self.cache = make_cache("sessions", SESSION_MAX_SESSIONS, SESSION_TTL_S)
+        self._locks = [threading.Lock() for _ in range(SESSION_LOCK_STRIPES)]
+        self._summarizer = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="session-summary")
+        self._compacting = set()
+        self._compacting_lock = threading.Lock()
+
+    @property
+    def llm(self):
+        return self._get_llm() if self._get_llm is not None else None
+
+    @staticmethod
+    def new_id() -> str:
+        return uuid.uuid4().hex
+
+    def load(self, session_id: str) -> dict:
+        session = self.cache.get(session_id)
+        return session or {"turns": [], "summary": "", "updated_at": time.time()}
+
+    def history(self, session: dict) -> str:
+        parts = []
+        if session["summary"]:
+            parts.append(f"Conversation summary: {session['summary']}")
+        if session["turns"]:
+            parts.append("Recent turns:\n" + format_turns(session["turns"]))
+        return "\n\n".join(parts)
+
+    def standalone_query(self, session: dict, query: str, allow_llm: bool = True) -> str:
+        """The question to retrieve and answer with: `query` itself unless it is a follow-up."""
+        if not allow_llm or self.llm is None or not needs_rewrite(session, query):
+            return query
+        try:
+            with stage("query_rewrite"):
+                message = self.llm.invoke(REWRITE_PROMPT.format(history=self.history(session), query=query))
+            rewritten = (getattr(message, "content", "") or "").strip().strip('"')
+        except Exception:
+            return query
+        return rewritten if 0 < len(rewritten) <= 400 else query
+
+    def _lock(self, session_id: str) -> threading.Lock:
+        return self._locks[hash(session_id) % len(self._locks)]
+
+    def record(self, session_id: str, user: str, assistant: str, allow_llm: bool = True):
+        """Append a turn to the stored session. Once over the caps, the oldest turns are folded
+        into the summary in the background (inline, without a model call, when `allow_llm` is off).
+        """
+        with self._lock(session_id):
+            session = self.load(session_id)
+            session["turns"].append({
+                "user": (user or "")[:SESSION_MESSAGE_CHARS],
+                "assistant": (assistant or "")[:SESSION_MESSAGE_CHARS],
+            })
+            session["updated_at"] = time.time()
+            self.cache.set(session_id, session)
+            over_caps = fold_count(session["turns"]) > 0
+        if not over_caps:
+            return
+        if not allow_llm:
+            self.compact(session_id, allow_llm=False)
+            return
+        with self._compacting_lock:
+            if session_id in self._compacting:
+                return
+            self._compacting.add(session_id)
+        # Runs in the request's context so the summary's tokens are attributed to its endpoint
+        self._summarizer.submit(copy_context().run, self._compact_job, session_id)
+
+    def _compact_job(self, session_id: str):
+        try:
+            self.compact(session_id)
+        finally:
+            with self._compacting_lock:
+                self._compacting.discard(session_id)
+
+    def compact(self, session_id: str, allow_llm: bool = True):
+        """Fold the oldest turns into the summary. The lock is not held during the model call;
+        the result is dropped if the same turns were folded concurrently.
+        """
+        with self._lock(session_id):
+            session = self.cache.get(session_id)
+            folded = fold_count(session["turns"]) if session else 0
+            if not folded:
+                return
+            turns, summary = session["turns"][:folded], session["summary"]
+        updated = self.summarize(summary, turns, allow_llm)
+        with self._lock(session_id):
+            session = self.cache.get(session_id)
+            if not session or session["turns"][:folded] != turns:
+                return
+            session["turns"] = session["turns"][folded:]
+            session["summary"] = updated
+            self.cache.set(session_id, session)
+
+    def summarize(self, summary: str, turns: List[dict], allow_llm: bool = True) -> str:
+        if allow_llm and self.llm is not None:
+            prompt = SUMMARY_PROMPT.format(
+                words=int(SESSION_SUMMARY_TOKENS * 0.75), summary=summary or "(none)", turns=format_turns(turns)
+            )
+            try:
+                with stage("session_summary"):
+                    message = self.llm.invoke(prompt)
+                updated = (getattr(message, "content", "") or "").strip()
+                if updated:
+                    return truncate_tokens(updated, SESSION_SUMMARY_TOKENS)
+            except Exception:
+                pass
+        # No model call: keep the user's questions, newest last
+        questions = "; ".join(t["user"] for t in turns if t["user"])
+        return truncate_tokens(" ".join(p for p in (summary, questions) if p), SESSION_SUMMARY_TOKENS)
+
+    def __len__(self):
+        return len(self.cache)
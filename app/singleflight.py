@@ -0,0 +1,73 @@
+import asyncio
+import threading
+from concurrent.futures import Future
+
+from app.metrics import metrics
+
+metrics.describe("singleflight_calls_total", "Coalesced work by role; followers are upstream calls that were collapsed.")
+
+
+class SingleFlight:
+    """Collapses concurrent calls with the same key into one execution; followers get the
+    leader's result or exception.
+    """
+
+    def __init__(self, name: str):
+        self.name = name
+        self._calls = {}
+        self._lock = threading.Lock()
+
+    def _join(self, key) -> tuple[Future, bool]:
+        with self._lock:
+            future = self._calls.get(key)
+            if future is not None:
+                metrics.inc("singleflight_calls_total", group=self.name, role="follower")
+                return future, False
+            future = Future()
+            self._calls[key] = future
+        metrics.inc("singleflight_calls_total", group=self.name, role="leader")
+        return future, True
+
+    def _finish(self, key, future: Future, result=None, error: BaseException = None):
+        with self._lock:
+            self._calls.pop(key, None)
+        if error is not None:
+            future.set_exception(error)
+        else:
+            future.set_result(result)
+
+    def do(self, key, fn, *args):
+        future, leader = self._join(key)
+        if not leader:
+            return future.result()
+        try:
+            result = fn(*args)
+        except BaseException as e:
+            self._finish(key, future, error=e)
+            raise
+        self._finish(key, future, result)
+        return result
+
+    async def do_async(self, key, fn, *args):
+        """Like `do`, but `fn` (blocking) runs in a worker thread and followers await without one.
+        A cancelled caller stops waiting without cancelling the shared call: the outcome is
+        published when the thread finishes.
+        """
+        future, leader = self._join(key)
+        if not leader:
+            return await asyncio.shield(asyncio.wrap_future(future))
+        task = asyncio.ensure_future(asyncio.to_thread(fn, *args))
+
+        def publish(done: asyncio.Future):
+            if done.cancelled():
+                self._finish(key, future, error=asyncio.CancelledError())
+            elif done.exception() is not None:
+                self._finish(key, future, error=done.exception())
+            else:
+                self._finish(key, future, done.result())
+
+        task.add_done_callback(publish)
+        return await asyncio.shield(task)
+
+    def in_flight(self) -> int:
+        return len(self._calls)
@@ -10,6 +10,15 @@ let isGenerating = false;
 let currentStopButton = null;
 let messageHistory = new Map(); // Store multiple responses for each user message
 
+// Server-side conversation session, so follow-up questions are understood in context
+let sessionId = sessionStorage.getItem("hm_session_id") || null;
+function rememberSession(data) {
+  if (data && data.session_id) {
+    sessionId = data.session_id;
+    sessionStorage.setItem("hm_session_id", sessionId);
+  }
+}
+
 // --- Attachments (image only) ---
 const fileInput = document.getElementById("file-input");
 const attachBtn = document.getElementById("attach-btn");
@@ -370,9 +379,10 @@ async function resendMessage(originalUserMsg, newText, hasImage) {
     const res = await fetch("/chat", {
       method: "POST",
       headers: { "Content-Type": "application/json" },
-      body: JSON.stringify({ query: newText })
+      body: JSON.stringify({ query: newText, session_id: sessionId, start_session: !sessionId })
     });
     const data = await res.json();
+    rememberSession(data);
     
     const newBotText = data.response || "Sorry, I couldn't understand that.";
     
@@ -563,11 +573,61 @@ inputEl.addEventListener("input", () => {
     cancelWelcomeIfPending();
   }
   // Input remains enabled even during generation
+  schedulePrefetch();
 });
 
+// ---- Speculative prefetch ---------------------------------------------------
+// While the user types, the debounced input is sent to /prefetch so retrieval is already
+// done when they press Enter. A newer input aborts the previous request, and a 429 pauses
+// prefetching for a while.
+const PREFETCH_DEBOUNCE_MS = 400;
+const PREFETCH_MIN_CHARS = 12;
+const PREFETCH_BACKOFF_MS = 15000;
+let prefetchTimer = null;
+let prefetchController = null;
+let lastPrefetched = "";
+let prefetchPausedUntil = 0;
+
+function schedulePrefetch() {
+  clearTimeout(prefetchTimer);
+  prefetchTimer = setTimeout(sendPrefetch, PREFETCH_DEBOUNCE_MS);
+}
+
+function cancelPrefetch() {
+  clearTimeout(prefetchTimer);
+  if (prefetchController) {
+    prefetchController.abort();
+    prefetchController = null;
+  }
+}
+
+async function sendPrefetch() {
+  const text = inputEl.textContent.trim();
+  if (text.length < PREFETCH_MIN_CHARS || text === lastPrefetched || hasImageSelected()) return;
+  if (isGenerating || Date.now() < prefetchPausedUntil) return;
+  if (prefetchController) prefetchController.abort();
+  const controller = new AbortController();
+  prefetchController = controller;
+  lastPrefetched = text;
+  try {
+    const res = await fetch("/prefetch", {
+      method: "POST",
+      headers: { "Content-Type": "application/json" },
+      body: JSON.stringify({ query: text, session_id: sessionId }),
+      signal: controller.signal
+    });
+    if (res.status === 429) prefetchPausedUntil = Date.now() + PREFETCH_BACKOFF_MS;
+  } catch (err) {
+    // Aborted by newer input or network error: prefetching is best effort
+  } finally {
+    if (prefetchController === controller) prefetchController = null;
+  }
+}
+
 // ---- Send message ----------------------------------------------------------
 async function sendMessage() {
   const userText = inputEl.textContent.trim();
+  cancelPrefetch();
   const hasImage = hasImageSelected();
   if (!userText && !hasImage) return;
 
@@ -635,16 +695,19 @@ async function sendMessage() {
       const form = new FormData();
       form.append("image", fileInput.files[0]);
       form.append("query", userText);
+      if (sessionId) form.append("session_id", sessionId);
+      else form.append("start_session", "true");
       const res = await fetch("/chat-image", { method: "POST", body: form });
       data = await res.json();
     } else {
       const res = await fetch("/chat", {
         method: "POST",
         headers: { "Content-Type": "application/json" },
-        body: JSON.stringify({ query: userText })
+        body: JSON.stringify({ query: userText, session_id: sessionId, start_session: !sessionId })
       });
       data = await res.json();
     }
+    rememberSession(data);
 
     const botText = data.response || "Sorry, I couldn't understand that.";
     replaceDotsWithContent(botContent, "");
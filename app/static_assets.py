@@ -0,0 +1,197 @@
+"""Fingerprinted, precompressed static assets with WebP alternatives for GIFs.
+Rebuild the WebP files after changing a GIF: python -m app.static_assets --build-webp
+"""
+import argparse
+import gzip
+import hashlib
+import mimetypes
+import os
+import re
+from typing import Dict, Optional
+
+try:
+    import brotli
+except ImportError:  # optional: gzip only
+    brotli = None
+
+TEXT_EXTENSIONS = {".js", ".css", ".html", ".svg", ".json", ".txt", ".map"}
+IMMUTABLE_CACHE_CONTROL = "public, max-age=31536000, immutable"
+REVALIDATE_CACHE_CONTROL = "public, max-age=300, must-revalidate"
+_FINGERPRINT = re.compile(r"^(?P<stem>.+)\.(?P<hash>[0-9a-f]{10})(?P<ext>\.[^.]+)$")
+
+
+def accepted(header: str) -> set:
+    """Lower-cased values listed in an Accept or Accept-Encoding header, minus those refused with q=0."""
+    values = set()
+    for part in header.split(","):
+        value, *params = [p.strip() for p in part.split(";")]
+        quality = 1.0
+        for param in params:
+            name, _, number = param.partition("=")
+            if name.strip().lower() == "q":
+                try:
+                    quality = float(number)
+                except ValueError:
+                    quality = 0.0
+        if value and quality > 0:
+            values.add(value.lower())
+    return values
+
+
+class Asset:
+    def __init__(self, name: str, body: bytes, content_type: str):
+        self.name = name
+        self.body = body
+        self.content_type = content_type
+        self.digest = hashlib.sha256(body).hexdigest()[:10]
+        self.variants = {"identity": body}
+        self.webp: Optional[bytes] = None
+
+    def compress(self):
+        gz = gzip.compress(self.body, compresslevel=9, mtime=0)
+        if len(gz) < len(self.body):
+            self.variants["gzip"] = gz
+        if brotli is not None:
+            br = brotli.compress(self.body, quality=11)
+            if len(br) < len(self.body):
+                self.variants["br"] = br
+
+    @property
+    def fingerprinted_name(self) -> str:
+        stem, ext = os.path.splitext(self.name)
+        return f"{stem}.{self.digest}{ext}"
+
+
+class StaticAssets:
+    def __init__(self, directory: str = "app/static", url_prefix: str = "/static"):
+        self.directory = directory
+        self.url_prefix = url_prefix
+        self.assets: Dict[str, Asset] = {}
+        self.load()
+
+    def load(self):
+        raw = {}
+        for name in sorted(os.listdir(self.directory)):
+            path = os.path.join(self.directory, name)
+            if os.path.isfile(path) and not name.startswith("."):
+                with open(path, "rb") as f:
+                    raw[name] = f.read()
+
+        # Non-text assets first, then text assets rewritten until their hashes settle,
+        # so a file's fingerprint covers the fingerprints of everything it references
+        for name, body in raw.items():
+            if os.path.splitext(name)[1] not in TEXT_EXTENSIONS and not name.endswith(".webp"):
+                self.assets[name] = self._make_asset(name, body)
+        for name, body in raw.items():
+            if name.endswith(".webp") and os.path.splitext(name)[0] + ".gif" in self.assets:
+                gif = self.assets[os.path.splitext(name)[0] + ".gif"]
+                gif.webp = body
+                gif.digest = hashlib.sha256(gif.body + body).hexdigest()[:10]
+        text_names = [n for n in raw if os.path.splitext(n)[1] in TEXT_EXTENSIONS]
+        for _ in range(len(text_names) + 1):
+            changed = False
+            for name in text_names:
+                asset = self._make_asset(name, self._rewrite(raw[name]))
+                if name not in self.assets or self.assets[name].digest != asset.digest:
+                    self.assets[name] = asset
+                    changed = True
+            if not changed:
+                break
+        for name in text_names:
+            self.assets[name].compress()
+
+    def _make_asset(self, name: str, body: bytes) -> Asset:
+        content_type = mimetypes.guess_type(name)[0] or "application/octet-stream"
+        if content_type.startswith("text/") or content_type in ("application/javascript", "image/svg+xml"):
+            content_type += "; charset=utf-8"
+        return Asset(name, body, content_type)
+
+    def _rewrite(self, body: bytes) -> bytes:
+        text = body.decode("utf-8")
+        for name in sorted(self.assets, key=len, reverse=True):
+            text = text.replace(f"{self.url_prefix}/{name}", self.url(name))
+        return text.encode("utf-8")
+
+    def url(self, name: str) -> str:
+        """Fingerprinted URL for an asset (used as `static_url` in templates)."""
+        asset = self.assets.get(name)
+        if asset is None:
+            return f"{self.url_prefix}/{name}"
+        return f"{self.url_prefix}/{asset.fingerprinted_name}"
+
+    def resolve(self, requested: str) -> tuple[Optional[Asset], bool]:
+        """Return (asset, fingerprint_matches) for a requested file name."""
+        if requested in self.assets:
+            return self.assets[requested], False
+        match = _FINGERPRINT.match(requested)
+        if match:
+            asset = self.assets.get(match.group("stem") + match.group("ext"))
+            if asset is not None:
+                return asset, asset.digest == match.group("hash")
+        return None, False
+
+    def respond(self, requested: str, accept_encoding: str = "", accept: str = "", if_none_match: str = ""):
+        """(status, body, headers) for a request, or None if the asset does not exist."""
+        asset, fingerprinted = self.resolve(requested)
+        if asset is None:
+            return None
+
+        body, content_type, encoding = asset.body, asset.content_type, "identity"
+        vary = ["Accept-Encoding"]
+        if asset.webp is not None:
+            vary.append("Accept")
+            if "image/webp" in accepted(accept):
+                body, content_type = asset.webp, "image/webp"
+        else:
+            encodings = accepted(accept_encoding)
+            for candidate in ("br", "gzip"):
+                if candidate in encodings and candidate in asset.variants:
+                    body, encoding = asset.variants[candidate], candidate
+                    break
+
+        etag = f'"{asset.digest}-{encoding}-{content_type.split(";")[0].split("/")[-1]}"'
+        headers = {
+            "Content-Type": content_type,
+            "Cache-Control": IMMUTABLE_CACHE_CONTROL if fingerprinted else REVALIDATE_CACHE_CONTROL,
+            "ETag": etag,
+            "Vary": ", ".join(vary),
+        }
+        if encoding != "identity":
+            headers["Content-Encoding"] = encoding
+        if if_none_match and etag in [tag.strip() for tag in if_none_match.split(",")]:
+            return 304, b"", headers
+        return 200, body, headers
+
+
+def build_webp(directory: str = "app/static", quality: int = 70):
+    """Write an animated WebP next to every GIF in `directory`."""
+    from PIL import Image
+
+    for name in os.listdir(directory):
+        if not name.lower().endswith(".gif"):
+            continue
+        source = os.path.join(directory, name)
+        target = os.path.splitext(source)[0] + ".webp"
+        with Image.open(source) as image:
+            image.save(target, format="WEBP", save_all=True, quality=quality, method=6,
+                       loop=image.info.get("loop", 0), duration=image.info.get("duration", 100))
+        print(f"{name}: {os.path.getsize(source)} -> {os.path.getsize(target)} bytes ({os.path.basename(target)})")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Static asset pipeline tools.")
+    parser.add_argument("--directory", default="app/static")
+    parser.add_argument("--build-webp", action="store_true", help="Create animated WebP alternatives for GIFs")
+    args = parser.parse_args()
+
+    if args.build_webp:
+        build_webp(args.directory)
+    assets = StaticAssets(args.directory)
+    for name, asset in sorted(assets.assets.items()):
+        sizes = ", ".join(f"{enc} {len(body)}" for enc, body in asset.variants.items())
+        extra = f", webp {len(asset.webp)}" if asset.webp else ""
+        print(f"{assets.url(name):<45} {sizes}{extra}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,61 @@
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Optional
+
+# Wall time (ms) of each process start-up phase, reported by the cold-start profiler
+startup_timings = {}
+
+_timings: ContextVar[Optional[dict]] = ContextVar("request_timings", default=None)
+
+
+def start_request() -> dict:
+    """Begin collecting stage timings for the current request and return the (mutable) dict."""
+    timings = {}
+    _timings.set(timings)
+    return timings
+
+
+def current_timings() -> dict:
+    return _timings.get() or {}
+
+
+@contextmanager
+def timed(name: str):
+    """Add the wall time of this block (ms) to stage `name` of the current request."""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        timings = _timings.get()
+        if timings is not None:
+            timings[name] = timings.get(name, 0.0) + (time.perf_counter() - start) * 1000
+
+
+def server_timing_header(timings: dict) -> str:
+    return ", ".join(f"{name};dur={ms:.1f}" for name, ms in timings.items())
+
+
+def parse_server_timing(header: str) -> dict:
+    result = {}
+    for part in (header or "").split(","):
+        name, _, rest = part.strip().partition(";")
+        if not name:
+            continue
+        for attr in rest.split(";"):
+            key, _, value = attr.partition("=")
+            if key.strip() == "dur":
+                try:
+                    result[name] = float(value)
+                except ValueError:
+                    pass
+    return result
+
+
+@contextmanager
+def startup_phase(name: str):
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        startup_timings[name] = (time.perf_counter() - start) * 1000
@@ -0,0 +1,289 @@
+import os
+import sqlite3
+import threading
+import time
+from collections import defaultdict
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Optional
+
+from langchain_core.callbacks import BaseCallbackHandler
+
+from app import request_log
+from app.cache import CACHE_BACKEND, CACHE_PATH
+from app.metrics import metrics
+from app.timing import timed
+
+# USD per 1M tokens as (prompt, completion). Unknown models are counted but priced at 0.
+MODEL_PRICING = {
+    "gpt-4.1-mini": (0.40, 1.60),
+    "gpt-4.1-nano": (0.10, 0.40),
+    "gpt-4o-mini": (0.15, 0.60),
+    "text-embedding-ada-002": (0.10, 0.0),
+    "text-embedding-3-small": (0.02, 0.0),
+    "text-embedding-3-large": (0.13, 0.0),
+}
+
+# Daily budgets (0 disables). When either is exceeded the service switches to DEGRADED_MODE.
+DAILY_TOKEN_BUDGET = int(os.environ.get("DAILY_TOKEN_BUDGET", "0") or 0)
+DAILY_COST_BUDGET_USD = float(os.environ.get("DAILY_COST_BUDGET_USD", "0") or 0)
+# "extractive" answers from retrieved chunks without an LLM call, or "cache_only".
+DEGRADED_MODE = os.environ.get("BUDGET_DEGRADED_MODE", "extractive")
+# Distinct queries tracked per day; beyond it the cheaper half is folded into one bucket
+USAGE_MAX_QUERIES = int(os.environ.get("USAGE_MAX_QUERIES", "1000"))
+OTHER_QUERIES = "(other)"
+
+_endpoint: ContextVar[str] = ContextVar("usage_endpoint", default="internal")
+_stage: ContextVar[Optional[str]] = ContextVar("usage_stage", default=None)
+_cache_hit: ContextVar[bool] = ContextVar("usage_cache_hit", default=False)
+_query: ContextVar[str] = ContextVar("usage_query", default="")
+
+metrics.describe("llm_tokens_total", "Prompt/completion tokens spent on upstream model calls.")
+metrics.describe("llm_cost_usd_total", "Estimated upstream spend in USD.")
+metrics.describe("chat_requests_total", "Requests served, by endpoint and cache-hit status.")
+
+
+def model_cost(model: str, prompt_tokens: int, completion_tokens: int) -> float:
+    prompt_price, completion_price = MODEL_PRICING.get(model, (0.0, 0.0))
+    for name, prices in MODEL_PRICING.items():
+        if model != name and model.startswith(name):
+            prompt_price, completion_price = prices
+            break
+    return (prompt_tokens * prompt_price + completion_tokens * completion_price) / 1_000_000
+
+
+@contextmanager
+def request_scope(endpoint: str, query: str = ""):
+    """Attribute every model call made inside this block to `endpoint` and `query`."""
+    tokens = (_endpoint.set(endpoint), _query.set(query), _cache_hit.set(False))
+    try:
+        yield
+    finally:
+        _endpoint.reset(tokens[0])
+        _query.reset(tokens[1])
+        _cache_hit.reset(tokens[2])
+
+
+@contextmanager
+def stage(name: str):
+    """Label model calls made inside this block with a pipeline stage and time it."""
+    token = _stage.set(name)
+    try:
+        with timed(name):
+            yield
+    finally:
+        _stage.reset(token)
+
+
+def current_stage(default: str) -> str:
+    return _stage.get() or default
+
+
+def mark_cache_hit(hit: bool = True):
+    _cache_hit.set(hit)
+
+
+def _empty_bucket() -> dict:
+    return {"prompt_tokens": 0, "completion_tokens": 0, "total_tokens": 0, "cost_usd": 0.0, "calls": 0}
+
+
+def _add_bucket(target: dict, source: dict):
+    for key, value in source.items():
+        target[key] += value
+
+
+def fold_queries(by_query: dict, keep: int):
+    """Keep the `keep` most expensive query buckets and merge the rest into OTHER_QUERIES."""
+    ranked = sorted((q for q in by_query if q != OTHER_QUERIES), key=lambda q: by_query[q]["cost_usd"], reverse=True)
+    for query in ranked[keep:]:
+        _add_bucket(by_query[OTHER_QUERIES], by_query.pop(query))
+
+
+class SharedDailyTotals:
+    """Daily token and cost totals in the shared SQLite cache file, so all worker processes on
+    the host count against one budget instead of each getting the full budget.
+    """
+
+    def __init__(self, path: str = CACHE_PATH):
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, timeout=10, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS usage_daily (day TEXT PRIMARY KEY, total_tokens INTEGER, cost_usd REAL)"
+        )
+
+    def add(self, day: str, tokens: int, cost: float):
+        with self._lock:
+            self._conn.execute(
+                "INSERT INTO usage_daily (day, total_tokens, cost_usd) VALUES (?, ?, ?) "
+                "ON CONFLICT(day) DO UPDATE SET total_tokens = total_tokens + excluded.total_tokens, "
+                "cost_usd = cost_usd + excluded.cost_usd",
+                (day, tokens, cost),
+            )
+
+    def get(self, day: str) -> tuple[int, float]:
+        with self._lock:
+            row = self._conn.execute("SELECT total_tokens, cost_usd FROM usage_daily WHERE day = ?", (day,)).fetchone()
+        return (row[0], row[1]) if row else (0, 0.0)
+
+
+class UsageTracker:
+    """Aggregates token usage in memory, bucketed by UTC day. With `shared`, daily totals for
+    the budget are also kept there and read back from it.
+    """
+
+    def __init__(self, keep_days: int = 7, shared: Optional[SharedDailyTotals] = None):
+        self._lock = threading.Lock()
+        self._days = {}
+        self.keep_days = keep_days
+        self.shared = shared
+
+    @staticmethod
+    def today() -> str:
+        return time.strftime("%Y-%m-%d", time.gmtime())
+
+    def _day(self, day: str) -> dict:
+        data = self._days.get(day)
+        if data is None:
+            data = {
+                "totals": _empty_bucket(),
+                "by_endpoint": defaultdict(_empty_bucket),
+                "by_stage": defaultdict(_empty_bucket),
+                "by_model": defaultdict(_empty_bucket),
+                "by_cache_hit": defaultdict(_empty_bucket),
+                "by_query": defaultdict(_empty_bucket),
+                "requests": defaultdict(int),
+            }
+            self._days[day] = data
+            for old in sorted(self._days)[:-self.keep_days]:
+                del self._days[old]
+        return data
+
+    def record(self, model: str, prompt_tokens: int, completion_tokens: int = 0, stage_name: Optional[str] = None):
+        prompt_tokens = int(prompt_tokens or 0)
+        completion_tokens = int(completion_tokens or 0)
+        cost = model_cost(model, prompt_tokens, completion_tokens)
+        endpoint = _endpoint.get()
+        stage_name = stage_name or current_stage("generation")
+        cache_hit = "hit" if _cache_hit.get() else "miss"
+        query = _query.get()
+
+        day = self.today()
+        with self._lock:
+            data = self._day(day)
+            buckets = [
+                data["totals"],
+                data["by_endpoint"][endpoint],
+                data["by_stage"][stage_name],
+                data["by_model"][model],
+                data["by_cache_hit"][cache_hit],
+            ]
+            if query:
+                by_query = data["by_query"]
+                if query not in by_query and len(by_query) >= USAGE_MAX_QUERIES:
+                    fold_queries(by_query, USAGE_MAX_QUERIES // 2)
+                buckets.append(by_query[query])
+            for bucket in buckets:
+                bucket["prompt_tokens"] += prompt_tokens
+                bucket["completion_tokens"] += completion_tokens
+                bucket["total_tokens"] += prompt_tokens + completion_tokens
+                bucket["cost_usd"] += cost
+                bucket["calls"] += 1
+        if self.shared is not None:
+            try:
+                self.shared.add(day, prompt_tokens + completion_tokens, cost)
+            except sqlite3.Error:
+                pass
+
+        request_log.add_tokens(prompt_tokens, completion_tokens)
+        labels = {"endpoint": endpoint, "stage": stage_name, "model": model, "cache": cache_hit}
+        metrics.inc("llm_tokens_total", prompt_tokens, kind="prompt", **labels)
+        metrics.inc("llm_tokens_total", completion_tokens, kind="completion", **labels)
+        metrics.inc("llm_cost_usd_total", cost, **labels)
+
+    def record_request(self, endpoint: str, cache_hit: bool, degraded: bool = False):
+        key = f"{endpoint}:{'hit' if cache_hit else 'miss'}"
+        with self._lock:
+            self._day(self.today())["requests"][key] += 1
+        metrics.inc("chat_requests_total", endpoint=endpoint, cache="hit" if cache_hit else "miss",
+                    degraded=str(degraded).lower())
+
+    def budget_status(self) -> dict:
+        with self._lock:
+            totals = dict(self._day(self.today())["totals"])
+        scope = "process"
+        if self.shared is not None:
+            try:
+                totals["total_tokens"], totals["cost_usd"] = self.shared.get(self.today())
+                scope = "shared"
+            except sqlite3.Error:
+                pass
+        over_tokens = bool(DAILY_TOKEN_BUDGET) and totals["total_tokens"] >= DAILY_TOKEN_BUDGET
+        over_cost = bool(DAILY_COST_BUDGET_USD) and totals["cost_usd"] >= DAILY_COST_BUDGET_USD
+        return {
+            "daily_token_budget": DAILY_TOKEN_BUDGET or None,
+            "daily_cost_budget_usd": DAILY_COST_BUDGET_USD or None,
+            "tokens_used": totals["total_tokens"],
+            "cost_used_usd": round(totals["cost_usd"], 6),
+            "scope": scope,
+            "exceeded": over_tokens or over_cost,
+            "degraded_mode": DEGRADED_MODE if (over_tokens or over_cost) else None,
+        }
+
+    def degraded_mode(self) -> Optional[str]:
+        """Return the active degraded mode, or None while within budget."""
+        return self.budget_status()["degraded_mode"]
+
+    def report(self, day: Optional[str] = None, top: int = 10) -> dict:
+        day = day or self.today()
+        with self._lock:
+            data = self._days.get(day)
+            if data is None:
+                return {"day": day, "totals": _empty_bucket()}
+            snapshot = {
+                key: (dict(value) if isinstance(value, dict) else value)
+                for key, value in data.items()
+            }
+            by_query = {q: dict(b) for q, b in data["by_query"].items()}
+        snapshot.pop("by_query")
+        other = by_query.pop(OTHER_QUERIES, None)
+        snapshot["day"] = day
+        snapshot["days_available"] = sorted(self._days)
+        snapshot["most_expensive_queries"] = [
+            {"query": q, **b}
+            for q, b in sorted(by_query.items(), key=lambda item: item[1]["cost_usd"], reverse=True)[:top]
+        ]
+        if other is not None:
+            snapshot["other_queries"] = other
+        if day == self.today():
+            snapshot["budget"] = self.budget_status()
+        return snapshot
+
+
+class UsageCallbackHandler(BaseCallbackHandler):
+    """LangChain callback that forwards token usage from chat model responses to the tracker."""
+
+    def __init__(self, tracker: UsageTracker):
+        self.tracker = tracker
+
+    def on_llm_end(self, response, **kwargs):
+        output = response.llm_output or {}
+        usage = output.get("token_usage") or {}
+        model = output.get("model_name") or "unknown"
+        prompt_tokens = usage.get("prompt_tokens", 0)
+        completion_tokens = usage.get("completion_tokens", 0)
+        if not usage:
+            # Newer langchain-openai versions attach usage to the message instead
+            for generations in response.generations:
+                for gen in generations:
+                    meta = getattr(getattr(gen, "message", None), "usage_metadata", None) or {}
+                    prompt_tokens += meta.get("input_tokens", 0)
+                    completion_tokens += meta.get("output_tokens", 0)
+        if prompt_tokens or completion_tokens:
+            self.tracker.record(model, prompt_tokens, completion_tokens)
+
+
+# With the SQLite cache backend (multi-worker) the budget is enforced across all workers
+tracker = UsageTracker(shared=SharedDailyTotals() if CACHE_BACKEND == "sqlite" else None)
+usage_callback = UsageCallbackHandler(tracker)
@@ -0,0 +1,255 @@
+"""
+Offline Latency Benchmark Suite
+Drives /chat and /chat-image at fixed concurrency levels against a local app instance whose
+OpenAI calls go to the stub server, and reports throughput plus p50/p95/p99 per pipeline stage.
+"""
+
+import argparse
+import asyncio
+import io
+import json
+import os
+import shutil
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+from typing import Dict, List
+
+import httpx
+
+# Add the parent directory to the path to import app modules
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.timing import parse_server_timing
+from tests.eval_runner import summarize
+from tests.stub_openai_server import StubConfig, start_stub_server
+
+IMAGE_PATH = "app/static/AI Logo-01.png"
+
+
+def image_payloads(count: int, path: str = IMAGE_PATH) -> List[bytes]:
+    """`count` distinct PNGs: the base image with a per-request pixel pattern in one corner,
+    so neither byte-level nor perceptual deduplication can serve a request from another.
+    """
+    from PIL import Image
+
+    with Image.open(path) as source:
+        base = source.convert("RGB")
+    payloads = []
+    for i in range(count):
+        image = base.copy()
+        side = max(8, min(image.size) // 4)
+        tile = Image.frombytes("RGB", (side, side), os.urandom(side * side * 3))
+        image.paste(tile, ((i * side) % max(1, image.size[0] - side), 0))
+        out = io.BytesIO()
+        image.save(out, format="PNG")
+        payloads.append(out.getvalue())
+    return payloads
+
+
+def _free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+class LatencyBenchmark:
+    def __init__(self, queries_path: str = "test_data/answer_generation_test_data.json",
+                 concurrency_levels=(1, 4, 16), requests_per_level: int = 40, stub_config: StubConfig = None,
+                 use_answer_cache: bool = False):
+        """Initialize the benchmark with the query set and load shape."""
+        self.queries = self.load_queries(queries_path)
+        self.concurrency_levels = list(concurrency_levels)
+        self.requests_per_level = requests_per_level
+        self.stub_config = stub_config or StubConfig()
+        self.use_answer_cache = use_answer_cache
+        self.results = []
+        self.stub_server = None
+        self.app_process = None
+        self.base_url = None
+        self.workdir = None
+
+    def load_queries(self, path: str) -> List[str]:
+        with open(path, "r", encoding="utf-8") as f:
+            data = json.load(f)
+        return [case["question"] for case in data.get("answer_generation_test_cases", [])]
+
+    def start(self):
+        """Start the stub upstream and an app instance pointed at it."""
+        self.stub_server = start_stub_server(self.stub_config)
+        stub_url = f"http://127.0.0.1:{self.stub_server.server_address[1]}/v1"
+
+        port = _free_port()
+        # Everything the app persists goes to a scratch directory, never to the real logs/ or .cache/
+        self.workdir = tempfile.mkdtemp(prefix="bench-latency-")
+        env = dict(os.environ)
+        env.update({
+            "OPENAI_API_KEY": "stub",
+            "OPENAI_BASE_URL": stub_url,
+            "OPENAI_API_BASE": stub_url,
+            "EMBEDDINGS_BACKEND": "hash",
+            "REQUEST_LOG_ENABLED": "0",
+            "REQUEST_LOG_PATH": os.path.join(self.workdir, "requests.jsonl"),
+            "CACHE_PATH": os.path.join(self.workdir, "shared_cache.sqlite3"),
+            "JOB_STORE_PATH": os.path.join(self.workdir, "jobs.sqlite3"),
+            "INDEX_GENERATIONS_DIR": os.path.join(self.workdir, "generations"),
+            "NAMESPACE_INDEX_DIR": os.path.join(self.workdir, "namespaces"),
+            "EMBED_CHECKPOINT_DIR": os.path.join(self.workdir, "embed_checkpoints"),
+            # Measure the full pipeline: no precomputed answers, no perceptual image cache
+            "PRECOMPUTED_ANSWERS_PATH": os.path.join(self.workdir, "precomputed_answers.json"),
+            "PRECOMPUTE_REFRESH_ON_START": "0",
+            "IMAGE_CACHE_SIZE": "0",
+        })
+        if not self.use_answer_cache:
+            env["ANSWER_CACHE_SIZE"] = "0"
+        self.app_process = subprocess.Popen(
+            [sys.executable, "-m", "uvicorn", "app.main:app", "--port", str(port), "--log-level", "warning"],
+            env=env,
+        )
+        self.base_url = f"http://127.0.0.1:{port}"
+
+        deadline = time.time() + 300
+        while time.time() < deadline:
+            if self.app_process.poll() is not None:
+                raise RuntimeError("App process exited during startup.")
+            try:
+                if httpx.get(self.base_url + "/metrics", timeout=1).status_code == 200:
+                    return
+            except httpx.HTTPError:
+                time.sleep(0.5)
+        raise RuntimeError("App did not become ready in time.")
+
+    def stop(self):
+        if self.app_process:
+            self.app_process.terminate()
+            try:
+                self.app_process.wait(timeout=10)
+            except subprocess.TimeoutExpired:
+                self.app_process.kill()
+                self.app_process.wait()
+        if self.stub_server:
+            self.stub_server.shutdown()
+        if self.workdir:
+            shutil.rmtree(self.workdir, ignore_errors=True)
+
+    async def _send(self, client: httpx.AsyncClient, endpoint: str, query: str, image: bytes) -> Dict:
+        start = time.perf_counter()
+        try:
+            if endpoint == "/chat":
+                response = await client.post(endpoint, json={"query": query})
+            else:
+                files = {"image": ("screen.png", image, "image/png")}
+                response = await client.post(endpoint, data={"query": query}, files=files)
+            status, stages = response.status_code, parse_server_timing(response.headers.get("server-timing", ""))
+        except httpx.HTTPError:
+            # Connection errors and timeouts are recorded as failed samples (status 0)
+            status, stages = 0, {}
+        return {
+            "status": status,
+            "client_ms": (time.perf_counter() - start) * 1000,
+            "stages": stages,
+        }
+
+    async def run_level(self, endpoint: str, concurrency: int) -> Dict:
+        """Send `requests_per_level` requests with at most `concurrency` in flight."""
+        images = image_payloads(self.requests_per_level) if endpoint != "/chat" else [b""]
+        semaphore = asyncio.Semaphore(concurrency)
+        samples = []
+
+        async with httpx.AsyncClient(base_url=self.base_url, timeout=120) as client:
+            async def one(i):
+                async with semaphore:
+                    samples.append(await self._send(client, endpoint, self.queries[i % len(self.queries)],
+                                                  images[i % len(images)]))
+
+            wall_start = time.perf_counter()
+            await asyncio.gather(*(one(i) for i in range(self.requests_per_level)))
+            wall_s = time.perf_counter() - wall_start
+
+        stage_names = sorted({name for s in samples for name in s["stages"]})
+        return {
+            "endpoint": endpoint,
+            "concurrency": concurrency,
+            "requests": len(samples),
+            "errors": sum(1 for s in samples if not 200 <= s["status"] < 400),
+            "throughput_rps": len(samples) / wall_s if wall_s else 0.0,
+            "client": summarize([s["client_ms"] for s in samples]),
+            "stages": {
+                name: summarize([s["stages"][name] for s in samples if name in s["stages"]])
+                for name in stage_names
+            },
+        }
+
+    def run(self, endpoints=("/chat", "/chat-image")):
+        print("Running Latency Benchmarks...")
+        print("=" * 50)
+        for endpoint in endpoints:
+            for concurrency in self.concurrency_levels:
+                print(f"Benchmarking {endpoint} at concurrency {concurrency}...")
+                self.results.append(asyncio.run(self.run_level(endpoint, concurrency)))
+
+    def print_results(self):
+        print("\n" + "=" * 50)
+        print("LATENCY BENCHMARK RESULTS")
+        print("=" * 50)
+        for result in self.results:
+            client = result["client"]
+            print(f"\n{result['endpoint']} @ concurrency {result['concurrency']}: "
+                  f"{result['throughput_rps']:.2f} req/s, {result['errors']} errors")
+            print(f"  {'client':<14} p50 {client['p50_ms']:8.1f}  p95 {client['p95_ms']:8.1f}  p99 {client['p99_ms']:8.1f} ms")
+            for name, stats in result["stages"].items():
+                print(f"  {name:<14} p50 {stats['p50_ms']:8.1f}  p95 {stats['p95_ms']:8.1f}  p99 {stats['p99_ms']:8.1f} ms")
+
+    def save_results(self, output_path: str = "test_results/benchmark_results.json"):
+        os.makedirs(os.path.dirname(output_path), exist_ok=True)
+        results_data = {
+            "config": {
+                "concurrency_levels": self.concurrency_levels,
+                "requests_per_level": self.requests_per_level,
+                "chat_latency_ms": self.stub_config.chat_latency_ms,
+                "vision_latency_ms": self.stub_config.vision_latency_ms,
+                "embedding_latency_ms": self.stub_config.embedding_latency_ms,
+                "jitter_ms": self.stub_config.jitter_ms,
+                "answer_cache": self.use_answer_cache,
+            },
+            "results": self.results,
+        }
+        with open(output_path, "w", encoding="utf-8") as f:
+            json.dump(results_data, f, indent=2, ensure_ascii=False)
+        print(f"\nBenchmark results saved to: {output_path}")
+
+
+def main():
+    """Main function to run the offline latency benchmarks."""
+    parser = argparse.ArgumentParser(description="Offline latency benchmarks for /chat and /chat-image.")
+    parser.add_argument("--concurrency", default="1,4,16", help="Comma-separated concurrency levels")
+    parser.add_argument("--requests", type=int, default=40, help="Requests per concurrency level")
+    parser.add_argument("--chat-latency-ms", type=float, default=800.0)
+    parser.add_argument("--vision-latency-ms", type=float, default=1500.0)
+    parser.add_argument("--embedding-latency-ms", type=float, default=50.0)
+    parser.add_argument("--jitter-ms", type=float, default=0.0)
+    parser.add_argument("--endpoints", default="/chat,/chat-image")
+    parser.add_argument("--with-cache", action="store_true", help="Leave the answer cache enabled")
+    parser.add_argument("--output", default="test_results/benchmark_results.json")
+    args = parser.parse_args()
+
+    stub_config = StubConfig(args.chat_latency_ms, args.vision_latency_ms, args.embedding_latency_ms, args.jitter_ms)
+    benchmark = LatencyBenchmark(
+        concurrency_levels=[int(c) for c in args.concurrency.split(",")],
+        requests_per_level=args.requests,
+        stub_config=stub_config,
+        use_answer_cache=args.with_cache,
+    )
+    benchmark.start()
+    try:
+        benchmark.run(endpoints=args.endpoints.split(","))
+    finally:
+        benchmark.stop()
+    benchmark.print_results()
+    benchmark.save_results(args.output)
+
+
+if __name__ == "__main__":
+    main()
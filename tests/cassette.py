@@ -0,0 +1,148 @@
+"""
+Record/Replay Cassette
+Stores embedding and chat-model responses in a local JSONL cassette keyed by a hash of
+model + input, so the evaluation suites can run offline and in seconds once recorded.
+
+Modes (CASSETTE_MODE): off | record (always call upstream, store) | replay (cassette only,
+misses raise) | auto (replay hits, record misses).
+"""
+
+import hashlib
+import json
+import os
+import sys
+import threading
+from typing import Callable, List, Optional
+
+from langchain_core.caches import BaseCache
+from langchain_core.embeddings import Embeddings
+from langchain_core.load import dumpd, load
+
+# Add the parent directory to the path to import app modules
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+CASSETTE_MODE = os.environ.get("CASSETTE_MODE", "off")
+CASSETTE_PATH = os.environ.get("CASSETTE_PATH", "test_data/cassettes/evaluation.jsonl")
+
+
+class CassetteMissError(KeyError):
+    """Raised in replay mode when a request has no recorded response."""
+
+
+class Cassette:
+    def __init__(self, path: str = CASSETTE_PATH, mode: str = CASSETTE_MODE):
+        self.path = path
+        self.mode = mode
+        self.entries = {}
+        self.hits = 0
+        self.misses = 0
+        self.recorded = 0
+        self._lock = threading.Lock()
+        self.load()
+
+    def load(self):
+        if not os.path.exists(self.path):
+            return
+        with open(self.path, "r", encoding="utf-8") as f:
+            for line in f:
+                if line.strip():
+                    entry = json.loads(line)
+                    self.entries[entry["key"]] = entry["value"]
+
+    @staticmethod
+    def key(kind: str, model: str, payload: str) -> str:
+        digest = hashlib.sha256(f"{kind}\x00{model}\x00{payload}".encode("utf-8")).hexdigest()
+        return f"{kind}:{digest}"
+
+    def lookup(self, key: str):
+        """Recorded value for `key`, or None if the caller should go upstream."""
+        if self.mode != "record" and key in self.entries:
+            self.hits += 1
+            return self.entries[key]
+        self.misses += 1
+        if self.mode == "replay":
+            raise CassetteMissError(f"No cassette entry for {key} in {self.path}. Re-run with CASSETTE_MODE=record.")
+        return None
+
+    def put(self, key: str, value):
+        if self.mode not in ("record", "auto"):
+            return
+        with self._lock:
+            self.entries[key] = value
+            os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+            with open(self.path, "a", encoding="utf-8") as f:
+                f.write(json.dumps({"key": key, "value": value}, ensure_ascii=False) + "\n")
+            self.recorded += 1
+
+    def stats(self) -> dict:
+        return {"mode": self.mode, "entries": len(self.entries), "hits": self.hits,
+                "misses": self.misses, "recorded": self.recorded}
+
+
+class CassetteEmbeddings(Embeddings):
+    """Embeddings served from the cassette; only unrecorded texts reach the real client.
+    `inner_factory` is called lazily so replay mode never needs an API key.
+    """
+
+    def __init__(self, cassette: Cassette, model: str, inner_factory: Callable[[], Embeddings]):
+        self.cassette = cassette
+        self.model = model
+        self.inner_factory = inner_factory
+        self._inner = None
+
+    @property
+    def inner(self) -> Embeddings:
+        if self._inner is None:
+            self._inner = self.inner_factory()
+        return self._inner
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        keys = [self.cassette.key("embedding", self.model, t) for t in texts]
+        vectors = [self.cassette.lookup(k) for k in keys]
+        missing = [i for i, v in enumerate(vectors) if v is None]
+        if missing:
+            fresh = self.inner.embed_documents([texts[i] for i in missing])
+            for i, vector in zip(missing, fresh):
+                vectors[i] = vector
+                self.cassette.put(keys[i], vector)
+        return vectors
+
+    def embed_query(self, text: str) -> List[float]:
+        key = self.cassette.key("embedding", self.model, text)
+        vector = self.cassette.lookup(key)
+        if vector is None:
+            vector = self.inner.embed_query(text)
+            self.cassette.put(key, vector)
+        return vector
+
+
+class CassetteLLMCache(BaseCache):
+    """LangChain LLM cache backed by the cassette; install with `set_llm_cache`."""
+
+    def __init__(self, cassette: Cassette):
+        self.cassette = cassette
+
+    def lookup(self, prompt: str, llm_string: str) -> Optional[list]:
+        value = self.cassette.lookup(self.cassette.key("chat", llm_string, prompt))
+        if value is None:
+            return None
+        return [load(generation) for generation in value]
+
+    def update(self, prompt: str, llm_string: str, return_val) -> None:
+        self.cassette.put(self.cassette.key("chat", llm_string, prompt), [dumpd(g) for g in return_val])
+
+    def clear(self, **kwargs) -> None:
+        pass
+
+
+_cassette = None
+
+
+def get_cassette() -> Optional[Cassette]:
+    """Process-wide cassette for CASSETTE_MODE, or None when disabled."""
+    global _cassette
+    if CASSETTE_MODE == "off":
+        return None
+    if _cassette is None:
+        _cassette = Cassette()
+    return _cassette
@@ -0,0 +1,80 @@
+"""
+Concurrent Evaluation Runner
+Runs evaluation cases with bounded parallelism, shows a progress bar, streams each result to a
+JSONL file as it completes and records per-case latency.
+"""
+
+import json
+import math
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import Any, Callable, Dict, List, Optional
+
+from tqdm import tqdm
+
+EVAL_CONCURRENCY = int(os.environ.get("EVAL_CONCURRENCY", "4"))
+
+
+def percentile(values: List[float], pct: float) -> float:
+    """Nearest-rank percentile; 0.0 for an empty list."""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    rank = max(1, math.ceil(pct / 100 * len(ordered)))
+    return ordered[min(rank, len(ordered)) - 1]
+
+
+def summarize(samples: List[float]) -> Dict[str, float]:
+    return {
+        "count": len(samples),
+        "mean_ms": sum(samples) / len(samples) if samples else 0.0,
+        "p50_ms": percentile(samples, 50),
+        "p95_ms": percentile(samples, 95),
+        "p99_ms": percentile(samples, 99),
+        "max_ms": max(samples) if samples else 0.0,
+    }
+
+
+class StreamingResultWriter:
+    """Appends one JSON line per finished case so partial runs still leave usable results."""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        open(path, "w", encoding="utf-8").close()
+
+    def write(self, record: Dict):
+        with self._lock, open(self.path, "a", encoding="utf-8") as f:
+            f.write(json.dumps(record, ensure_ascii=False, default=str) + "\n")
+
+
+def run_concurrently(items: List[Any], fn: Callable[[Any], Dict], max_workers: int = EVAL_CONCURRENCY,
+                     desc: str = "Evaluating", on_result: Optional[Callable[[int, Dict], None]] = None,
+                     writer: Optional[StreamingResultWriter] = None) -> List[Dict]:
+    """Apply `fn` to every item with at most `max_workers` in flight.
+    Each result dict gets a `latency_ms` field; results are returned in input order while
+    `on_result` and `writer` see them in completion order.
+    """
+    def timed(item):
+        start = time.perf_counter()
+        result = fn(item)
+        result["latency_ms"] = (time.perf_counter() - start) * 1000
+        return result
+
+    results: List[Optional[Dict]] = [None] * len(items)
+    with ThreadPoolExecutor(max_workers=max(1, max_workers)) as pool:
+        futures = {pool.submit(timed, item): i for i, item in enumerate(items)}
+        with tqdm(total=len(items), desc=desc, unit="case") as progress:
+            for future in as_completed(futures):
+                index = futures[future]
+                result = future.result()
+                results[index] = result
+                if writer:
+                    writer.write(result)
+                if on_result:
+                    on_result(index, result)
+                progress.update(1)
+    return results
@@ -0,0 +1,173 @@
+"""
+Request Log Replay
+Re-drives the /chat and /chat-image requests recorded in the request log (app/request_log.py)
+against a running instance, at the original pace or scaled by --speed, and compares replayed
+latency with the latency recorded in the log. Images are not logged, so /chat-image requests
+are replayed with a stock image and the logged query.
+
+    python tests/replay_requests.py --base-url http://127.0.0.1:8000 --speed 2
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import sys
+import time
+from typing import Dict, List
+
+import httpx
+
+# Add the parent directory to the path to import app modules
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.request_log import REQUEST_LOG_PATH, log_files
+from app.timing import parse_server_timing
+from tests.bench_latency import IMAGE_PATH
+from tests.eval_runner import summarize
+
+
+def load_events(log_path: str, endpoints: List[str], limit: int = 0) -> List[Dict]:
+    """Logged events for `endpoints` from the log and its rotated backups, oldest first."""
+    events = []
+    for path in log_files(log_path):
+        with open(path, "r", encoding="utf-8") as f:
+            for line in f:
+                try:
+                    event = json.loads(line)
+                except ValueError:
+                    continue
+                if event.get("endpoint") in endpoints and "ts" in event:
+                    events.append(event)
+    events.sort(key=lambda e: e["ts"])
+    return events[:limit] if limit else events
+
+
+class RequestReplay:
+    def __init__(self, events: List[Dict], base_url: str, speed: float = 1.0, concurrency: int = 32):
+        """`speed` scales the recorded inter-arrival gaps (2 = twice as fast, 0 = no gaps)."""
+        self.events = events
+        self.base_url = base_url
+        self.speed = speed
+        self.concurrency = concurrency
+        self.samples = []
+        self.wall_s = 0.0
+
+    async def _send(self, client: httpx.AsyncClient, event: Dict, image: bytes) -> Dict:
+        # Sessions are not replayed, so follow-ups are sent as their logged standalone form
+        query = event.get("normalized_query", "") if event.get("follow_up") else event.get("query", "")
+        payload = {"query": query}
+        if event.get("namespace") and event["namespace"] != "base":
+            payload["namespace"] = event["namespace"]
+        start = time.perf_counter()
+        try:
+            if event["endpoint"] == "/chat":
+                if event.get("mode"):
+                    payload["mode"] = event["mode"]
+                response = await client.post("/chat", json=payload)
+            else:
+                files = {"image": ("screen.png", image, "image/png")}
+                response = await client.post("/chat-image", data=payload, files=files)
+            status, stages = response.status_code, parse_server_timing(response.headers.get("server-timing", ""))
+        except httpx.HTTPError:
+            status, stages = 0, {}
+        return {
+            "endpoint": event["endpoint"],
+            "status": status,
+            "client_ms": (time.perf_counter() - start) * 1000,
+            "stages": stages,
+            "logged_ms": (event.get("timings_ms") or {}).get("total"),
+            "logged_tier": event.get("tier"),
+        }
+
+    async def run(self):
+        with open(IMAGE_PATH, "rb") as f:
+            image = f.read()
+        semaphore = asyncio.Semaphore(self.concurrency)
+        first_ts = self.events[0]["ts"] if self.events else 0.0
+
+        async with httpx.AsyncClient(base_url=self.base_url, timeout=120) as client:
+            async def one(event, due):
+                async with semaphore:
+                    lag_ms = max(0.0, (time.perf_counter() - due) * 1000)
+                    sample = await self._send(client, event, image)
+                sample["lag_ms"] = lag_ms
+                self.samples.append(sample)
+
+            wall_start = time.perf_counter()
+            tasks = []
+            for event in self.events:
+                due = wall_start + ((event["ts"] - first_ts) / self.speed if self.speed > 0 else 0.0)
+                delay = due - time.perf_counter()
+                if delay > 0:
+                    await asyncio.sleep(delay)
+                tasks.append(asyncio.create_task(one(event, due)))
+            await asyncio.gather(*tasks)
+            self.wall_s = time.perf_counter() - wall_start
+
+    def report(self) -> Dict:
+        by_endpoint = {}
+        for endpoint in sorted({s["endpoint"] for s in self.samples}):
+            samples = [s for s in self.samples if s["endpoint"] == endpoint]
+            statuses = {}
+            for s in samples:
+                statuses[str(s["status"])] = statuses.get(str(s["status"]), 0) + 1
+            by_endpoint[endpoint] = {
+                "requests": len(samples),
+                "statuses": statuses,
+                "replayed": summarize([s["client_ms"] for s in samples]),
+                "logged": summarize([s["logged_ms"] for s in samples if s["logged_ms"] is not None]),
+            }
+        return {
+            "requests": len(self.samples),
+            "wall_s": self.wall_s,
+            "throughput_rps": len(self.samples) / self.wall_s if self.wall_s else 0.0,
+            "schedule_lag": summarize([s["lag_ms"] for s in self.samples]),
+            "endpoints": by_endpoint,
+        }
+
+    def print_results(self, report: Dict):
+        print("\n" + "=" * 50)
+        print("REQUEST REPLAY RESULTS")
+        print("=" * 50)
+        print(f"Requests: {report['requests']} in {report['wall_s']:.1f}s ({report['throughput_rps']:.2f} req/s, "
+              f"speed x{self.speed or 'max'})")
+        print(f"Schedule lag p95: {report['schedule_lag']['p95_ms']:.1f} ms")
+        for endpoint, stats in report["endpoints"].items():
+            replayed, logged = stats["replayed"], stats["logged"]
+            print(f"\n{endpoint}: {stats['requests']} requests, statuses {stats['statuses']}")
+            print(f"  {'replayed':<10} p50 {replayed['p50_ms']:8.1f}  p95 {replayed['p95_ms']:8.1f}  p99 {replayed['p99_ms']:8.1f} ms")
+            if logged["count"]:
+                print(f"  {'logged':<10} p50 {logged['p50_ms']:8.1f}  p95 {logged['p95_ms']:8.1f}  p99 {logged['p99_ms']:8.1f} ms")
+
+
+def main():
+    """Replay the request log against a running instance."""
+    parser = argparse.ArgumentParser(description="Replay logged /chat and /chat-image traffic.")
+    parser.add_argument("--log", default=REQUEST_LOG_PATH)
+    parser.add_argument("--base-url", default="http://127.0.0.1:8000")
+    parser.add_argument("--speed", type=float, default=1.0, help="Time scale: 1 = original pace, 0 = back to back")
+    parser.add_argument("--concurrency", type=int, default=32, help="Maximum requests in flight")
+    parser.add_argument("--endpoints", default="/chat,/chat-image")
+    parser.add_argument("--limit", type=int, default=0, help="Replay only the first N events")
+    parser.add_argument("--output", default="test_results/replay_results.json")
+    args = parser.parse_args()
+
+    events = load_events(args.log, args.endpoints.split(","), args.limit)
+    if not events:
+        print(f"No replayable events in {args.log}.")
+        return
+    print(f"Replaying {len(events)} requests against {args.base_url}...")
+    replay = RequestReplay(events, args.base_url, args.speed, args.concurrency)
+    asyncio.run(replay.run())
+    report = replay.report()
+    replay.print_results(report)
+
+    os.makedirs(os.path.dirname(args.output), exist_ok=True)
+    with open(args.output, "w", encoding="utf-8") as f:
+        json.dump({"config": vars(args), **report}, f, indent=2, ensure_ascii=False)
+    print(f"\nReplay results saved to: {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,67 @@
+"""
+Shared Index Fixture
+Builds the QA chain once per process and persists the vector index on disk keyed by the PDF
+corpus version and embedding model, so the evaluation suites stop re-embedding every PDF.
+"""
+
+import os
+import sys
+
+from langchain_core.globals import set_llm_cache
+
+# Add the parent directory to the path to import app modules
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.chatbot import (CHUNKING_MODE, artifact_is_current, build_chain, build_index_artifact, build_vectorstore,
+                         corpus_version, load_documents, make_embeddings, with_reranking)
+from app.index_store import ArtifactIndex, ArtifactRetriever
+from tests.cassette import CassetteEmbeddings, CassetteLLMCache, get_cassette
+
+INDEX_CACHE_DIR = os.environ.get("EVAL_INDEX_CACHE_DIR", ".cache/eval_index")
+
+_chains = {}
+
+
+def get_embeddings():
+    """Embeddings for evaluation runs, routed through the cassette when one is active."""
+    cassette = get_cassette()
+    if cassette is None:
+        return make_embeddings()
+    set_llm_cache(CassetteLLMCache(cassette))
+    model = os.environ.get("EMBEDDINGS_BACKEND", "openai")
+    return CassetteEmbeddings(cassette, model, make_embeddings)
+
+
+def get_shared_chain(pdf_folder: str = "pdfs"):
+    """Return the process-wide QA chain, loading the index from disk when it is up to date."""
+    if pdf_folder in _chains:
+        return _chains[pdf_folder]
+
+    embeddings = get_embeddings()
+    model = getattr(embeddings, "model", "default")
+    if CHUNKING_MODE != "recursive":
+        # Structure-aware chunking needs the artifact format for its parent sections
+        path = os.path.join(INDEX_CACHE_DIR, f"{model}-{CHUNKING_MODE}")
+        if not artifact_is_current(path, pdf_folder):
+            build_index_artifact(pdf_folder, path, embeddings)
+        else:
+            print(f"Loading cached index from {path}")
+        retriever = ArtifactRetriever(index=ArtifactIndex(path), embeddings=embeddings, k=3)
+        _chains[pdf_folder] = build_chain(with_reranking(retriever))
+        return _chains[pdf_folder]
+
+    cache_path = os.path.join(INDEX_CACHE_DIR, f"{corpus_version(pdf_folder)}-{model}.json")
+
+    vectorstore = None
+    if os.path.exists(cache_path):
+        from langchain_core.vectorstores import InMemoryVectorStore
+        print(f"Loading cached index from {cache_path}")
+        vectorstore = InMemoryVectorStore.load(cache_path, embeddings)
+    else:
+        vectorstore = build_vectorstore(load_documents(pdf_folder), embeddings)
+        if hasattr(vectorstore, "dump"):
+            os.makedirs(INDEX_CACHE_DIR, exist_ok=True)
+            vectorstore.dump(cache_path)
+
+    _chains[pdf_folder] = build_chain(with_reranking(vectorstore.as_retriever(search_kwargs={"k": 3})))
+    return _chains[pdf_folder]
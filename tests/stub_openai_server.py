@@ -0,0 +1,157 @@
+"""
+Stub OpenAI Server
+A local stand-in for the OpenAI chat, vision and embeddings endpoints with configurable latency,
+so the benchmarks can run fully offline. Point the app at it with OPENAI_BASE_URL.
+"""
+
+import argparse
+import json
+import os
+import random
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# Add the parent directory to the path to import app modules
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+def hash_embedding(text, dim=256):
+    # Imported lazily so `--help` works without the app dependencies installed
+    from app.embeddings import hash_embedding as _hash_embedding
+    return _hash_embedding(text, dim)
+
+
+class StubConfig:
+    def __init__(self, chat_latency_ms=800.0, vision_latency_ms=1500.0, embedding_latency_ms=50.0,
+                 jitter_ms=0.0, seed=0):
+        self.chat_latency_ms = chat_latency_ms
+        self.vision_latency_ms = vision_latency_ms
+        self.embedding_latency_ms = embedding_latency_ms
+        self.jitter_ms = jitter_ms
+        self.rng = random.Random(seed)
+        self.lock = threading.Lock()
+        self.calls = {"chat": 0, "vision": 0, "embeddings": 0}
+
+    def sleep(self, base_ms):
+        with self.lock:
+            jitter = self.rng.uniform(-self.jitter_ms, self.jitter_ms) if self.jitter_ms else 0.0
+        time.sleep(max(0.0, base_ms + jitter) / 1000)
+
+
+def _message_text(message):
+    content = message.get("content")
+    if isinstance(content, str):
+        return content, False
+    texts, has_image = [], False
+    for part in content or []:
+        if part.get("type") == "text":
+            texts.append(part.get("text", ""))
+        elif part.get("type") in ("image_url", "image"):
+            has_image = True
+    return "\n".join(texts), has_image
+
+
+def make_handler(config: StubConfig):
+    class Handler(BaseHTTPRequestHandler):
+        def log_message(self, format, *args):
+            pass
+
+        def _send(self, payload, status=200):
+            body = json.dumps(payload).encode("utf-8")
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def do_POST(self):
+            length = int(self.headers.get("Content-Length", 0))
+            request = json.loads(self.rfile.read(length) or b"{}")
+            if self.path.endswith("/embeddings"):
+                self._embeddings(request)
+            elif self.path.endswith("/chat/completions"):
+                self._chat(request)
+            else:
+                self._send({"error": {"message": f"Unknown path {self.path}"}}, status=404)
+
+        def _embeddings(self, request):
+            inputs = request.get("input", [])
+            if isinstance(inputs, str) or (inputs and isinstance(inputs[0], int)):
+                inputs = [inputs]
+            with config.lock:
+                config.calls["embeddings"] += 1
+            config.sleep(config.embedding_latency_ms)
+            data = []
+            for i, item in enumerate(inputs):
+                text = item if isinstance(item, str) else " ".join(str(t) for t in item)
+                data.append({"object": "embedding", "index": i, "embedding": hash_embedding(text)})
+            tokens = sum(len(str(item).split()) for item in inputs)
+            self._send({
+                "object": "list",
+                "data": data,
+                "model": request.get("model", "stub-embedding"),
+                "usage": {"prompt_tokens": tokens, "total_tokens": tokens},
+            })
+
+        def _chat(self, request):
+            messages = request.get("messages", [])
+            prompt, has_image = "", False
+            for message in messages:
+                text, image = _message_text(message)
+                prompt += text + "\n"
+                has_image = has_image or image
+            kind = "vision" if has_image else "chat"
+            with config.lock:
+                config.calls[kind] += 1
+            config.sleep(config.vision_latency_ms if has_image else config.chat_latency_ms)
+
+            if has_image and "output ONLY a list" in prompt:
+                # The OCR/keyword probe in detect_hotel_from_image
+                answer = json.dumps({"summary": "HotelMate reservation screen", "keywords": ["reservation", "hotel", "room"]})
+            else:
+                answer = "1. Open Reservation → Front Desk.\n2. Click Quick Reservation.\n3. Fill in the details and click Reserve."
+            prompt_tokens = len(prompt.split())
+            completion_tokens = len(answer.split())
+            self._send({
+                "id": "chatcmpl-stub",
+                "object": "chat.completion",
+                "created": int(time.time()),
+                "model": request.get("model", "stub-chat"),
+                "choices": [{"index": 0, "message": {"role": "assistant", "content": answer}, "finish_reason": "stop"}],
+                "usage": {"prompt_tokens": prompt_tokens, "completion_tokens": completion_tokens,
+                          "total_tokens": prompt_tokens + completion_tokens},
+            })
+
+    return Handler
+
+
+def start_stub_server(config: StubConfig, host: str = "127.0.0.1", port: int = 0) -> ThreadingHTTPServer:
+    """Start the stub in a daemon thread and return the server (see `server.server_address`)."""
+    server = ThreadingHTTPServer((host, port), make_handler(config))
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run a stub OpenAI-compatible server.")
+    parser.add_argument("--port", type=int, default=8787)
+    parser.add_argument("--chat-latency-ms", type=float, default=800.0)
+    parser.add_argument("--vision-latency-ms", type=float, default=1500.0)
+    parser.add_argument("--embedding-latency-ms", type=float, default=50.0)
+    parser.add_argument("--jitter-ms", type=float, default=0.0)
+    args = parser.parse_args()
+
+    config = StubConfig(args.chat_latency_ms, args.vision_latency_ms, args.embedding_latency_ms, args.jitter_ms)
+    server = ThreadingHTTPServer(("127.0.0.1", args.port), make_handler(config))
+    print(f"Stub OpenAI server listening on http://127.0.0.1:{args.port}/v1")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
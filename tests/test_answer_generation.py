@@ -12,12 +12,21 @@ import re
 # Add the parent directory to the path to import app modules
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
-from app.chatbot import load_chain, filter_response
+from app.chatbot import CHUNKING_MODE, filter_response
+from app.embeddings import count_tokens
+from tests.shared_index import get_shared_chain
+from tqdm import tqdm
+from tests.eval_runner import EVAL_CONCURRENCY, StreamingResultWriter, run_concurrently, summarize
+
+# Fail the run when p95 per-case latency exceeds this budget (0 disables the gate)
+LATENCY_P95_BUDGET_MS = float(os.environ.get("ANSWER_LATENCY_P95_BUDGET_MS", "0"))
 
 class AnswerGenerationTester:
-    def __init__(self, test_data_path: str = "test_data/answer_generation_test_data.json"):
+    def __init__(self, test_data_path: str = "test_data/answer_generation_test_data.json",
+                 concurrency: int = EVAL_CONCURRENCY):
         """Initialize the answer generation tester."""
         self.test_data_path = test_data_path
+        self.concurrency = concurrency
         self.test_cases = self.load_test_data()
         self.qa_chain = None
         self.results = []
@@ -42,7 +51,7 @@ class AnswerGenerationTester:
         """Load the complete QA chain system."""
         try:
             print("Loading QA system...")
-            self.qa_chain = load_chain()
+            self.qa_chain = get_shared_chain()
             print("QA system loaded successfully!")
             
         except Exception as e:
@@ -52,14 +61,19 @@ class AnswerGenerationTester:
     
     def generate_answer(self, question: str) -> str:
         """Generate answer for a question using the complete QA pipeline."""
+        return self.generate_answer_with_context(question)[0]
+
+    def generate_answer_with_context(self, question: str) -> Tuple[str, int]:
+        """Generate an answer and count the context tokens it was generated from."""
         try:
             # Use the complete pipeline: retrieval + generation + filtering
             result = self.qa_chain.invoke({"query": question})
             filtered_answer = filter_response(question, result)
-            return filtered_answer
+            context = " ".join(doc.page_content for doc in result.get('source_documents', []))
+            return filtered_answer, count_tokens(context)
             
         except Exception as e:
-            return f"Error generating answer: {str(e)}"
+            return f"Error generating answer: {str(e)}", 0
     
     def evaluate_answer_quality(self, question: str, generated_answer: str, test_case: Dict) -> Dict:
         """Evaluate the quality of a generated answer."""
@@ -182,33 +196,39 @@ class AnswerGenerationTester:
         
         return evaluation
     
-    def run_answer_generation_tests(self):
+    def run_test_case(self, test_case: Dict) -> Dict:
+        """Generate and evaluate the answer for a single test case."""
+        question = test_case['question']
+        generated_answer, context_tokens = self.generate_answer_with_context(question)
+        evaluation = self.evaluate_answer_quality(question, generated_answer, test_case)
+        evaluation['context_tokens'] = context_tokens
+        return evaluation
+    
+    def report_case(self, index: int, evaluation: Dict):
+        """Show poor results as soon as they complete."""
+        question = evaluation['question'][:60]
+        if evaluation['quality_score'] < 0.6:
+            tqdm.write(f"  ❌ {evaluation['quality_category'].upper()} ({evaluation['quality_score']:.2f}): {question}")
+            if evaluation.get('missing_required'):
+                tqdm.write(f"     Missing: {evaluation['missing_required']}")
+            if evaluation.get('hallucinated_items'):
+                tqdm.write(f"     Hallucinated: {evaluation['hallucinated_items']}")
+        elif evaluation.get('has_hallucinations'):
+            tqdm.write(f"  ⚠️  HALLUCINATION: {evaluation['hallucinated_items']}: {question}")
+    
+    def run_answer_generation_tests(self, stream_path: str = "test_results/answer_generation_results.partial.jsonl"):
         """Run answer generation tests on all test cases."""
-        print("Running Answer Generation Tests...")
+        print(f"Running Answer Generation Tests (concurrency {self.concurrency})...")
         print("=" * 50)
         
-        total_cases = len(self.test_cases)
-        
-        for i, test_case in enumerate(self.test_cases, 1):
-            question = test_case['question']
-            print(f"Testing {i}/{total_cases}: {question[:60]}...")
-            
-            # Generate answer
-            generated_answer = self.generate_answer(question)
-            
-            # Evaluate answer quality
-            evaluation = self.evaluate_answer_quality(question, generated_answer, test_case)
-            self.results.append(evaluation)
-            
-            # Show poor results immediately
-            if evaluation['quality_score'] < 0.6:
-                print(f"  ❌ {evaluation['quality_category'].upper()} ({evaluation['quality_score']:.2f})")
-                if evaluation.get('missing_required'):
-                    print(f"     Missing: {evaluation['missing_required']}")
-                if evaluation.get('hallucinated_items'):
-                    print(f"     Hallucinated: {evaluation['hallucinated_items']}")
-            elif evaluation.get('has_hallucinations'):
-                print(f"  ⚠️  HALLUCINATION: {evaluation['hallucinated_items']}")
+        self.results = run_concurrently(
+            self.test_cases,
+            self.run_test_case,
+            max_workers=self.concurrency,
+            desc="Answer generation",
+            on_result=self.report_case,
+            writer=StreamingResultWriter(stream_path),
+        )
     
     def calculate_metrics(self) -> Dict[str, float]:
         """Calculate overall answer generation metrics."""
@@ -239,6 +259,9 @@ class AnswerGenerationTester:
         # Average answer length
         avg_answer_length = sum(r['answer_length'] for r in self.results) / total_cases
         
+        # Per-case latency
+        latency = summarize([r['latency_ms'] for r in self.results if 'latency_ms' in r])
+        
         return {
             'avg_quality_score': avg_quality_score,
             'quality_distribution': quality_counts,
@@ -246,7 +269,9 @@ class AnswerGenerationTester:
             'default_response_rate': default_response_cases / total_cases,
             'refusal_accuracy': refusal_accuracy,
             'avg_answer_length': avg_answer_length,
-            'total_cases': total_cases
+            'avg_context_tokens': sum(r.get('context_tokens', 0) for r in self.results) / total_cases,
+            'total_cases': total_cases,
+            'latency': latency
         }
     
     def get_category_performance(self) -> Dict[str, Dict]:
@@ -294,6 +319,9 @@ class AnswerGenerationTester:
         print(f"Total Test Cases:        {metrics['total_cases']}")
         print(f"Average Quality Score:   {metrics['avg_quality_score']:.3f}")
         print(f"Average Answer Length:   {metrics['avg_answer_length']:.0f} characters")
+        print(f"Avg Context Tokens:      {metrics['avg_context_tokens']:.0f} (chunking: {CHUNKING_MODE})")
+        latency = metrics['latency']
+        print(f"Latency p50/p95/p99:     {latency['p50_ms']:.0f} / {latency['p95_ms']:.0f} / {latency['p99_ms']:.0f} ms")
         
         # Quality Distribution
         print(f"\nQUALITY DISTRIBUTION:")
@@ -358,6 +386,16 @@ class AnswerGenerationTester:
         if high_hallucination_categories:
             print(f"- Address hallucinations in: {', '.join(high_hallucination_categories)}")
     
+    def check_latency_budget(self, p95_budget_ms: float = LATENCY_P95_BUDGET_MS) -> bool:
+        """Return False when p95 per-case latency exceeds the budget (performance regression)."""
+        if not p95_budget_ms:
+            return True
+        p95 = self.calculate_metrics()['latency']['p95_ms']
+        if p95 > p95_budget_ms:
+            print(f"\n❌ LATENCY REGRESSION: p95 {p95:.0f} ms exceeds budget {p95_budget_ms:.0f} ms")
+            return False
+        return True
+    
     def save_detailed_results(self, output_path: str = "test_results/answer_generation_results.json"):
         """Save detailed results to file."""
         os.makedirs(os.path.dirname(output_path), exist_ok=True)
@@ -396,6 +434,8 @@ def main():
     tester.run_answer_generation_tests()
     tester.print_results()
     tester.save_detailed_results()
+    if not tester.check_latency_budget():
+        sys.exit(1)
 
 
 if __name__ == "__main__":
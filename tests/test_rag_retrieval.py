@@ -11,12 +11,24 @@ from typing import Dict, List, Tuple, Any
 # Add the parent directory to the path to import app modules
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
-from app.chatbot import load_chain
+from tqdm import tqdm
+import time
+
+from app.chatbot import CHUNKING_MODE
+from app.rerank import RerankingRetriever, rerank
+from app.embeddings import count_tokens
+from tests.shared_index import get_shared_chain
+from tests.eval_runner import EVAL_CONCURRENCY, StreamingResultWriter, run_concurrently, summarize
+
+# Fail the run when p95 per-case retrieval latency exceeds this budget (0 disables the gate)
+LATENCY_P95_BUDGET_MS = float(os.environ.get("RETRIEVAL_LATENCY_P95_BUDGET_MS", "0"))
 
 class RAGRetrievalTester:
-    def __init__(self, test_data_path: str = "test_data/rag_retrieval_test_data.json"):
+    def __init__(self, test_data_path: str = "test_data/rag_retrieval_test_data.json",
+                 concurrency: int = EVAL_CONCURRENCY):
         """Initialize the RAG retrieval tester."""
         self.test_data_path = test_data_path
+        self.concurrency = concurrency
         self.test_cases = self.load_test_data()
         self.qa_chain = None
         self.retriever = None
@@ -42,7 +54,7 @@ class RAGRetrievalTester:
         """Load the QA chain and extract the retriever."""
         try:
             print("Loading RAG system...")
-            self.qa_chain = load_chain()
+            self.qa_chain = get_shared_chain()
             
             # Extract retriever from the chain
             if hasattr(self.qa_chain, 'retriever'):
@@ -116,9 +128,57 @@ class RAGRetrievalTester:
             'doc_count': len(retrieved_docs)
         }
     
-    def run_retrieval_tests(self):
+    def run_test_case(self, test_case: Dict) -> Dict:
+        """Retrieve and evaluate documents for a single test case."""
+        rerank_result = None
+        if isinstance(self.retriever, RerankingRetriever):
+            retrieved_docs, rerank_result = self.retrieve_with_rerank_comparison(test_case)
+        else:
+            retrieved_docs = self.retrieve_documents(test_case['question'])
+        evaluation = self.evaluate_retrieval_quality(
+            test_case['question'],
+            retrieved_docs,
+            test_case['expected_keywords']
+        )
+        result = {
+            'test_case': test_case,
+            'evaluation': evaluation,
+            'retrieved_doc_count': len(retrieved_docs),
+            'context_tokens': count_tokens(" ".join(getattr(doc, 'page_content', '') for doc in retrieved_docs))
+        }
+        if rerank_result is not None:
+            result['rerank'] = rerank_result
+        return result
+
+    def retrieve_with_rerank_comparison(self, test_case: Dict) -> Tuple[List[Any], Dict]:
+        """Re-ranked documents plus the scores of the plain vector top-k and of the whole candidate pool."""
+        query, keywords = test_case['question'], test_case['expected_keywords']
+        try:
+            pool = self.retriever.candidates_for(query)
+        except Exception as e:
+            print(f"Error retrieving documents for query '{query}': {e}")
+            return [], None
+        start = time.perf_counter()
+        reranked = rerank(query, pool, self.retriever.k)
+        rerank_ms = (time.perf_counter() - start) * 1000
+        score = lambda docs: self.evaluate_retrieval_quality(query, docs, keywords)['retrieval_score']
+        return reranked, {
+            'baseline_score': score(pool[:self.retriever.k]),
+            'reranked_score': score(reranked),
+            'pool_score': score(pool),
+            'candidates': len(pool),
+            'rerank_ms': rerank_ms
+        }
+    
+    def report_case(self, index: int, result: Dict):
+        """Show poor results as soon as they complete."""
+        evaluation = result['evaluation']
+        if evaluation['retrieval_score'] < 0.5:
+            tqdm.write(f"  ❌ LOW SCORE ({evaluation['retrieval_score']:.2f}): Only {evaluation['keyword_matches']}/{evaluation['total_keywords']} keywords found for: {result['test_case']['question'][:60]}")
+    
+    def run_retrieval_tests(self, stream_path: str = "test_results/rag_retrieval_results.partial.jsonl"):
         """Run retrieval tests on all test cases."""
-        print("Running RAG Retrieval Tests...")
+        print(f"Running RAG Retrieval Tests (concurrency {self.concurrency})...")
         print("=" * 50)
         
         total_cases = len(self.test_cases)
@@ -129,26 +189,18 @@ class RAGRetrievalTester:
         category_stats = {}
         difficulty_stats = {}
         
-        for i, test_case in enumerate(self.test_cases, 1):
-            print(f"Testing {i}/{total_cases}: {test_case['question'][:60]}...")
-            
-            # Retrieve documents
-            retrieved_docs = self.retrieve_documents(test_case['question'])
-            
-            # Evaluate retrieval quality
-            evaluation = self.evaluate_retrieval_quality(
-                test_case['question'],
-                retrieved_docs,
-                test_case['expected_keywords']
-            )
-            
-            # Store results
-            result = {
-                'test_case': test_case,
-                'evaluation': evaluation,
-                'retrieved_doc_count': len(retrieved_docs)
-            }
-            self.results.append(result)
+        self.results = run_concurrently(
+            self.test_cases,
+            self.run_test_case,
+            max_workers=self.concurrency,
+            desc="Retrieval",
+            on_result=self.report_case,
+            writer=StreamingResultWriter(stream_path),
+        )
+        
+        for result in self.results:
+            test_case = result['test_case']
+            evaluation = result['evaluation']
             
             # Update statistics
             if evaluation['has_relevant_content']:
@@ -176,10 +228,6 @@ class RAGRetrievalTester:
                 difficulty_stats[difficulty]['successful'] += 1
             difficulty_stats[difficulty]['keyword_matches'] += evaluation['keyword_matches']
             difficulty_stats[difficulty]['total_keywords'] += evaluation['total_keywords']
-            
-            # Show poor results
-            if evaluation['retrieval_score'] < 0.5:
-                print(f"  ❌ LOW SCORE ({evaluation['retrieval_score']:.2f}): Only {evaluation['keyword_matches']}/{evaluation['total_keywords']} keywords found")
         
         # Store statistics
         self.category_stats = category_stats
@@ -210,9 +258,27 @@ class RAGRetrievalTester:
             'retrieval_success_rate': retrieval_success_rate,
             'keyword_coverage': keyword_coverage,
             'avg_retrieval_score': avg_retrieval_score,
-            'doc_retrieval_rate': doc_retrieval_rate
+            'doc_retrieval_rate': doc_retrieval_rate,
+            'avg_context_tokens': sum(result.get('context_tokens', 0) for result in self.results) / len(self.results),
+            'rerank': self.calculate_rerank_metrics(),
+            'latency': summarize([result['latency_ms'] for result in self.results if 'latency_ms' in result])
         }
     
+    def calculate_rerank_metrics(self) -> Dict[str, Any]:
+        """Effect of the re-ranker: vector top-k vs re-ranked top-k vs the full candidate pool."""
+        cases = [result['rerank'] for result in self.results if result.get('rerank')]
+        if not cases:
+            return {'enabled': False}
+        return {
+            'enabled': True,
+            'baseline_avg_score': sum(c['baseline_score'] for c in cases) / len(cases),
+            'reranked_avg_score': sum(c['reranked_score'] for c in cases) / len(cases),
+            'pool_avg_score': sum(c['pool_score'] for c in cases) / len(cases),
+            'improved': sum(1 for c in cases if c['reranked_score'] > c['baseline_score']),
+            'regressed': sum(1 for c in cases if c['reranked_score'] < c['baseline_score']),
+            'rerank_latency': summarize([c['rerank_ms'] for c in cases])
+        }
+
     def print_results(self):
         """Print detailed test results."""
         print("\n" + "=" * 50)
@@ -229,6 +295,20 @@ class RAGRetrievalTester:
         print(f"Document Retrieval Rate:   {metrics['doc_retrieval_rate']:.1%}")
         print(f"Keyword Coverage:          {stats['total_keyword_matches']}/{stats['total_keywords']} ({metrics['keyword_coverage']:.1%})")
         print(f"Average Retrieval Score:   {metrics['avg_retrieval_score']:.3f}")
+        print(f"Avg Context Tokens:        {metrics['avg_context_tokens']:.0f} (chunking: {CHUNKING_MODE})")
+        latency = metrics['latency']
+        print(f"Latency p50/p95/p99:       {latency['p50_ms']:.0f} / {latency['p95_ms']:.0f} / {latency['p99_ms']:.0f} ms")
+        
+        rerank_metrics = metrics['rerank']
+        if rerank_metrics['enabled']:
+            print(f"\nRE-RANKING (top-{self.retriever.k} of {self.retriever.candidates} candidates):")
+            print(f"Vector top-k Score:        {rerank_metrics['baseline_avg_score']:.3f}")
+            print(f"Re-ranked Score:           {rerank_metrics['reranked_avg_score']:.3f} "
+                  f"({rerank_metrics['reranked_avg_score'] - rerank_metrics['baseline_avg_score']:+.3f})")
+            print(f"Candidate Pool Score:      {rerank_metrics['pool_avg_score']:.3f} (upper bound)")
+            print(f"Improved / Regressed:      {rerank_metrics['improved']} / {rerank_metrics['regressed']} cases")
+            rerank_latency = rerank_metrics['rerank_latency']
+            print(f"Re-rank p50/p95:           {rerank_latency['p50_ms']:.2f} / {rerank_latency['p95_ms']:.2f} ms")
         
         # Performance by Category
         print(f"\nPERFORMANCE BY CATEGORY:")
@@ -273,6 +353,16 @@ class RAGRetrievalTester:
         if weak_categories:
             print(f"- Focus on improving these categories: {', '.join(weak_categories)}")
     
+    def check_latency_budget(self, p95_budget_ms: float = LATENCY_P95_BUDGET_MS) -> bool:
+        """Return False when p95 per-case latency exceeds the budget (performance regression)."""
+        if not p95_budget_ms:
+            return True
+        p95 = self.calculate_metrics()['latency']['p95_ms']
+        if p95 > p95_budget_ms:
+            print(f"\n❌ LATENCY REGRESSION: p95 {p95:.0f} ms exceeds budget {p95_budget_ms:.0f} ms")
+            return False
+        return True
+    
     def save_detailed_results(self, output_path: str = "test_results/rag_retrieval_results.json"):
         """Save detailed results to file."""
         os.makedirs(os.path.dirname(output_path), exist_ok=True)
@@ -314,6 +404,8 @@ def main():
     tester.run_retrieval_tests()
     tester.print_results()
     tester.save_detailed_results()
+    if not tester.check_latency_budget():
+        sys.exit(1)
 
 
 if __name__ == "__main__":
@@ -0,0 +1,60 @@
+import os
+import sys
+import unittest
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+
+from langchain_core.documents import Document
+
+from app.extractive import NO_EXTRACT_RESPONSE, extractive_answer, split_units, tokenize
+
+GUIDE = """Reservations
+A reservation can be created from the front desk screen at any time of day.
+To create a reservation:
+1. Open the Reservations tab.
+2. Click New Reservation and pick the
+guest profile.
+3. Save the booking.
+Cancelled reservations are kept in the history for thirty days."""
+
+
+class TokenizeTest(unittest.TestCase):
+    def test_drops_stopwords_and_truncates(self):
+        self.assertEqual(tokenize("How do I create the reservations?"), ["creat", "reser"])
+
+    def test_empty(self):
+        self.assertEqual(tokenize(None), [])
+
+
+class SplitUnitsTest(unittest.TestCase):
+    def test_steps_and_sentences(self):
+        units = split_units(GUIDE)
+        kinds = [kind for kind, _ in units]
+        self.assertIn("steps", kinds)
+        steps = dict(units)["steps"]
+        self.assertEqual(steps.splitlines()[1], "2. Click New Reservation and pick the guest profile.")
+        self.assertTrue(any("thirty days" in text for kind, text in units if kind == "sentence"))
+
+    def test_single_numbered_line_is_prose(self):
+        units = split_units("1. Only one step here, which is not a list at all.")
+        self.assertEqual([kind for kind, _ in units], ["sentence"])
+
+
+class ExtractiveAnswerTest(unittest.TestCase):
+    def test_how_to_question_returns_step_list(self):
+        answer = extractive_answer("How do I create a reservation?", [Document(page_content=GUIDE)])
+        self.assertTrue(answer.startswith("1. Open the Reservations tab."))
+
+    def test_fact_question_returns_sentence(self):
+        answer = extractive_answer("How long are cancelled reservations kept in history?",
+                                   [Document(page_content=GUIDE)])
+        self.assertIn("thirty days", answer)
+
+    def test_no_overlap(self):
+        self.assertEqual(extractive_answer("payroll taxes", [Document(page_content=GUIDE)]), NO_EXTRACT_RESPONSE)
+        self.assertEqual(extractive_answer("the", [Document(page_content=GUIDE)]), NO_EXTRACT_RESPONSE)
+        self.assertEqual(extractive_answer("reservation", []), NO_EXTRACT_RESPONSE)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,128 @@
+import json
+import os
+import sys
+import tempfile
+import unittest
+from unittest import mock
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+
+from langchain_core.documents import Document
+
+from app.chatbot import QAChain, with_reranking
+from app.embeddings import HashEmbeddings
+from app.generations import GenerationManager, validate_retriever
+from app.index_store import ArtifactIndex, ArtifactRetriever, write_index_artifact
+
+GOOD_CORPUS = [
+    "Check in a guest from the front desk arrivals list and issue the room key.",
+    "Night audit closes the business day and posts room charges.",
+    "Housekeeping marks rooms clean or dirty on the room status board.",
+]
+BAD_CORPUS = ["Lorem ipsum dolor sit amet.", "Consectetur adipiscing elit.", "Sed do eiusmod tempor."]
+CASES = [
+    {"question": "How do I check in a guest?", "expected_keywords": ["front desk", "room key"]},
+    {"question": "What does the night audit do?", "expected_keywords": ["business day"]},
+]
+
+
+def write_generation(path, corpus, version):
+    embeddings = HashEmbeddings()
+    chunks = [Document(page_content=text, metadata={"source": "guide.pdf"}) for text in corpus]
+    write_index_artifact(path, chunks, embeddings.embed_documents(corpus), version, embeddings.model)
+
+
+class GenerationsTest(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.root = os.path.join(self.tmp.name, "generations")
+        self.embeddings = HashEmbeddings()
+        initial = os.path.join(self.tmp.name, "initial")
+        write_generation(initial, GOOD_CORPUS, "v0")
+        retriever = ArtifactRetriever(index=ArtifactIndex(initial), embeddings=self.embeddings, k=1)
+        self.chain = QAChain(with_reranking(retriever))
+        self.activated = []
+        self.manager = GenerationManager(self.chain, self.embeddings, on_activate=self.activated.append, root=self.root)
+        self.manager.adopt_current("v0")
+
+        cases_path = os.path.join(self.tmp.name, "cases.json")
+        with open(cases_path, "w", encoding="utf-8") as f:
+            json.dump({"retrieval_test_cases": CASES}, f)
+        patcher = mock.patch("app.generations.VALIDATION_DATA", (cases_path, "retrieval_test_cases"))
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_validate_retriever(self):
+        self.assertEqual(validate_retriever(self.chain.retriever, CASES), {"cases": 2, "keyword_rate": 1.0})
+        self.assertEqual(validate_retriever(self.chain.retriever, []), {"cases": 0, "keyword_rate": 0.0})
+
+    def test_activate_and_rollback(self):
+        initial_retriever = self.chain.retriever
+        write_generation(os.path.join(self.root, "gen-1"), GOOD_CORPUS[::-1], "v1")
+
+        self.manager.activate("gen-1")
+        self.assertEqual((self.manager.live, self.manager.previous), ("gen-1", "initial"))
+        self.assertIsNot(self.chain.retriever, initial_retriever)
+        self.assertEqual(self.manager.published(), "gen-1")
+        self.assertEqual(self.activated[-1].version, "v1")
+
+        self.manager.rollback()
+        self.assertEqual((self.manager.live, self.manager.previous), ("initial", "gen-1"))
+        self.assertIs(self.chain.retriever, initial_retriever)
+
+    def test_rollback_without_previous(self):
+        with self.assertRaises(ValueError):
+            self.manager.rollback()
+
+    def test_validation_gate(self):
+        write_generation(os.path.join(self.root, "bad"), BAD_CORPUS, "bad")
+        report = self.manager.validate(self.manager.load("bad"))
+        self.assertFalse(report["passed"])
+        self.assertEqual(report["baseline"], 1.0)
+
+    def test_failed_rebuild_is_removed(self):
+        def build(pdf_folder, path, embeddings):
+            write_generation(path, BAD_CORPUS, "bad")
+
+        with mock.patch("app.generations.build_index_artifact", build), \
+                mock.patch("app.generations.corpus_version", lambda folder: "deadbeefcafe"):
+            result = self.manager.rebuild("pdfs")
+        self.assertFalse(result["activated"])
+        self.assertEqual(self.manager.live, "initial")
+        self.assertFalse(os.path.exists(result["generation"]["path"]))
+        self.assertNotIn(result["generation"]["id"], self.manager.loaded)
+
+    def test_forced_rebuild_activates(self):
+        def build(pdf_folder, path, embeddings):
+            write_generation(path, BAD_CORPUS, "bad")
+
+        with mock.patch("app.generations.build_index_artifact", build), \
+                mock.patch("app.generations.corpus_version", lambda folder: "deadbeefcafe"):
+            result = self.manager.rebuild("pdfs", force=True)
+        self.assertTrue(result["activated"])
+        self.assertEqual(self.manager.previous, "initial")
+
+    def test_other_workers_follow_current(self):
+        write_generation(os.path.join(self.root, "gen-1"), GOOD_CORPUS, "v1")
+        self.manager.activate("gen-1")
+        other_chain = QAChain(self.chain.retriever)
+        other = GenerationManager(other_chain, self.embeddings, root=self.root)
+        other.adopt_current("v0")
+        self.assertTrue(other.sync())
+        self.assertEqual(other.live, "gen-1")
+        self.assertFalse(other.sync())
+
+    def test_memory_budget_keeps_live_and_previous(self):
+        manager = GenerationManager(self.chain, self.embeddings, root=self.root, memory_budget_mb=0)
+        manager.adopt_current("v0")
+        for gen_id in ("gen-1", "gen-2"):
+            write_generation(os.path.join(self.root, gen_id), GOOD_CORPUS, gen_id)
+            manager.activate(gen_id)
+        self.assertEqual(set(manager.loaded), {"gen-1", "gen-2"})
+
+
+if __name__ == "__main__":
+    unittest.main()
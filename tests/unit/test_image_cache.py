@@ -0,0 +1,87 @@
+import io
+import os
+import sys
+import time
+import unittest
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+
+from PIL import Image, ImageDraw
+
+from app.image_cache import PerceptualCache, dhash, hamming
+
+
+def screenshot(fmt="PNG", shift=0, label=True, quality=90):
+    image = Image.new("RGB", (320, 200), "white")
+    draw = ImageDraw.Draw(image)
+    draw.rectangle((0, 0, 320, 30), fill=(30, 60, 120))
+    draw.rectangle((20 + shift, 50, 150 + shift, 180), fill=(200, 200, 200))
+    if label:
+        draw.rectangle((180, 60, 300, 90), fill=(0, 0, 0))
+    out = io.BytesIO()
+    image.save(out, format=fmt, **({"quality": quality} if fmt == "JPEG" else {}))
+    return out.getvalue()
+
+
+class DhashTest(unittest.TestCase):
+    def test_reencoding_keeps_hash_close(self):
+        png, jpeg = dhash(screenshot()), dhash(screenshot("JPEG", quality=60))
+        self.assertIsNotNone(png)
+        self.assertLessEqual(hamming(png, jpeg), 10)
+
+    def test_different_screens_are_far_apart(self):
+        self.assertGreater(hamming(dhash(screenshot()), dhash(screenshot(shift=120, label=False))), 10)
+
+    def test_hash_size(self):
+        self.assertLess(dhash(screenshot(), size=8), 1 << 64)
+
+    def test_undecodable(self):
+        self.assertIsNone(dhash(b"not an image"))
+
+    def test_hamming(self):
+        self.assertEqual(hamming(0b1011, 0b0001), 2)
+
+
+class PerceptualCacheTest(unittest.TestCase):
+    def test_matches_within_tolerance(self):
+        cache = PerceptualCache(tolerance=2)
+        cache.set("answer", 0b1111, "stored", text="how do i check in")
+        self.assertEqual(cache.get("answer", 0b1100, text="how do i check in"), "stored")
+        self.assertIsNone(cache.get("answer", 0b0000, text="how do i check in"))
+        self.assertIsNone(cache.get("answer", 0b1111, text="another question"))
+        self.assertIsNone(cache.get("probe", 0b1111))
+        self.assertIsNone(cache.get("answer", None))
+
+    def test_prefers_closest_hash(self):
+        cache = PerceptualCache(tolerance=4)
+        cache.set("probe", 0b0000, "far")
+        cache.set("probe", 0b0111, "near")
+        self.assertEqual(cache.get("probe", 0b1111), "near")
+
+    def test_evicts_least_recently_used(self):
+        cache = PerceptualCache(max_entries=2, tolerance=0)
+        cache.set("probe", 1, "a")
+        cache.set("probe", 2, "b")
+        cache.get("probe", 1)
+        cache.set("probe", 4, "c")
+        self.assertEqual(len(cache), 2)
+        self.assertIsNone(cache.get("probe", 2))
+        self.assertEqual(cache.get("probe", 1), "a")
+
+    def test_expiry(self):
+        cache = PerceptualCache(ttl=0.01, tolerance=0)
+        cache.set("probe", 1, True)
+        time.sleep(0.02)
+        self.assertIsNone(cache.get("probe", 1))
+        self.assertEqual(len(cache), 0)
+
+    def test_stats(self):
+        cache = PerceptualCache(tolerance=0)
+        cache.set("probe", 1, True)
+        cache.get("probe", 1)
+        cache.get("probe", 2)
+        self.assertEqual(cache.stats()["kinds"]["probe"], {"hits": 1, "misses": 1, "hit_rate": 0.5})
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,152 @@
+import os
+import sys
+import tempfile
+import threading
+import time
+import unittest
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+
+from app.embeddings import HashEmbeddings
+from app.ingest import AdaptiveLimiter, IngestionEmbedder, make_batches, parse_duration, retry_delay
+
+
+class Response:
+    def __init__(self, status_code, headers=None):
+        self.status_code = status_code
+        self.headers = headers or {}
+
+
+class RateLimitError(Exception):
+    def __init__(self, headers=None):
+        super().__init__("rate limited")
+        self.response = Response(429, headers)
+
+
+class FlakyEmbeddings(HashEmbeddings):
+    """Rate-limits the first `failures` calls, then embeds."""
+
+    def __init__(self, failures=0, fail_on=None):
+        super().__init__()
+        self.failures = failures
+        self.fail_on = fail_on
+        self.calls = []
+        self._lock = threading.Lock()
+
+    def embed_documents(self, texts):
+        with self._lock:
+            self.calls.append(list(texts))
+            if self.failures > 0:
+                self.failures -= 1
+                raise RateLimitError({"retry-after-ms": "5"})
+        if self.fail_on is not None and self.fail_on in texts:
+            raise ValueError("bad input")
+        return super().embed_documents(texts)
+
+
+class MakeBatchesTest(unittest.TestCase):
+    def test_respects_item_limit(self):
+        batches = make_batches(["word"] * 10, max_tokens=1000, max_items=4)
+        self.assertEqual([list(b) for b in batches], [[0, 1, 2, 3], [4, 5, 6, 7], [8, 9]])
+
+    def test_respects_token_limit(self):
+        texts = ["x" * 400] * 5  # ~100 tokens each
+        batches = make_batches(texts, max_tokens=250, max_items=100)
+        self.assertEqual([len(b) for b in batches], [2, 2, 1])
+
+    def test_oversized_text_gets_its_own_batch(self):
+        batches = make_batches(["short", "y" * 4000, "short"], max_tokens=100, max_items=100)
+        self.assertEqual([list(b) for b in batches], [[0], [1], [2]])
+
+    def test_empty(self):
+        self.assertEqual(make_batches([]), [])
+
+
+class RetryDelayTest(unittest.TestCase):
+    def test_parse_duration(self):
+        self.assertEqual(parse_duration("2"), 2.0)
+        self.assertEqual(parse_duration("1.5s"), 1.5)
+        self.assertAlmostEqual(parse_duration("20ms"), 0.02)
+        self.assertEqual(parse_duration("6m0s"), 360.0)
+        self.assertIsNone(parse_duration("soon"))
+
+    def test_headers(self):
+        self.assertAlmostEqual(retry_delay(RateLimitError({"retry-after-ms": "250"})), 0.25)
+        self.assertEqual(retry_delay(RateLimitError({"retry-after": "1", "x-ratelimit-reset-tokens": "3s"})), 3.0)
+        self.assertEqual(retry_delay(RateLimitError()), 0.0)
+
+    def test_server_errors_retry(self):
+        error = Exception("bad gateway")
+        error.status_code = 502
+        self.assertEqual(retry_delay(error), 0.0)
+
+    def test_not_retryable(self):
+        self.assertIsNone(retry_delay(ValueError("bad input")))
+
+
+class AdaptiveLimiterTest(unittest.TestCase):
+    def test_halves_on_failure_and_recovers(self):
+        limiter = AdaptiveLimiter(4)
+        limiter.acquire()
+        limiter.release(False, backoff=0.05)
+        self.assertEqual(limiter.limit, 2)
+        start = time.monotonic()
+        limiter.acquire()
+        self.assertGreaterEqual(time.monotonic() - start, 0.04)
+        limiter.release(True)
+        limiter.acquire()
+        limiter.release(True)
+        self.assertEqual(limiter.limit, 3)
+
+    def test_never_below_one(self):
+        limiter = AdaptiveLimiter(1)
+        limiter.acquire()
+        limiter.release(False)
+        self.assertEqual(limiter.limit, 1)
+
+
+class IngestionEmbedderTest(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.checkpoints = os.path.join(self.tmp.name, "checkpoints")
+        self.texts = [f"chunk {n} about reservations" for n in range(10)]
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_matches_plain_embeddings(self):
+        embedder = IngestionEmbedder(HashEmbeddings(), self.checkpoints, concurrency=3, batch_size=3)
+        self.assertEqual(embedder.embed_documents(self.texts), HashEmbeddings().embed_documents(self.texts))
+        self.assertEqual(embedder.last_report["batches"], 4)
+        # A finished run removes its checkpoints
+        self.assertFalse(os.path.exists(self.checkpoints))
+
+    def test_retries_rate_limits(self):
+        inner = FlakyEmbeddings(failures=2)
+        embedder = IngestionEmbedder(inner, None, concurrency=2, batch_size=5, max_retries=3)
+        vectors = embedder.embed_documents(self.texts)
+        self.assertEqual(len(vectors), len(self.texts))
+        self.assertEqual(embedder.last_report["retries"], 2)
+
+    def test_gives_up_after_max_retries(self):
+        embedder = IngestionEmbedder(FlakyEmbeddings(failures=10), None, concurrency=1, batch_size=10, max_retries=1)
+        with self.assertRaises(RateLimitError):
+            embedder.embed_documents(self.texts)
+
+    def test_resumes_from_checkpoints(self):
+        failing = FlakyEmbeddings(fail_on=self.texts[-1])
+        embedder = IngestionEmbedder(failing, self.checkpoints, concurrency=1, batch_size=5)
+        with self.assertRaises(ValueError):
+            embedder.embed_documents(self.texts)
+        self.assertEqual(len(os.listdir(self.checkpoints)), 1)
+
+        inner = FlakyEmbeddings()
+        embedder = IngestionEmbedder(inner, self.checkpoints, concurrency=1, batch_size=5)
+        vectors = embedder.embed_documents(self.texts)
+        self.assertEqual(embedder.last_report["resumed_batches"], 1)
+        self.assertEqual(inner.calls, [self.texts[5:]])
+        self.assertEqual(vectors, HashEmbeddings().embed_documents(self.texts))
+
+
+if __name__ == "__main__":
+    unittest.main()
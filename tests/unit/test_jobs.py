@@ -0,0 +1,115 @@
+import asyncio
+import os
+import sys
+import tempfile
+import time
+import unittest
+from unittest import mock
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+
+from app import jobs
+from app.jobs import JobStore, JobWorkerPool, wait_for_job
+
+
+class JobStoreTest(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.store = JobStore(os.path.join(self.tmp.name, "jobs.sqlite3"))
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_submit_deduplicates_same_image_and_query(self):
+        job_id, deduplicated = self.store.submit(b"png", "image/png", "What is this?", "what is this")
+        self.assertFalse(deduplicated)
+        self.assertEqual(self.store.submit(b"png", "image/png", "what is this", "what is this"), (job_id, True))
+        other, deduplicated = self.store.submit(b"png", "image/png", "Other", "other")
+        self.assertFalse(deduplicated)
+        self.assertNotEqual(other, job_id)
+
+    def test_failed_jobs_are_not_reused(self):
+        job_id, _ = self.store.submit(b"png", "image/png", "q", "q")
+        self.store.finish(job_id, error="model error")
+        self.assertNotEqual(self.store.submit(b"png", "image/png", "q", "q")[0], job_id)
+
+    def test_claim_finish_get(self):
+        first, _ = self.store.submit(b"one", "image/png", "q", "q")
+        second, _ = self.store.submit(b"two", "image/png", "q", "q")
+        claimed = self.store.claim_next()
+        self.assertEqual((claimed["id"], claimed["image"]), (first, b"one"))
+        self.assertEqual(self.store.get(first)["status"], "running")
+        self.assertEqual(self.store.claim_next()["id"], second)
+        self.assertIsNone(self.store.claim_next())
+
+        self.store.finish(first, result={"response": "A booking screen."})
+        job = self.store.get(first)
+        self.assertEqual((job["status"], job["response"]), ("done", "A booking screen."))
+        self.assertIsNone(self.store.get("missing"))
+
+    def test_requeue_orphans(self):
+        job_id, _ = self.store.submit(b"png", "image/png", "q", "q")
+        self.store.claim_next()
+        self.assertEqual(self.store.requeue_orphans(), 0)
+        with mock.patch.object(jobs, "JOB_LEASE_S", -1):
+            self.assertEqual(self.store.requeue_orphans(), 1)
+        self.assertEqual(self.store.get(job_id)["status"], "queued")
+
+    def test_purge_expired(self):
+        job_id, _ = self.store.submit(b"png", "image/png", "q", "q")
+        self.store.finish(job_id, result={})
+        with mock.patch.object(jobs, "JOB_TTL_S", -1):
+            self.assertEqual(self.store.purge_expired(), 1)
+        self.assertIsNone(self.store.get(job_id))
+
+
+class JobWorkerPoolTest(unittest.TestCase):
+    def test_store_is_created_on_first_submit(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "jobs.sqlite3")
+
+            async def handler(job):
+                return {}
+
+            async def run():
+                pool = JobWorkerPool(handler, path, workers=1)
+                await pool.start()
+                self.assertFalse(os.path.exists(path))
+                self.assertIsNone(await pool.get_store(create=False))
+                self.assertEqual(pool.queued(), 0)
+                store = await pool.get_store()
+                self.assertIs(await pool.get_store(create=False), store)
+                await pool.stop()
+
+            asyncio.run(run())
+            self.assertTrue(os.path.exists(path))
+
+    def test_runs_jobs_and_records_failures(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "jobs.sqlite3")
+
+            async def handler(job):
+                if job["query"] == "fail":
+                    raise RuntimeError("vision model unavailable")
+                return {"response": f"answer to {job['query']}"}
+
+            async def run():
+                pool = JobWorkerPool(handler, path, workers=2)
+                store = await pool.get_store()
+                ok, _ = store.submit(b"a", "image/png", "ok", "ok")
+                bad, _ = store.submit(b"b", "image/png", "fail", "fail")
+                pool.notify()
+                try:
+                    return await wait_for_job(store, ok, 5), await wait_for_job(store, bad, 5)
+                finally:
+                    await pool.stop()
+
+            start = time.monotonic()
+            done, failed = asyncio.run(run())
+            self.assertLess(time.monotonic() - start, 5)
+            self.assertEqual((done["status"], done["response"]), ("done", "answer to ok"))
+            self.assertEqual((failed["status"], failed["error"]), ("failed", "vision model unavailable"))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,98 @@
+import os
+import sys
+import tempfile
+import time
+import unittest
+from unittest import mock
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+
+from langchain_core.documents import Document
+
+from app.chatbot import QAChain, with_reranking
+from app.embeddings import HashEmbeddings
+from app.index_store import ArtifactIndex, ArtifactRetriever, write_index_artifact
+from app.namespaces import NamespaceManager, NamespaceNotReady, UnknownNamespace
+
+CORPUS = ["Check in a guest from the arrivals list.", "Night audit closes the business day."]
+
+
+def write_artifact(path, version="v1"):
+    embeddings = HashEmbeddings()
+    chunks = [Document(page_content=text, metadata={"source": "guide.pdf"}) for text in CORPUS]
+    write_index_artifact(path, chunks, embeddings.embed_documents(CORPUS), version, embeddings.model)
+
+
+class NamespaceManagerTest(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        base_path = os.path.join(self.tmp.name, "base")
+        write_artifact(base_path)
+        retriever = ArtifactRetriever(index=ArtifactIndex(base_path), embeddings=HashEmbeddings(), k=1)
+        self.root = os.path.join(self.tmp.name, "namespaces")
+        self.pdf = os.path.join(self.root, "acme", "guide.pdf")
+        os.makedirs(os.path.dirname(self.pdf))
+        with open(self.pdf, "wb") as f:
+            f.write(b"%PDF-1.4 acme")
+        self.manager = NamespaceManager(QAChain(with_reranking(retriever)), self.root,
+                                        os.path.join(self.tmp.name, "index"))
+        self.hashes = 0
+
+        def is_current(path, pdf_folder):
+            self.hashes += 1
+            return os.path.exists(path)
+
+        def build(pdf_folder, path, embeddings):
+            write_artifact(path)
+
+        for target, fake in (("artifact_is_current", is_current), ("build_index_artifact", build)):
+            patcher = mock.patch(f"app.namespaces.{target}", fake)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def get_when_ready(self, name):
+        deadline = time.monotonic() + 5
+        while True:
+            try:
+                return self.manager.get(name)
+            except NamespaceNotReady:
+                if time.monotonic() > deadline:
+                    raise
+                time.sleep(0.02)
+
+    def test_unknown(self):
+        with self.assertRaises(UnknownNamespace):
+            self.manager.get("missing")
+        self.assertIs(self.manager.get(None), self.manager.base)
+
+    def test_builds_in_background_then_loads(self):
+        with self.assertRaises(NamespaceNotReady):
+            self.manager.get("acme")
+        namespace = self.get_when_ready("acme")
+        self.assertEqual(namespace.name, "acme")
+        self.assertEqual(namespace.chain.retriever.invoke("night audit")[0].page_content, CORPUS[1])
+
+    def test_reload_after_eviction_does_not_rehash(self):
+        self.get_when_ready("acme")
+        hashes = self.hashes
+        self.manager.loaded.clear()
+        self.manager.get("acme")
+        self.assertEqual(self.hashes, hashes)
+
+    def test_changed_pdfs_are_verified_again(self):
+        self.get_when_ready("acme")
+        self.manager.loaded.clear()
+        hashes = self.hashes
+        with open(self.pdf, "ab") as f:
+            f.write(b" edited")
+        with self.assertRaises(NamespaceNotReady):
+            self.manager.get("acme")
+        self.get_when_ready("acme")
+        self.assertGreater(self.hashes, hashes)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,39 @@
+import os
+import sys
+import tempfile
+import unittest
+from unittest import mock
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+
+from langchain_core.documents import Document
+
+from app.precompute import AnswerStore, precompute
+
+
+def fake_run_chain(chain, question):
+    if "fail" in question:
+        raise TimeoutError("generation timed out")
+    return {"result": f"Answer to {question}", "source_documents": [Document(page_content="x", metadata={})]}
+
+
+class PrecomputeTest(unittest.TestCase):
+    def test_failed_questions_are_skipped_and_the_rest_saved(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "answers.json")
+            store = AnswerStore(path)
+            questions = ["How do I check in a guest?", "please fail now", "How do I run the night audit?"]
+            with mock.patch("app.precompute.run_chain", fake_run_chain), \
+                    mock.patch("app.precompute.filter_response", lambda q, r: r["result"]), \
+                    self.assertLogs("app.precompute", level="WARNING"):
+                answered = precompute(store, None, "v1", questions, workers=2)
+
+            self.assertEqual(answered, 2)
+            saved = AnswerStore(path).load()
+            self.assertEqual(len(saved), 2)
+            self.assertIsNotNone(saved.get("how do i check in a guest", "v1"))
+            self.assertEqual(saved.stale_queries("v2"), [e["query"] for e in saved.entries.values()])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,97 @@
+import os
+import sys
+import threading
+import time
+import unittest
+from unittest import mock
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+
+from app import prefetch
+from app.prefetch import Prefetcher, RateLimiter
+
+
+class RateLimiterTest(unittest.TestCase):
+    def test_burst_then_refill(self):
+        limiter = RateLimiter(rate_per_min=600, burst=2)
+        self.assertEqual([limiter.allow("client") for _ in range(3)], [True, True, False])
+        self.assertTrue(limiter.allow("other"))
+        time.sleep(0.12)  # 10 tokens per second
+        self.assertTrue(limiter.allow("client"))
+
+    def test_prunes_idle_clients(self):
+        limiter = RateLimiter(rate_per_min=60000, burst=1)
+        with mock.patch.object(prefetch, "RATE_LIMIT_MAX_CLIENTS", 3):
+            for n in range(5):
+                limiter.allow(f"client-{n}")
+            time.sleep(0.01)
+            limiter.allow("client-new")
+        self.assertLessEqual(len(limiter._buckets), 3)
+
+
+class PrefetcherTest(unittest.TestCase):
+    def test_schedule_and_take(self):
+        prefetcher = Prefetcher(workers=1)
+        self.assertEqual(prefetcher.schedule("client", "room rates", lambda: ["doc"]), "scheduled")
+        self.assertEqual(prefetcher.take("room rates", wait=2), ["doc"])
+        self.assertEqual(prefetcher.schedule("client", "room rates", lambda: ["doc"]), "cached")
+        self.assertIsNone(prefetcher.take("night audit", wait=0))
+
+    def test_in_flight_and_busy(self):
+        release = threading.Event()
+        prefetcher = Prefetcher(workers=1, max_pending=2)
+
+        def slow():
+            release.wait(5)
+            return ["doc"]
+
+        self.assertEqual(prefetcher.schedule("a", "one", slow), "scheduled")
+        self.assertEqual(prefetcher.schedule("b", "one", slow), "in_flight")
+        self.assertEqual(prefetcher.schedule("c", "two", slow), "scheduled")
+        self.assertEqual(prefetcher.schedule("d", "three", slow), "busy")
+        release.set()
+        self.assertEqual(prefetcher.take("one", wait=2), ["doc"])
+
+    def test_superseded_prefetch_is_skipped(self):
+        release = threading.Event()
+        fetched = []
+        prefetcher = Prefetcher(workers=1)
+
+        def fetch(key):
+            def run():
+                release.wait(5)
+                fetched.append(key)
+                return [key]
+            return run
+
+        prefetcher.schedule("blocker", "blocker", fetch("blocker"))
+        prefetcher.schedule("client", "room", fetch("room"))
+        prefetcher.schedule("client", "room rates", fetch("room rates"))
+        release.set()
+        self.assertEqual(prefetcher.take("room rates", wait=2), ["room rates"])
+        self.assertNotIn("room", fetched)
+
+    def test_rate_limited(self):
+        prefetcher = Prefetcher(workers=1)
+        prefetcher.limiter = RateLimiter(rate_per_min=1, burst=1)
+        self.assertEqual(prefetcher.schedule("client", "one", lambda: ["doc"]), "scheduled")
+        self.assertEqual(prefetcher.schedule("client", "two", lambda: ["doc"]), "rate_limited")
+
+    def test_rate_limit_ignores_client_scope(self):
+        prefetcher = Prefetcher(workers=1)
+        prefetcher.limiter = RateLimiter(rate_per_min=1, burst=1)
+        self.assertEqual(prefetcher.schedule("host:a", "one", lambda: ["doc"], rate_key="host"), "scheduled")
+        self.assertEqual(prefetcher.schedule("host:b", "two", lambda: ["doc"], rate_key="host"), "rate_limited")
+
+    def test_failed_fetch_is_a_miss(self):
+        prefetcher = Prefetcher(workers=1)
+
+        def fail():
+            raise RuntimeError("embedding call failed")
+
+        prefetcher.schedule("client", "room rates", fail)
+        self.assertIsNone(prefetcher.take("room rates", wait=2))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,71 @@
+import json
+import os
+import sys
+import tempfile
+import unittest
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+
+from langchain_core.documents import Document
+
+from app import request_log
+from app.request_log import RequestLogWriter, log_files
+
+
+def read_events(paths):
+    events = []
+    for path in paths:
+        with open(path, "r", encoding="utf-8") as f:
+            events.extend(json.loads(line) for line in f)
+    return events
+
+
+class RequestLogWriterTest(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.tmp.name, "logs", "requests.jsonl")
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_writes_events_in_order(self):
+        writer = RequestLogWriter(self.path)
+        for n in range(5):
+            self.assertTrue(writer.submit({"n": n}))
+        writer.stop()
+        self.assertEqual([e["n"] for e in read_events(log_files(self.path))], list(range(5)))
+
+    def test_rotates_and_keeps_backups(self):
+        writer = RequestLogWriter(self.path, max_bytes=60, backups=2)
+        for n in range(6):
+            writer._write([{"n": n, "padding": "x" * 40}])
+        files = log_files(self.path)
+        self.assertEqual(files, [f"{self.path}.2", f"{self.path}.1"])
+        # Oldest events beyond the backups are dropped; the rest stay in order
+        self.assertEqual([e["n"] for e in read_events(files)], [4, 5])
+
+    def test_no_backups_truncates(self):
+        writer = RequestLogWriter(self.path, max_bytes=10, backups=0)
+        writer._write([{"n": 1, "padding": "x" * 20}])
+        self.assertEqual(log_files(self.path), [])
+
+    def test_full_queue_drops(self):
+        writer = RequestLogWriter(self.path, queue_size=1)
+        writer._thread = object()  # not started, so nothing drains the queue
+        self.assertTrue(writer.submit({"n": 1}))
+        self.assertFalse(writer.submit({"n": 2}))
+
+
+class EventTest(unittest.TestCase):
+    def test_annotate_current_event(self):
+        event = request_log.begin("/chat")
+        request_log.note_query("How do I check in?", "how do i check in")
+        request_log.note_documents([Document(page_content="Check in", metadata={"source": "pdfs/guide.pdf"})])
+        request_log.add_tokens(10, 5)
+        self.assertEqual(event["normalized_query"], "how do i check in")
+        self.assertTrue(event["chunks"][0].startswith("guide.pdf#"))
+        self.assertEqual(event["tokens"], {"prompt": 10, "completion": 5})
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,69 @@
+import os
+import sys
+import tempfile
+import unittest
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+
+from langchain_core.documents import Document
+
+from app.rerank import RERANK_WEIGHTS, rerank, reset_source_times, score_candidates
+
+
+def doc(text, source="guide.pdf", section=""):
+    return Document(page_content=text, metadata={"source": source, "section": section})
+
+
+class ScoreCandidatesTest(unittest.TestCase):
+    def test_features_are_normalized(self):
+        docs = [doc("Room rates are set per season."), doc("Housekeeping marks rooms clean.")]
+        for item in score_candidates("room rates", docs):
+            for name in RERANK_WEIGHTS:
+                self.assertGreaterEqual(item["features"][name], 0.0)
+                self.assertLessEqual(item["features"][name], 1.0)
+
+    def test_vector_rank_breaks_ties(self):
+        docs = [doc("Room rates."), doc("Room rates, again.")]
+        scored = score_candidates("night audit", docs)
+        self.assertGreater(scored[0]["score"], scored[1]["score"])
+
+    def test_recency_follows_reingested_sources(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            old, new = os.path.join(tmp, "old.pdf"), os.path.join(tmp, "new.pdf")
+            for path, mtime in ((old, 1000), (new, 2000)):
+                open(path, "w").close()
+                os.utime(path, (mtime, mtime))
+            docs = [doc("Room rates.", old), doc("Room rates.", new)]
+            self.assertEqual([s["features"]["recency"] for s in score_candidates("rates", docs)], [0.0, 1.0])
+
+            os.utime(old, (3000, 3000))
+            reset_source_times()
+            self.assertEqual([s["features"]["recency"] for s in score_candidates("rates", docs)], [1.0, 0.0])
+
+    def test_empty_pool(self):
+        self.assertEqual(score_candidates("room rates", []), [])
+
+
+class RerankTest(unittest.TestCase):
+    def test_promotes_the_matching_chunk(self):
+        docs = [
+            doc("Housekeeping marks rooms clean after checkout."),
+            doc("The night audit closes the business day."),
+            doc("Room rates are configured per season in the rate plan screen.", section="Room Rates"),
+        ]
+        ranked = rerank("how to configure room rates", docs, k=2)
+        self.assertEqual(len(ranked), 2)
+        self.assertIs(ranked[0], docs[2])
+
+    def test_removes_duplicates(self):
+        first = doc("Room rates are configured per season.")
+        ranked = rerank("room rates", [first, doc(first.page_content), doc("Night audit.")], k=5)
+        self.assertEqual(len(ranked), 2)
+
+    def test_same_text_from_another_source_is_kept(self):
+        ranked = rerank("room rates", [doc("Room rates.", "a.pdf"), doc("Room rates.", "b.pdf")], k=5)
+        self.assertEqual(len(ranked), 2)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,74 @@
+import os
+import sys
+import unittest
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+
+from app.sections import CHILD_MAX_CHARS, Line, heading_level, parse_sections, section_blocks, split_sections
+
+
+class HeadingLevelTest(unittest.TestCase):
+    def test_numbered_heading_depth(self):
+        self.assertEqual(heading_level(Line("2.1 Creating Reservations", 10, 1), 10), 2)
+        self.assertEqual(heading_level(Line("2.1.3 Group Blocks", 10, 1), 10), 3)
+
+    def test_font_size(self):
+        self.assertEqual(heading_level(Line("Reservations", 16, 1), 10), 1)
+        self.assertEqual(heading_level(Line("Reservations", 12, 1), 10), 2)
+        self.assertIsNone(heading_level(Line("Reservations", 10, 1), 10))
+
+    def test_without_font_information(self):
+        self.assertEqual(heading_level(Line("FRONT DESK", None, 1), None), 1)
+        self.assertEqual(heading_level(Line("Guest Profiles", None, 1), None), 2)
+        self.assertIsNone(heading_level(Line("Open the guest profile.", None, 1), None))
+        self.assertIsNone(heading_level(Line("1. Open the tab", None, 1), None))
+
+
+class ParseSectionsTest(unittest.TestCase):
+    def test_groups_lines_under_heading_path(self):
+        lines = [
+            Line("Front Desk", 16, 1),
+            Line("The front desk handles arrivals.", 10, 1),
+            Line("Check In", 12, 2),
+            Line("Select the reservation and confirm.", 10, 2),
+            Line("Keys are issued afterwards.", 10, 3),
+        ]
+        sections = parse_sections(lines)
+        self.assertEqual([s["path"] for s in sections], ["Front Desk", "Front Desk > Check In"])
+        self.assertEqual(sections[1]["pages"], [2, 3])
+        self.assertEqual(sections[1]["text"], "Select the reservation and confirm.\nKeys are issued afterwards.")
+
+    def test_heading_without_body_is_dropped(self):
+        lines = [Line("Empty Section", 16, 1), Line("Next", 16, 1)] + [Line("Body text here.", 10, 1)] * 3
+        sections = parse_sections(lines)
+        self.assertEqual([s["title"] for s in sections], ["Next"])
+
+
+class SectionBlocksTest(unittest.TestCase):
+    def test_step_list_is_its_own_block(self):
+        text = "Reservations are created at the front desk.\n1. Open the tab.\n2. Click New.\n3. Save it."
+        blocks = section_blocks(text)
+        self.assertEqual(blocks[0], "Reservations are created at the front desk.")
+        self.assertEqual(blocks[1].splitlines(), ["1. Open the tab.", "2. Click New.", "3. Save it."])
+
+    def test_prose_is_packed_within_limit(self):
+        sentence = "This sentence is about forty characters long."
+        blocks = section_blocks(" ".join([sentence] * 40))
+        self.assertGreater(len(blocks), 1)
+        self.assertTrue(all(len(block) <= CHILD_MAX_CHARS for block in blocks))
+
+
+class SplitSectionsTest(unittest.TestCase):
+    def test_children_point_to_parents(self):
+        lines = [Line("Check In", 16, 1), Line("Select the reservation and confirm the guest details.", 10, 1)]
+        children, parents = split_sections([("pdfs/guide.pdf", lines)])
+        self.assertEqual(len(parents), 1)
+        self.assertTrue(children)
+        for child in children:
+            self.assertEqual(child.metadata["parent_id"], parents[0].metadata["parent_id"])
+            self.assertEqual(child.metadata["section"], "Check In")
+            self.assertTrue(child.page_content.startswith("Check In\n"))
+
+
+if __name__ == "__main__":
+    unittest.main()
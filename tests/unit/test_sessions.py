@@ -0,0 +1,130 @@
+import os
+import re
+import sys
+import time
+import unittest
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+
+os.environ.setdefault("CACHE_BACKEND", "memory")
+
+from app import sessions
+from app.sessions import SessionStore, fold_count, needs_rewrite
+
+
+class Message:
+    def __init__(self, content):
+        self.content = content
+
+
+class FakeLLM:
+    def __init__(self, reply="summary", delay=0.0):
+        self.reply = reply
+        self.delay = delay
+        self.prompts = []
+
+    def invoke(self, prompt):
+        self.prompts.append(prompt)
+        time.sleep(self.delay)
+        return Message(self.reply)
+
+
+def turns(n, text="question"):
+    return [{"user": f"{text} {i}", "assistant": "answer"} for i in range(n)]
+
+
+def wait_until(condition, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while not condition() and time.monotonic() < deadline:
+        time.sleep(0.01)
+    return condition()
+
+
+class FoldCountTest(unittest.TestCase):
+    def test_under_caps(self):
+        self.assertEqual(fold_count(turns(sessions.SESSION_MAX_TURNS)), 0)
+
+    def test_folds_down_to_half(self):
+        history = turns(sessions.SESSION_MAX_TURNS + 1)
+        self.assertEqual(len(history) - fold_count(history), max(1, sessions.SESSION_MAX_TURNS // 2))
+
+    def test_token_cap(self):
+        long_turn = {"user": "x" * 4 * sessions.SESSION_HISTORY_TOKENS, "assistant": "answer"}
+        self.assertEqual(fold_count([long_turn, *turns(1)]), 1)
+
+
+class NeedsRewriteTest(unittest.TestCase):
+    def test_first_question_is_not_rewritten(self):
+        self.assertFalse(needs_rewrite({"turns": [], "summary": ""}, "and for groups?"))
+
+    def test_follow_ups(self):
+        session = {"turns": turns(1), "summary": ""}
+        self.assertTrue(needs_rewrite(session, "and for groups?"))
+        self.assertTrue(needs_rewrite(session, "How do I cancel it once it is confirmed?"))
+        self.assertFalse(needs_rewrite(session, "How do I create a new room type in the setup screen?"))
+
+
+class SessionStoreTest(unittest.TestCase):
+    def test_standalone_query(self):
+        llm = FakeLLM("How do I cancel a group reservation?")
+        store = SessionStore(lambda: llm)
+        session = {"turns": turns(1, "group reservations"), "summary": ""}
+        self.assertEqual(store.standalone_query(session, "how do I cancel it?"), "How do I cancel a group reservation?")
+        self.assertEqual(store.standalone_query(session, "how do I cancel it?", allow_llm=False), "how do I cancel it?")
+        self.assertIn("group reservations 0", llm.prompts[0])
+
+    def test_record_without_llm_folds_inline(self):
+        store = SessionStore()
+        session_id = store.new_id()
+        for i in range(sessions.SESSION_MAX_TURNS + 1):
+            store.record(session_id, f"question {i}", "answer", allow_llm=False)
+        session = store.load(session_id)
+        self.assertLessEqual(len(session["turns"]), sessions.SESSION_MAX_TURNS)
+        self.assertIn("question 0", session["summary"])
+
+    def test_record_summarizes_in_background(self):
+        llm = FakeLLM("They asked about check in.")
+        store = SessionStore(lambda: llm)
+        session_id = store.new_id()
+        for i in range(sessions.SESSION_MAX_TURNS + 1):
+            store.record(session_id, f"question {i}", "answer")
+        self.assertTrue(wait_until(lambda: store.load(session_id)["summary"] == "They asked about check in."))
+        self.assertLessEqual(len(store.load(session_id)["turns"]), sessions.SESSION_MAX_TURNS)
+
+    def test_concurrent_records_keep_every_turn(self):
+        class EchoLLM(FakeLLM):
+            # The "summary" lists every question it has seen, so folded turns stay visible
+            def invoke(self, prompt):
+                time.sleep(0.02)
+                return Message(" ".join(sorted(set(re.findall(r"question \d+", prompt)))))
+
+        store = SessionStore(lambda: EchoLLM())
+        session_id = store.new_id()
+        with ThreadPoolExecutor(max_workers=8) as pool:
+            list(pool.map(lambda i: store.record(session_id, f"question {i}", "answer"), range(20)))
+        self.assertTrue(wait_until(lambda: not store._compacting))
+
+        session = store.load(session_id)
+        kept = [t["user"] for t in session["turns"]]
+        self.assertEqual(len(set(kept)), len(kept))
+        seen = set(kept) | set(re.findall(r"question \d+", session["summary"]))
+        self.assertEqual(seen, {f"question {i}" for i in range(20)})
+
+    def test_compact_drops_stale_result(self):
+        store = SessionStore()
+        session_id = store.new_id()
+        store.cache.set(session_id, {"turns": turns(sessions.SESSION_MAX_TURNS + 1), "summary": "", "updated_at": 0})
+
+        def summarize(summary, folded, allow_llm=True):
+            # Another worker folded the same turns meanwhile
+            store.cache.set(session_id, {"turns": turns(1, "new"), "summary": "other", "updated_at": 0})
+            return "stale"
+
+        store.summarize = summarize
+        store.compact(session_id)
+        self.assertEqual(store.load(session_id)["summary"], "other")
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,121 @@
+import asyncio
+import os
+import sys
+import threading
+import time
+import unittest
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+
+from app.singleflight import SingleFlight
+
+
+class SingleFlightTest(unittest.TestCase):
+    def test_concurrent_calls_share_one_execution(self):
+        group = SingleFlight("test")
+        calls = []
+        release = threading.Event()
+
+        def work():
+            calls.append(1)
+            release.wait(5)
+            return "answer"
+
+        with ThreadPoolExecutor(max_workers=4) as pool:
+            futures = [pool.submit(group.do, "key", work) for _ in range(4)]
+            while group.in_flight() == 0:
+                time.sleep(0.01)
+            time.sleep(0.05)
+            release.set()
+            results = [f.result(5) for f in futures]
+
+        self.assertEqual(results, ["answer"] * 4)
+        self.assertEqual(len(calls), 1)
+        self.assertEqual(group.in_flight(), 0)
+
+    def test_followers_get_the_leaders_exception(self):
+        group = SingleFlight("test")
+        release = threading.Event()
+
+        def fail():
+            release.wait(5)
+            raise ValueError("upstream down")
+
+        with ThreadPoolExecutor(max_workers=2) as pool:
+            leader = pool.submit(group.do, "key", fail)
+            while group.in_flight() == 0:
+                time.sleep(0.01)
+            follower = pool.submit(group.do, "key", fail)
+            time.sleep(0.05)
+            release.set()
+            for future in (leader, follower):
+                with self.assertRaises(ValueError):
+                    future.result(5)
+
+        # The key is released, so the next call runs again
+        self.assertEqual(group.do("key", lambda: 42), 42)
+
+    def test_distinct_keys_run_separately(self):
+        group = SingleFlight("test")
+        self.assertEqual(group.do("a", lambda: 1), 1)
+        self.assertEqual(group.do("b", lambda: 2), 2)
+
+    def test_do_async_coalesces(self):
+        group = SingleFlight("test")
+        calls = []
+
+        def work(value):
+            calls.append(value)
+            time.sleep(0.1)
+            return value * 2
+
+        async def run():
+            return await asyncio.gather(*(group.do_async("key", work, 21) for _ in range(3)))
+
+        self.assertEqual(asyncio.run(run()), [42, 42, 42])
+        self.assertEqual(calls, [21])
+
+
+    def test_cancelled_callers_do_not_fail_the_others(self):
+        group = SingleFlight("test")
+        calls = []
+
+        def work():
+            calls.append(1)
+            time.sleep(0.2)
+            return "answer"
+
+        async def run():
+            leader = asyncio.ensure_future(group.do_async("key", work))
+            await asyncio.sleep(0.05)
+            follower = asyncio.ensure_future(group.do_async("key", work))
+            cancelled_follower = asyncio.ensure_future(group.do_async("key", work))
+            await asyncio.sleep(0.05)
+            leader.cancel()
+            cancelled_follower.cancel()
+            with self.assertRaises(asyncio.CancelledError):
+                await leader
+            with self.assertRaises(asyncio.CancelledError):
+                await cancelled_follower
+            return await follower
+
+        self.assertEqual(asyncio.run(run()), "answer")
+        self.assertEqual(calls, [1])
+        self.assertEqual(group.in_flight(), 0)
+
+    def test_do_async_exception_reaches_followers(self):
+        group = SingleFlight("test")
+
+        def fail():
+            time.sleep(0.1)
+            raise ValueError("upstream down")
+
+        async def run():
+            return await asyncio.gather(*(group.do_async("key", fail) for _ in range(2)), return_exceptions=True)
+
+        self.assertTrue(all(isinstance(r, ValueError) for r in asyncio.run(run())))
+
+
+if __name__ == "__main__":
+    unittest.main()
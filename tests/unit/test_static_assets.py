@@ -0,0 +1,87 @@
+import gzip
+import os
+import sys
+import tempfile
+import unittest
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+
+from app.static_assets import IMMUTABLE_CACHE_CONTROL, REVALIDATE_CACHE_CONTROL, StaticAssets, accepted, brotli
+
+SCRIPT = "const style = '/static/style.css';\n" + "console.log('HotelMate chat widget');\n" * 50
+STYLE = "body { color: #222; }\n" * 50
+
+
+class AcceptedTest(unittest.TestCase):
+    def test_parses_quality_values(self):
+        self.assertEqual(accepted("gzip, br;q=0.5, identity;q=0"), {"gzip", "br"})
+        self.assertEqual(accepted("image/avif,image/webp,*/*;q=0.8"), {"image/avif", "image/webp", "*/*"})
+        self.assertEqual(accepted("BR;q=bogus"), set())
+        self.assertEqual(accepted(""), set())
+
+
+class StaticAssetsTest(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        for name, body in (("app.js", SCRIPT), ("style.css", STYLE)):
+            with open(os.path.join(self.tmp.name, name), "w", encoding="utf-8") as f:
+                f.write(body)
+        with open(os.path.join(self.tmp.name, "anim.gif"), "wb") as f:
+            f.write(b"GIF89a" + b"\0" * 64)
+        with open(os.path.join(self.tmp.name, "anim.webp"), "wb") as f:
+            f.write(b"RIFF" + b"\0" * 16)
+        self.assets = StaticAssets(self.tmp.name)
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def fingerprinted(self, name):
+        return self.assets.url(name).rsplit("/", 1)[-1]
+
+    def test_references_use_fingerprinted_urls(self):
+        body = self.assets.assets["app.js"].body.decode("utf-8")
+        self.assertIn(self.assets.url("style.css"), body)
+        self.assertNotIn("/static/style.css'", body)
+
+    def test_cache_control(self):
+        _, _, headers = self.assets.respond(self.fingerprinted("app.js"))
+        self.assertEqual(headers["Cache-Control"], IMMUTABLE_CACHE_CONTROL)
+        _, _, headers = self.assets.respond("app.js")
+        self.assertEqual(headers["Cache-Control"], REVALIDATE_CACHE_CONTROL)
+        _, _, headers = self.assets.respond("app.0123456789.js")
+        self.assertEqual(headers["Cache-Control"], REVALIDATE_CACHE_CONTROL)
+        self.assertIsNone(self.assets.respond("missing.js"))
+
+    def test_content_encoding(self):
+        status, body, headers = self.assets.respond("style.css", accept_encoding="gzip")
+        self.assertEqual((status, headers["Content-Encoding"]), (200, "gzip"))
+        self.assertEqual(gzip.decompress(body).decode("utf-8"), STYLE)
+
+        _, body, headers = self.assets.respond("style.css", accept_encoding="gzip;q=0")
+        self.assertNotIn("Content-Encoding", headers)
+        self.assertEqual(body.decode("utf-8"), STYLE)
+
+    @unittest.skipIf(brotli is None, "brotli not installed")
+    def test_prefers_brotli(self):
+        _, body, headers = self.assets.respond("style.css", accept_encoding="gzip, deflate, br")
+        self.assertEqual(headers["Content-Encoding"], "br")
+        self.assertEqual(brotli.decompress(body).decode("utf-8"), STYLE)
+
+    def test_webp_for_browsers_that_accept_it(self):
+        _, body, headers = self.assets.respond("anim.gif", accept="image/webp,*/*")
+        self.assertEqual((headers["Content-Type"], body[:4]), ("image/webp", b"RIFF"))
+        self.assertEqual(headers["Vary"], "Accept-Encoding, Accept")
+        _, body, headers = self.assets.respond("anim.gif", accept="image/webp;q=0, */*")
+        self.assertEqual((headers["Content-Type"], body[:3]), ("image/gif", b"GIF"))
+
+    def test_etag_revalidation(self):
+        _, _, headers = self.assets.respond("style.css", accept_encoding="gzip")
+        status, body, _ = self.assets.respond("style.css", accept_encoding="gzip", if_none_match=headers["ETag"])
+        self.assertEqual((status, body), (304, b""))
+        # Each encoding has its own ETag
+        status, _, _ = self.assets.respond("style.css", if_none_match=headers["ETag"])
+        self.assertEqual(status, 200)
+
+
+if __name__ == "__main__":
+    unittest.main()
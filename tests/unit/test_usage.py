@@ -0,0 +1,36 @@
+import os
+import sys
+import unittest
+from unittest import mock
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+
+os.environ.setdefault("CACHE_BACKEND", "memory")
+
+from app import usage
+from app.usage import OTHER_QUERIES, UsageTracker, request_scope
+
+
+class QueryBucketsTest(unittest.TestCase):
+    def test_distinct_queries_are_capped(self):
+        tracker = UsageTracker()
+        with mock.patch.object(usage, "USAGE_MAX_QUERIES", 10):
+            with request_scope("/chat", "expensive question"):
+                tracker.record("gpt-4.1-mini", 100000, 10000)
+            for n in range(100):
+                with request_scope("/chat", f"question {n}"):
+                    tracker.record("gpt-4.1-mini", 100, 10)
+
+        report = tracker.report(top=3)
+        by_query = tracker._days[tracker.today()]["by_query"]
+        self.assertLessEqual(len(by_query), 11)
+        self.assertEqual(report["most_expensive_queries"][0]["query"], "expensive question")
+        # Folded queries still add up to the day's totals
+        kept = sum(b["total_tokens"] for q, b in by_query.items())
+        self.assertEqual(kept, report["totals"]["total_tokens"])
+        self.assertGreater(report["other_queries"]["calls"], 0)
+        self.assertNotIn(OTHER_QUERIES, [q["query"] for q in report["most_expensive_queries"]])
+
+
+if __name__ == "__main__":
+    unittest.main()